@@ -1,30 +1,44 @@
 import streamlit as st
-from neo4j import GraphDatabase
-from llm_cypher import generate_cypher
-from llm_answer import generate_answer
+from context_cache import context_cache
+from graph_client import NEO4J_URI, run_in_session, schema_report
+from graph_context import ensure_product_fresh
+from cypher_templates import template_library
+from qa_cache import qa_cache
+from qa_pipeline import run_qa_stream
+from tracing import start_metrics_server
 
 # ==========================
 # 설정
 # ==========================
-NEO4J_URI = "bolt://localhost:7687"
-NEO4J_USER = "neo4j"
-NEO4J_PASSWORD = "wnsgk7575"
+# Neo4j 접속 정보/커넥션 풀은 graph_client.py 가 .env 에서 읽어서 관리한다.
 DEFAULT_PRODUCT_ID = "PRD_SHLIFE_GOODDOCTOR_EASY_001"  # 너가 실제로 사용 중인 product_id 로 바꿔줘
 
-# ==========================
-# Neo4j 드라이버 초기화
-# ==========================
-@st.cache_resource
-def get_driver():
-    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-
 
-driver = get_driver()
+@st.cache_resource
+def get_schema_report() -> str:
+    """
+    앱 시작 시 한 번 제약조건/인덱스 누락 여부를 점검한다.
+    """
+    try:
+        return schema_report()
+    except Exception as e:
+        return f"스키마 점검 실패: {e}"
 
 # ==========================
 # 그래프 컨텍스트 조회 함수
 # ==========================
 def get_graph_context(product_id: str):
+    """
+    상품별 그래프 컨텍스트를 캐시에서 꺼내거나, 없으면 Neo4j 에서 조회한다.
+    (질문과 무관하게 product_id 에만 의존하므로 상품 단위로 캐시)
+    """
+    ensure_product_fresh(product_id)
+    return context_cache.get_or_compute(
+        product_id, "app_graph_context", lambda: _query_graph_context(product_id)
+    )
+
+
+def _query_graph_context(product_id: str):
     """
     LLM에 던져줄 요약용 컨텍스트 + 디버깅용 raw 데이터를 Neo4j에서 가져온다.
     - Coverage 목록
@@ -34,36 +48,36 @@ def get_graph_context(product_id: str):
     coverages = []
     events_summary = []
 
-    with driver.session() as session:
-        # 1) Coverage 목록
-        cov_query = """
-        MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage)
-        RETURN c.type AS type, c.name AS name
-        ORDER BY type, name
-        """
-        cov_rows = session.run(cov_query, product_id=product_id)
-        for row in cov_rows:
-            coverages.append({"type": row["type"], "name": row["name"]})
-
-        # 2) PayableEvent 카테고리 + 예시 지급사유
-        evt_query = """
-        MATCH (p:Product {product_id: $product_id})
-              -[:HAS_COVERAGE]->(c:Coverage)
-              -[:HAS_EVENT]->(e:PayableEvent)
-        RETURN e.category AS category,
-               c.name     AS coverage_name,
-               e.reason   AS reason
-        ORDER BY category, coverage_name
-        """
-        evt_rows = session.run(evt_query, product_id=product_id)
-        for row in evt_rows:
-            events_summary.append(
-                {
-                    "category": row["category"],
-                    "coverage_name": row["coverage_name"],
-                    "reason": row["reason"],
-                }
-            )
+    # 1) Coverage 목록
+    cov_query = """
+    MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage)
+    RETURN c.type AS type, c.name AS name
+    ORDER BY type, name
+    """
+    # 2) PayableEvent 카테고리 + 예시 지급사유
+    evt_query = """
+    MATCH (p:Product {product_id: $product_id})
+          -[:HAS_COVERAGE]->(c:Coverage)
+          -[:HAS_EVENT]->(e:PayableEvent)
+    RETURN e.category AS category,
+           c.name     AS coverage_name,
+           e.reason   AS reason
+    ORDER BY category, coverage_name
+    """
+    # 두 쿼리를 세션/트랜잭션 하나에서 실행 (커넥션 한 번만 빌림)
+    params = {"product_id": product_id}
+    cov_rows, evt_rows = run_in_session([(cov_query, params), (evt_query, params)])
+
+    for row in cov_rows:
+        coverages.append({"type": row["type"], "name": row["name"]})
+    for row in evt_rows:
+        events_summary.append(
+            {
+                "category": row["category"],
+                "coverage_name": row["coverage_name"],
+                "reason": row["reason"],
+            }
+        )
 
     # LLM 프롬프트에 넣기 좋은 텍스트 형태로도 만들어준다.
     # (너가 안 쓰고 싶으면 무시해도 됨)
@@ -105,21 +119,6 @@ def get_graph_context(product_id: str):
     }
 
 
-# ==========================
-# Cypher 실행 함수
-# ==========================
-def run_cypher(cypher: str, product_id: str):
-    """
-    Cypher 쿼리를 실행해서 dict 리스트로 반환.
-    """
-    with driver.session() as session:
-        result = session.run(cypher, product_id=product_id)
-        rows = []
-        for record in result:
-            rows.append(record.data())
-    return rows
-
-
 # ==========================
 # 간단 Graphviz 시각화용 함수 (선택)
 # ==========================
@@ -178,6 +177,18 @@ st.title("📊 보험 GraphRAG 챗봇 데모")
 st.sidebar.header("설정")
 product_id = st.sidebar.text_input("product_id", value=DEFAULT_PRODUCT_ID)
 st.sidebar.write("Neo4j URI:", NEO4J_URI)
+schema_status = get_schema_report()
+if schema_status == "스키마 OK":
+    st.sidebar.caption(schema_status)
+else:
+    st.sidebar.warning(schema_status)
+st.sidebar.write("컨텍스트 캐시:", context_cache.stats())
+st.sidebar.write("질문 캐시:", qa_cache.stats())
+st.sidebar.write("Cypher 템플릿:", template_library.stats())
+metrics_server = start_metrics_server()
+if metrics_server is not None:
+    host, port = metrics_server.server_address[:2]
+    st.sidebar.write("지표:", f"http://{host}:{port}/metrics")
 
 # 세션 상태 초기화
 if "messages" not in st.session_state:
@@ -200,11 +211,57 @@ for msg in st.session_state["messages"]:
                 st.json(debug.get("graph_events_summary", []))
 
                 st.subheader("생성된 Cypher 쿼리")
+                if debug.get("qa_cache_hit"):
+                    st.caption(f"질문 캐시 적중: {debug['qa_cache_hit']}")
                 st.code(debug.get("cypher", ""), language="cypher")
+                if debug.get("cypher_params"):
+                    st.caption("템플릿 파라미터")
+                    st.json(debug["cypher_params"])
+                if debug.get("guard"):
+                    st.caption("실행 전 점검에서 거부된 쿼리")
+                    st.json(debug["guard"])
+                if debug.get("repair"):
+                    st.caption("실패 / 0행 쿼리 복구")
+                    st.json(debug["repair"])
 
                 st.subheader("Cypher 조회 결과")
                 st.json(debug.get("cypher_result", []))
 
+                if debug.get("hybrid_rows"):
+                    st.subheader("벡터 검색 → 그래프 확장 결과")
+                    st.json(debug["hybrid_rows"])
+
+                if debug.get("evidence"):
+                    st.subheader("원문 발췌 (BM25)")
+                    st.json(debug["evidence"])
+
+                if debug.get("token_usage"):
+                    st.subheader("토큰 사용량")
+                    for line in debug["token_usage"]:
+                        st.text(line)
+
+                trace = debug.get("trace")
+                if trace:
+                    st.subheader("단계별 지연")
+                    totals = trace["totals"]
+                    st.caption(
+                        f"전체 {trace['total_ms']:.0f}ms · LLM 누적 {totals['llm_ms']:.0f}ms · "
+                        f"Neo4j 누적 {totals['neo4j_ms']:.0f}ms (동시에 돈 구간은 겹쳐서 더해짐)"
+                    )
+                    st.dataframe(
+                        [
+                            {
+                                "구간": "　" * s["depth"] + s["name"],
+                                "시작(ms)": s["start_ms"],
+                                "시간(ms)": s["duration_ms"],
+                                "속성": ", ".join(f"{k}={v}" for k, v in s["attrs"].items()),
+                            }
+                            for s in trace["spans"]
+                        ],
+                        use_container_width=True,
+                        hide_index=True,
+                    )
+
                 dot = debug.get("graphviz_dot")
                 if dot:
                     st.subheader("간단 그래프 시각화")
@@ -213,45 +270,106 @@ for msg in st.session_state["messages"]:
 
 # 사용자 입력
 if question := st.chat_input("질문을 입력하세요. 예: 임플란트 보장 되니?"):
-    # 1) 사용자 메시지 추가
+    # 1) 사용자 메시지 추가 + 바로 표시
     st.session_state["messages"].append(
         {"role": "user", "content": question, "debug": None}
     )
+    with st.chat_message("user"):
+        st.markdown(question)
 
-    # 2) 그래프 컨텍스트 조회
-    graph_ctx = get_graph_context(product_id)
-    graph_context_text = graph_ctx["context_text"]
-
-    # 3) Cypher 생성 (graph_context 같이 전달)
-    cypher = generate_cypher(
-        question=question,
-        product_id=product_id,
-        graph_context=graph_context_text,
-    )
-
-    # 4) Cypher 실행
-    cypher_rows = run_cypher(cypher, product_id)
-
-    # 5) LLM 답변 생성
-    answer = generate_answer(question, cypher, cypher_rows)
+    # 디버그 정보는 파이프라인 단계가 끝날 때마다 채운다.
+    debug_payload = {
+        "graph_context_text": "",
+        "graph_coverages": [],
+        "graph_events_summary": [],
+        "cypher": "",
+        "cypher_params": {},
+        "cypher_result": [],
+        "graphviz_dot": None,
+        "qa_cache_hit": None,
+        "token_usage": [],
+        "hybrid_rows": [],
+        "evidence": [],
+        "trace": None,
+        "guard": [],
+        "repair": None,
+    }
 
-    # 6) 그래프 시각화 DOT 만들기 (실패해도 그냥 None)
-    graphviz_dot = None
+    def build_app_context(question: str, product_id: str) -> str:
+        graph_ctx = get_graph_context(product_id)
+        debug_payload["graph_coverages"] = graph_ctx["coverages"]
+        debug_payload["graph_events_summary"] = graph_ctx["events_summary"]
+        return graph_ctx["context_text"]
+
+    with st.chat_message("assistant"):
+        status = st.status("답변 준비 중...", expanded=False)
+
+        def answer_tokens():
+            """
+            파이프라인 이벤트를 받아서 중간 단계는 status 에 바로 표시하고,
+            답변 토큰만 st.write_stream 으로 흘려보낸다.
+            """
+            for event in run_qa_stream(
+                question,
+                product_id,
+                build_context=build_app_context,
+            ):
+                if event.stage == "cache_hit":
+                    debug_payload["qa_cache_hit"] = event.data.question
+                    status.write(f"질문 캐시 적중: {event.data.question}")
+                elif event.stage == "context":
+                    debug_payload["graph_context_text"] = event.data
+                    status.write("그래프 컨텍스트 조회 완료")
+                elif event.stage == "guard":
+                    debug_payload["guard"].append(event.data.to_dict())
+                    status.write("실행 전 점검에서 쿼리 거부")
+                    status.code(event.data.reason())
+                elif event.stage == "cypher":
+                    cypher, cypher_params = event.data
+                    debug_payload["cypher"] = cypher
+                    debug_payload["cypher_params"] = cypher_params
+                    status.write("Cypher 생성 완료")
+                    status.code(cypher, language="cypher")
+                elif event.stage == "repair":
+                    debug_payload["repair"] = event.data.to_dict()
+                    if event.data.ok:
+                        how = "리터럴 교정" if event.data.method == "literal" else "LLM 재생성"
+                        debug_payload["cypher"] = event.data.cypher
+                        status.write(f"쿼리 복구 ({how})")
+                        status.code(event.data.cypher, language="cypher")
+                    else:
+                        status.write("쿼리 복구 실패")
+                elif event.stage == "rows":
+                    debug_payload["cypher_result"] = event.data
+                    truncated = " (크기 제한으로 일부만 사용)" if getattr(event.data, "truncated", False) else ""
+                    status.write(f"쿼리 결과 {len(event.data)}행{truncated}")
+                    status.update(label="답변 생성 중...")
+                elif event.stage == "hybrid":
+                    debug_payload["hybrid_rows"] = event.data
+                    status.write(f"벡터 검색으로 찾은 청크 기반 결과 {len(event.data)}행")
+                elif event.stage == "evidence":
+                    debug_payload["evidence"] = [
+                        {"source": p.source, "score": round(p.score, 2), "text": p.text}
+                        for p in event.data
+                    ]
+                    status.write(f"원문 발췌 {len(event.data)}개")
+                elif event.stage == "usage":
+                    debug_payload["token_usage"] = [u.summary() for u in event.data]
+                elif event.stage == "trace":
+                    debug_payload["trace"] = event.data.to_dict()
+                elif event.stage == "token":
+                    yield event.data
+            status.update(label="완료", state="complete")
+
+        answer = st.write_stream(answer_tokens())
+
+    # 그래프 시각화 DOT 만들기 (실패해도 그냥 None)
     try:
-        graphviz_dot = build_simple_graphviz_from_result(cypher_rows)
+        debug_payload["graphviz_dot"] = build_simple_graphviz_from_result(debug_payload["cypher_result"])
     except Exception:
-        graphviz_dot = None
-
-    # 7) 어시스턴트 메시지 + 디버그 정보 세션에 저장
-    debug_payload = {
-        "graph_context_text": graph_context_text,
-        "graph_coverages": graph_ctx["coverages"],
-        "graph_events_summary": graph_ctx["events_summary"],
-        "cypher": cypher,
-        "cypher_result": cypher_rows,
-        "graphviz_dot": graphviz_dot,
-    }
+        debug_payload["graphviz_dot"] = None
 
+    # 어시스턴트 메시지 + 디버그 정보 세션에 저장
     st.session_state["messages"].append(
         {"role": "assistant", "content": answer, "debug": debug_payload}
     )
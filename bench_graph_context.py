@@ -0,0 +1,75 @@
+"""
+graph_context 섹션 쿼리 벤치마크 (순차 vs 동시 실행 vs 단일 쿼리 vs 캐시)
+
+Neo4j 없이 돌릴 수 있도록 graph_context.run_cypher 를
+고정 지연(sleep)을 갖는 로컬 스텁으로 바꿔치기해서 측정한다.
+
+실행 예:
+    python bench_graph_context.py --latency-ms 30 --iterations 20
+"""
+
+import argparse
+import os
+import statistics
+import time
+from typing import Any, Dict, List
+
+# config.py 가 import 시점에 키를 요구하므로 벤치마크용 더미 값을 넣어준다.
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench-dummy")
+
+import graph_context  # noqa: E402
+
+
+def _make_stub(latency_sec: float):
+    def stub_run_cypher(cypher: str, params: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+        time.sleep(latency_sec)
+        return []
+
+    return stub_run_cypher
+
+
+def _measure(
+    metadata_types: List[str], concurrent: bool, combined: bool, use_cache: bool, iterations: int
+) -> List[float]:
+    timings: List[float] = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        graph_context.build_context_sections(
+            metadata_types,
+            "BENCH_PRODUCT",
+            concurrent=concurrent,
+            use_cache=use_cache,
+            combined=combined,
+        )
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="graph_context 섹션 쿼리 벤치마크")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="스텁 쿼리 1회당 지연(ms)")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    graph_context.run_cypher = _make_stub(args.latency_ms / 1000)
+    all_types = list(graph_context.SECTION_BUILDERS)
+
+    print(f"스텁 지연 {args.latency_ms:.1f}ms, 섹션 {len(all_types)}개, 반복 {args.iterations}회")
+    cases = (
+        ("sequential", False, False, False),
+        ("concurrent", True, False, False),
+        ("combined", False, True, False),
+        ("cached", False, True, True),
+    )
+    for label, concurrent, combined, use_cache in cases:
+        timings = _measure(all_types, concurrent, combined, use_cache, args.iterations)
+        print(
+            f"{label:>10}: mean={statistics.mean(timings):7.1f}ms "
+            f"p50={statistics.median(timings):7.1f}ms "
+            f"max={max(timings):7.1f}ms"
+        )
+    print("cache stats:", graph_context.context_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,823 @@
+"""
+GraphRAG 파이프라인 오프라인 종단 벤치마크 (적재 → 질문 응답)
+
+Neo4j / OpenAI 없이 돌아간다.
+- 적재: sample_docs/jsons 의 상품 JSON 을 검증/정규화한다. JSON 이 비었거나 깨진 상품은
+  pdf2json 의 규칙 기반 추출기(StubExtractionBackend)로 원문 txt 에서 만든다.
+  → _build_batch / _replace_products_tx (기록만 하는 가짜 트랜잭션) → BM25 / 청크 / 벡터 인덱스
+- 그래프: 같은 배치로 채운 프로세스 안 가짜 그래프(FakeGraph). 파이프라인이 보내는
+  버전 스탬프 / 상품 어휘 / 섹션 / 청크 확장 쿼리와, 스텁 LLM 이 쓰는 답변용 쿼리를 파이썬으로 계산한다.
+  실행 전 점검(cypher_guard)의 EXPLAIN 은 고정된 계획을 돌려준다.
+- LLM: config.client / config.async_client 를 고정 지연 후 결정적인 응답을 주는 스텁으로 바꾼다.
+  (Cypher 는 로컬 플래너 규칙 + 상품 어휘로 고른 모양/키워드로 만든다)
+- 질문: sample_docs/questions.txt 를 상품마다 그대로 재생한다.
+
+단계별 p50/p95/p99 는 파이프라인 trace(tracing.py) 의 span 에서, 처리량은 동시 질문 수별로 잰다.
+결과는 JSON 으로 남기고, --compare 로 이전 커밋의 결과와 비교해서 느려진 단계를 찾는다.
+
+실행 예:
+    python bench_pipeline.py --out bench_results/base.json
+    python bench_pipeline.py --compare bench_results/base.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+# config.py 가 import 시점에 키를 요구하므로 벤치마크용 더미 값을 넣어준다.
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench-dummy")
+# 인덱스 위치는 import 시점에 읽히므로 먼저 벤치마크 작업 디렉토리로 돌려둔다.
+BENCH_WORK_DIR = os.getenv("BENCH_WORK_DIR", "./bench_work")
+os.environ.setdefault("TEXT_INDEX_DIR", os.path.join(BENCH_WORK_DIR, "text_index"))
+os.environ.setdefault("VECTOR_INDEX_DIR", os.path.join(BENCH_WORK_DIR, "vector_index"))
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ["CYPHER_TEMPLATE_PATH"] = ""
+
+import config  # noqa: E402
+import cypher_guard  # noqa: E402
+import graph_client  # noqa: E402
+import graph_context  # noqa: E402
+import json2graph  # noqa: E402
+import llm_answer  # noqa: E402
+import llm_cypher  # noqa: E402
+import metadata_planner  # noqa: E402
+import qa_pipeline  # noqa: E402
+from context_cache import context_cache  # noqa: E402
+from cypher_templates import template_library  # noqa: E402
+from eval_planner import QUESTIONS_PATH, load_questions  # noqa: E402
+from pdf2json import StubExtractionBackend, run_extraction  # noqa: E402
+from product_schema import META_KEYS  # noqa: E402
+from qa_cache import qa_cache  # noqa: E402
+from text_index import TEXT_INDEX_DIR, build_index, product_ids_from_json_dir, product_key  # noqa: E402
+from tracing import record_rows, span  # noqa: E402
+from vector_index import (  # noqa: E402
+    CHUNK_EXPANSION_QUERY,
+    VECTOR_INDEX_DIR,
+    build_vector_index,
+    chunk_rows,
+    make_chunks,
+)
+
+JSON_DIR = "./sample_docs/jsons"
+TXT_DIR = json2graph.TXT_DIR
+RESULTS_DIR = "./bench_results"
+_FORMAT_VERSION = 1
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    # nearest-rank 백분위 (표본이 적어도 실제 관측값 중 하나가 나온다)
+    ordered = sorted(values)
+    if not ordered:
+        return {"n": 0}
+
+    def rank(p: float) -> float:
+        return ordered[max(0, min(len(ordered) - 1, -(-len(ordered) * p // 100) - 1))]
+
+    return {
+        "n": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": round(rank(50), 3),
+        "p95": round(rank(95), 3),
+        "p99": round(rank(99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+# ==============================
+# 적재
+# ==============================
+
+class _FakeTx:
+    """
+    json2graph 로더가 보내는 문장과 UNWIND 행 수만 기록하는 트랜잭션.
+    """
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.rows = 0
+
+    def run(self, query: str, **params: Any):
+        self.statements += 1
+        self.rows += sum(len(v) for v in params.values() if isinstance(v, list))
+        counters = SimpleNamespace(nodes_created=0, relationships_created=0)
+        return SimpleNamespace(consume=lambda: SimpleNamespace(counters=counters))
+
+
+def _prepare_json_dir(work_dir: str, extracted_dir: str) -> Tuple[str, List[str]]:
+    """
+    sample_docs/jsons 중 읽을 수 있는 JSON + 없는 상품은 원문에서 추출한 JSON 을 한 디렉토리로 모은다.
+    - 반환값: (디렉토리, 추출본으로 채운 파일 목록)
+    """
+    target = os.path.join(work_dir, "jsons")
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target)
+
+    extracted = {
+        product_key(os.path.basename(p)): p
+        for p in glob.glob(os.path.join(extracted_dir, "*.json"))
+    }
+    filled: List[str] = []
+    for path in sorted(glob.glob(os.path.join(JSON_DIR, "*.json"))):
+        name = os.path.basename(path)
+        source = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                json.load(f)
+        except (OSError, json.JSONDecodeError):
+            source = extracted.get(product_key(name))
+            if source is None:
+                raise RuntimeError(f"{name}: JSON 을 읽을 수 없고 원문 추출본도 없습니다")
+            filled.append(name)
+        # 파일 이름을 그대로 써야 derive_product_id / 원문 인덱스의 product_key 가 맞는다.
+        shutil.copyfile(source, os.path.join(target, name))
+    return target, filled
+
+
+def run_ingest(work_dir: str, repeats: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    적재 경로를 repeats 번 돌면서 단계별 시간을 잰다.
+    - 반환값: (결과 요약, 마지막 적재 상태 {batch, chunks, product_ids})
+    """
+    timings: Dict[str, List[float]] = {}
+
+    def timed(stage: str, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings.setdefault(stage, []).append((time.perf_counter() - t0) * 1000)
+        return result
+
+    extracted_dir = os.path.join(work_dir, "extracted")
+    state: Dict[str, Any] = {}
+    summary: Dict[str, Any] = {}
+    for _ in range(repeats):
+        checkpoint_dir = os.path.join(work_dir, "extract_checkpoints")
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        extract_reports = timed(
+            "ingest.extract", run_extraction,
+            source_dir=TXT_DIR, out_dir=extracted_dir, checkpoint_dir=checkpoint_dir,
+            backend=StubExtractionBackend(), per_minute=0,
+        )
+        # 추출에 실패한 상품이 조용히 빠지면 상품 수가 바뀐 결과끼리 비교하게 되므로 멈춘다.
+        extract_errors = {os.path.basename(r["output"]): r["errors"] for r in extract_reports if r["errors"]}
+        if extract_errors:
+            raise RuntimeError(f"원문 추출 실패: {extract_errors}")
+        json_dir, filled = _prepare_json_dir(work_dir, extracted_dir)
+
+        warnings: List[Tuple[str, str]] = []
+        products, skipped = timed("ingest.normalize", json2graph.read_product_dir, json_dir, None, warnings)
+        if skipped:
+            raise RuntimeError(f"적재 검증 실패: {[os.path.basename(p) for p, _ in skipped]}")
+        batch = timed("ingest.build_batch", json2graph._build_batch, products)
+        tx = _FakeTx()
+        timed("ingest.load_tx", json2graph._replace_products_tx, tx, batch)
+
+        product_ids = product_ids_from_json_dir(json_dir)
+        index_report = timed("ingest.text_index", build_index, TXT_DIR, product_ids, out_dir=TEXT_INDEX_DIR)
+        coverage_names: Dict[str, List[str]] = {}
+        for c in batch["coverages"]:
+            coverage_names.setdefault(c["product_id"], []).append(c["name"])
+        chunks = timed("ingest.chunks", make_chunks, TXT_DIR, product_ids, coverage_names)
+        vector_report = timed("ingest.vector_index", build_vector_index, chunks, out_dir=VECTOR_INDEX_DIR)
+
+        state = {"batch": batch, "chunks": chunk_rows(chunks)}
+        summary = {
+            "products": len(products),
+            "filled_from_text": filled,
+            "warnings": len(warnings),
+            "rows": {key: len(batch[key]) for key in ("coverages", "events", "limitations", "qualifications")},
+            "statements": tx.statements,
+            "passages": index_report["passages"],
+            "chunks": vector_report["chunks"],
+        }
+
+    summary["stages"] = {stage: _percentiles(values) for stage, values in timings.items()}
+    return summary, state
+
+
+# ==============================
+# 가짜 그래프
+# ==============================
+
+# 스텁 LLM 이 만드는 답변용 쿼리. 첫 줄 주석으로 모양을 표시하고, 키워드는 리터럴
+# (템플릿으로 학습된 뒤에는 $t0 같은 파라미터) 로 들어간다.
+ANSWER_QUERIES: Dict[str, Tuple[str, str, str]] = {
+    # 모양: (MATCH, WHERE (키워드 있을 때), RETURN)
+    "events": (
+        "MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage)-[:HAS_EVENT]->(e:PayableEvent)",
+        "WHERE c.name CONTAINS '{kw}' OR e.category CONTAINS '{kw}' OR e.reason CONTAINS '{kw}'",
+        "RETURN c.name AS coverage, e.category AS category, e.reason AS reason, e.amount AS amount "
+        "ORDER BY coverage LIMIT 50",
+    ),
+    "limitations": (
+        "MATCH (l:Limitation {product_id: $product_id})",
+        "WHERE l.coverage_name CONTAINS '{kw}' OR l.category CONTAINS '{kw}' OR l.text CONTAINS '{kw}'",
+        "RETURN l.coverage_name AS coverage, l.category AS category, l.text AS text LIMIT 50",
+    ),
+    "qualifications": (
+        "MATCH (p:Product {product_id: $product_id})-[:HAS_QUALIFICATION]->(q:Qualification)",
+        "WHERE q.type1 CONTAINS '{kw}' OR q.type2 CONTAINS '{kw}'",
+        "RETURN q.type1 AS type1, q.type2 AS type2, q.insurance_period AS insurance_period, "
+        "q.payment_period AS payment_period, q.age_male_min AS age_male_min, q.age_male_max AS age_male_max, "
+        "q.age_female_min AS age_female_min, q.age_female_max AS age_female_max",
+    ),
+    "coverages": (
+        "MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage)",
+        "WHERE c.name CONTAINS '{kw}'",
+        "RETURN c.name AS name, c.type AS type ORDER BY type, name",
+    ),
+    "meta": (
+        "MATCH (p:Product {product_id: $product_id})-[r]->(m) "
+        "WHERE type(r) IN ['HAS_DIVIDEND_INFO', 'HAS_PREMIUM_INFO', 'HAS_PREMIUM_DISCOUNT', "
+        "'HAS_PREPAYMENT_INFO', 'HAS_REQUIRED_SUBSCRIPTION']",
+        "",
+        "RETURN type(r) AS kind, m.text AS text",
+    ),
+}
+
+# 메타데이터 타입 → 답변용 쿼리 모양
+_SHAPE_BY_TYPE = {
+    "payable_event_summary": "events",
+    "limitation_summary": "limitations",
+    "qualification_summary": "qualifications",
+    "coverage_list": "coverages",
+    "meta_nodes": "meta",
+}
+# 키워드로 쓰기엔 너무 일반적인 단어 (이것만 있으면 조건 없이 조회)
+_GENERIC_KEYWORDS = {
+    "보장", "보험금", "지급", "지급사유", "얼마", "금액", "받을 수", "받을수", "진단", "치료",
+    "특약", "목록", "종류", "구성", "가입", "제한", "한도", "최대", "연간", "주의", "보험료",
+}
+_SHAPE_RE = re.compile(r"^\s*// bench:(\w+)")
+_KEYWORD_RE = re.compile(r"CONTAINS\s+(?:'((?:[^'\\]|\\.)*)'|\$(\w+))")
+_SECTION_RE = re.compile(r"RETURN '(\w+)' AS section")
+_META_KINDS = {
+    "required_subscription": "HAS_REQUIRED_SUBSCRIPTION",
+    "dividend_info": "HAS_DIVIDEND_INFO",
+    "premium_info": "HAS_PREMIUM_INFO",
+    "premium_discount": "HAS_PREMIUM_DISCOUNT",
+    "prepayment_info": "HAS_PREPAYMENT_INFO",
+}
+
+
+def answer_query(shape: str, keyword: str | None) -> str:
+    match, where, ret = ANSWER_QUERIES[shape]
+    lines = [f"// bench:{shape}", match]
+    if keyword and where:
+        lines.append(where.replace("{kw}", keyword.replace("'", "\\'")))
+    lines.append(ret)
+    return "\n".join(lines)
+
+
+def _distinct(values) -> List[Any]:
+    return list(dict.fromkeys(values))
+
+
+class FakeGraph:
+    """
+    json2graph._build_batch 배치 + 청크 행으로 채운 메모리 그래프.
+    실제 스키마(Product / Coverage / PayableEvent / Limitation / Qualification / 메타 노드 / Chunk)를
+    파이썬 dict 로 들고, 파이프라인이 보내는 쿼리 모양별로 결과 rows 를 계산한다.
+    """
+
+    def __init__(self, batch: Dict[str, Any], chunks: List[Dict[str, Any]]) -> None:
+        self.products = {p["product_id"]: p for p in batch["products"]}
+        self.coverages: Dict[str, List[Dict[str, Any]]] = {}
+        for c in batch["coverages"]:
+            self.coverages.setdefault(c["product_id"], []).append(c)
+        names = {(c["product_id"], c["name"], c["type"]) for c in batch["coverages"]}
+        # 로더와 같이: 지급사유는 Coverage 가 있어야 들어가고, 제한사항은 Coverage 가 없어도 노드는 생긴다.
+        self.events: Dict[str, List[Dict[str, Any]]] = {}
+        for e in batch["events"]:
+            if (e["product_id"], e["coverage_name"], e["coverage_type"]) in names:
+                self.events.setdefault(e["product_id"], []).append(e)
+        self.limitations: Dict[str, List[Dict[str, Any]]] = {}
+        for l in batch["limitations"]:
+            l = {**l, "linked": (l["product_id"], l["coverage_name"], l["coverage_type"]) in names}
+            self.limitations.setdefault(l["product_id"], []).append(l)
+        self.qualifications: Dict[str, List[Dict[str, Any]]] = {}
+        for q in batch["qualifications"]:
+            self.qualifications.setdefault(q["product_id"], []).append(q)
+        self.metas = {m["product_id"]: m for m in batch["metas"]}
+        self.chunks = {c["chunk_id"]: c for c in chunks}
+        self.unsupported = 0
+
+    # -- 파이프라인이 보내는 쿼리 --------------------------------------
+
+    def run(self, cypher: str, params: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+        params = params or {}
+        pid = params.get("product_id", "")
+
+        shape = _SHAPE_RE.match(cypher)
+        if shape is not None:
+            return self._answer(shape.group(1), pid, self._keyword(cypher, params))
+        if "RETURN p.version AS version" in cypher:
+            return [{"version": self.products[pid]["version"]}] if pid in self.products else []
+        if "AS qualification_types" in cypher:
+            return [self._vocabulary(pid)]
+        sections = _SECTION_RE.findall(cypher)
+        if sections:
+            return [{"section": t, "rows": self._section_rows(t, pid)} for t in sections]
+        if cypher.strip() == CHUNK_EXPANSION_QUERY.strip():
+            return self._expand_chunks(pid, params.get("hits") or [])
+
+        # 파이프라인이 새 쿼리를 보내기 시작하면 여기에 모양을 추가해야 한다.
+        self.unsupported += 1
+        return []
+
+    @staticmethod
+    def _keyword(cypher: str, params: Dict[str, Any]) -> str | None:
+        m = _KEYWORD_RE.search(cypher)
+        if m is None:
+            return None
+        if m.group(2):
+            return params.get(m.group(2))
+        return re.sub(r"\\(.)", r"\1", m.group(1))
+
+    def _vocabulary(self, pid: str) -> Dict[str, List[str]]:
+        qualifications = self.qualifications.get(pid, [])
+        return {
+            "coverage_names": _distinct(c["name"] for c in self.coverages.get(pid, [])),
+            "event_categories": _distinct(e["category"] for e in self.events.get(pid, [])),
+            "limitation_categories": _distinct(l["category"] for l in self.limitations.get(pid, [])),
+            "qualification_types": _distinct(q["type1"] for q in qualifications)
+            + _distinct(q["type2"] for q in qualifications),
+        }
+
+    def _grouped(self, items: List[Dict[str, Any]], text_key: str) -> List[Dict[str, Any]]:
+        groups: Dict[str, Dict[str, List[str]]] = {}
+        for item in items:
+            g = groups.setdefault(item["category"], {"coverages": [], text_key: []})
+            g["coverages"].append(item["coverage_name"])
+            g[text_key].append(item[text_key[:-1]])
+        return [
+            {"category": cat, "coverages": _distinct(g["coverages"])[:5], text_key: _distinct(g[text_key])[:5]}
+            for cat, g in sorted(groups.items())
+        ]
+
+    def _section_rows(self, section: str, pid: str) -> List[Dict[str, Any]]:
+        if section == "payable_event_summary":
+            return self._grouped(self.events.get(pid, []), "reasons")
+        if section == "limitation_summary":
+            return self._grouped([l for l in self.limitations.get(pid, []) if l["linked"]], "texts")
+        if section == "coverage_list":
+            by_type: Dict[str, List[str]] = {}
+            for c in self.coverages.get(pid, []):
+                by_type.setdefault(c["type"], []).append(c["name"])
+            return [{"type": t, "names": names} for t, names in sorted(by_type.items())]
+        if section == "qualification_summary":
+            keys = ("type1", "type2", "insurance_period", "payment_period", "age_male_min",
+                    "age_male_max", "age_female_min", "age_female_max", "payment_cycle")
+            rows = sorted(self.qualifications.get(pid, []), key=lambda q: (q["type1"], q["type2"]))
+            return [{k: q.get(k) for k in keys} for q in rows]
+        if section == "meta_nodes":
+            meta = self.metas.get(pid)
+            if meta is None:
+                return []
+            return [{key: (meta.get(key) or {}).get("text") for key in META_KEYS}]
+        self.unsupported += 1
+        return []
+
+    def _expand_chunks(self, pid: str, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        rows = []
+        for hit in hits:
+            chunk = self.chunks.get(hit["chunk_id"])
+            if chunk is None or chunk["product_id"] != pid:
+                continue
+            for name in chunk["coverage_names"] or [None]:
+                events = [e for e in self.events.get(pid, []) if e["coverage_name"] == name]
+                limitations = [l for l in self.limitations.get(pid, []) if l["linked"] and l["coverage_name"] == name]
+                rows.append({
+                    "chunk": chunk["text"],
+                    "source": chunk["source"],
+                    "score": round(hit["score"], 3),
+                    "coverage_name": name,
+                    "events": [{k: e[k] for k in ("category", "reason", "amount")} for e in events][:5],
+                    "limitations": [{k: l[k] for k in ("category", "text")} for l in limitations][:3],
+                })
+        rows.sort(key=lambda r: (-r["score"], r["coverage_name"] or ""))
+        return rows
+
+    def _answer(self, shape: str, pid: str, keyword: str | None) -> List[Dict[str, Any]]:
+        def hit(*values: Any) -> bool:
+            return not keyword or any(keyword in str(v or "") for v in values)
+
+        if shape == "events":
+            rows = [
+                {"coverage": e["coverage_name"], "category": e["category"], "reason": e["reason"], "amount": e["amount"]}
+                for e in self.events.get(pid, [])
+                if hit(e["coverage_name"], e["category"], e["reason"])
+            ]
+            return sorted(rows, key=lambda r: r["coverage"])[:50]
+        if shape == "limitations":
+            return [
+                {"coverage": l["coverage_name"], "category": l["category"], "text": l["text"]}
+                for l in self.limitations.get(pid, [])
+                if hit(l["coverage_name"], l["category"], l["text"])
+            ][:50]
+        if shape == "qualifications":
+            keys = ("type1", "type2", "insurance_period", "payment_period",
+                    "age_male_min", "age_male_max", "age_female_min", "age_female_max")
+            return [{k: q.get(k) for k in keys} for q in self.qualifications.get(pid, []) if hit(q["type1"], q["type2"])]
+        if shape == "coverages":
+            rows = [{"name": c["name"], "type": c["type"]} for c in self.coverages.get(pid, []) if hit(c["name"])]
+            return sorted(rows, key=lambda r: (r["type"], r["name"]))
+        if shape == "meta":
+            meta = self.metas.get(pid) or {}
+            return [{"kind": kind, "text": (meta.get(key) or {}).get("text")} for key, kind in _META_KINDS.items()]
+        self.unsupported += 1
+        return []
+
+
+# ==============================
+# 스텁 LLM
+# ==============================
+
+class _StubLLM:
+    """
+    결정적인 chat.completions.create. 요청 종류는 system 프롬프트 / stream 여부로 구분한다.
+    - 플래너: 로컬 규칙 결과 (없으면 기본 타입)
+    - Cypher: 질문의 메타데이터 타입 → 쿼리 모양, 질문에 나온 상품 어휘/키워드 → 조건
+    - 답변: answer_tokens 개 토큰을 token_latency 간격으로 스트리밍
+    """
+
+    def __init__(self, questions: List[str], vocabulary: Dict[str, List[str]],
+                 latency: float, token_latency: float, answer_tokens: int) -> None:
+        # 긴 질문부터 찾아야 "보장돼?" 가 "임플란트 보장돼?" 안에서 먼저 걸리지 않는다.
+        self.questions = sorted(set(questions), key=len, reverse=True)
+        self.vocabulary = vocabulary
+        self.latency = latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        keywords = {k for rules in metadata_planner.KEYWORD_RULES.values() for k in rules}
+        for name in vocabulary.get("coverage_names", []):
+            keywords.add(metadata_planner._coverage_core_name(name))
+        for key in ("event_categories", "limitation_categories", "qualification_types"):
+            keywords.update(vocabulary.get(key, []))
+        self.keywords = sorted((k for k in keywords if len(k) >= 1 and k not in _GENERIC_KEYWORDS), key=len, reverse=True)
+
+    def _question(self, messages: List[Dict[str, str]]) -> str:
+        # 재생성 요청은 마지막 메시지가 거부 사유이므로 사용자 메시지 전체에서 찾는다.
+        text = "\n".join(m["content"] for m in messages if m["role"] == "user")
+        return next((q for q in self.questions if q in text), text)
+
+    def cypher_for(self, question: str) -> str:
+        types, _ = metadata_planner.plan_metadata_types_local(question, self.vocabulary)
+        shape = _SHAPE_BY_TYPE.get(types[0], "coverages") if types else "coverages"
+        keyword = next((k for k in self.keywords if k in question), None)
+        return answer_query(shape, keyword)
+
+    def _reply(self, messages: List[Dict[str, str]]) -> str:
+        system = messages[0]["content"]
+        question = self._question(messages)
+        if "metadata_types" in system:
+            types, _ = metadata_planner.plan_metadata_types_local(question, self.vocabulary)
+            return json.dumps({"metadata_types": types or ["coverage_list", "payable_event_summary"]})
+        return self.cypher_for(question)
+
+    @staticmethod
+    def _completion(content: str):
+        usage = SimpleNamespace(prompt_tokens=len(content) + 400, completion_tokens=len(content) // 4 + 1)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    def _chunks(self):
+        for i in range(self.answer_tokens):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=f"토큰{i} "))], usage=None)
+        yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=800, completion_tokens=self.answer_tokens))
+
+    # -- 동기 클라이언트 (config.client) --------------------------------
+
+    def create(self, *, messages: List[Dict[str, str]], stream: bool = False, **kwargs: Any):
+        time.sleep(self.latency)
+        if stream:
+            def chunks():
+                for chunk in self._chunks():
+                    time.sleep(self.token_latency)
+                    yield chunk
+            return chunks()
+        return self._completion(self._reply(messages))
+
+    # -- 비동기 클라이언트 (config.async_client) ------------------------
+
+    async def acreate(self, *, messages: List[Dict[str, str]], stream: bool = False, **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        if stream:
+            return _StubAsyncStream(self._chunks(), self.token_latency)
+        return self._completion(self._reply(messages))
+
+
+class _StubAsyncStream:
+    def __init__(self, chunks, token_latency: float) -> None:
+        self._chunks = chunks
+        self._token_latency = token_latency
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(self._token_latency)
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self) -> None:
+        pass
+
+
+def install_stubs(graph: FakeGraph, llm: _StubLLM, db_latency: float) -> None:
+    """
+    config.client / config.async_client 와 그래프 실행 함수를 스텁으로 바꾼다.
+    (from config import client 로 이미 가져간 모듈들의 이름도 함께 바꾼다)
+    """
+    sync_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=llm.create)))
+    async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=llm.acreate)))
+    for module in (config, metadata_planner, llm_cypher, llm_answer):
+        if hasattr(module, "client"):
+            module.client = sync_client
+        if hasattr(module, "async_client"):
+            module.async_client = async_client
+
+    def fake_run_cypher(cypher: str, params: Dict[str, Any] | None = None, **kwargs: Any):
+        with span("neo4j.query"):
+            time.sleep(db_latency)
+            rows = graph_client.CypherRows(graph.run(cypher, params))
+            record_rows(len(rows))
+        return rows
+
+    async def fake_async_run_cypher(cypher: str, params: Dict[str, Any] | None = None, **kwargs: Any):
+        with span("neo4j.query"):
+            await asyncio.sleep(db_latency)
+            rows = graph_client.CypherRows(graph.run(cypher, params))
+            record_rows(len(rows))
+        return rows
+
+    async def fake_async_explain_plan(cypher: str, params: Dict[str, Any] | None = None):
+        # 가짜 그래프에는 플래너가 없으므로 인덱스로 상품을 찾는 무난한 계획을 돌려준다.
+        with span("neo4j.explain"):
+            await asyncio.sleep(db_latency)
+        seek = {"operatorType": "NodeIndexSeek@neo4j", "args": {"EstimatedRows": 1.0}, "children": []}
+        return {"operatorType": "ProduceResults@neo4j", "args": {"EstimatedRows": 1.0}, "children": [seek]}
+
+    for module in (graph_client, graph_context):
+        module.run_cypher = fake_run_cypher
+        module.async_run_cypher = fake_async_run_cypher
+    qa_pipeline.async_run_cypher = fake_async_run_cypher
+    cypher_guard.async_explain_plan = fake_async_explain_plan
+
+
+# ==============================
+# 질문 재생
+# ==============================
+
+def _reset_query_caches() -> None:
+    # 질문 캐시 / 템플릿은 비워서 매 수준마다 LLM 단계를 모두 거치게 한다. (섹션 캐시는 유지)
+    qa_cache.clear()
+    template_library.clear()
+
+
+async def _replay(work: List[Tuple[str, str]], concurrency: int) -> Tuple[List[Dict[str, Any]], float]:
+    queue: "asyncio.Queue[Tuple[str, str]]" = asyncio.Queue()
+    for item in work:
+        queue.put_nowait(item)
+    results: List[Dict[str, Any]] = []
+
+    async def worker() -> None:
+        while True:
+            try:
+                question, product_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                events = await qa_pipeline.answer_question_async(question, product_id)
+            except Exception as e:
+                results.append({"question": question, "product_id": product_id, "error": repr(e)})
+                continue
+            by_stage = {e.stage: e.data for e in events}
+            results.append({
+                "question": question,
+                "product_id": product_id,
+                "trace": by_stage["trace"],
+                "rows": len(by_stage.get("rows") or []),
+                "hybrid": len(by_stage.get("hybrid") or []),
+            })
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - t0
+
+
+def run_queries(product_ids: List[str], questions: List[str], levels: List[int], rounds: int) -> Dict[str, Any]:
+    work = [(q, pid) for _ in range(rounds) for pid in product_ids for q in questions]
+    qa_pipeline.QA_MAX_CONCURRENCY = max(levels)
+
+    # 워밍업: import / 섹션 캐시 / 인덱스 mmap 을 데운다. (측정에서 제외)
+    _reset_query_caches()
+    warmup, _ = asyncio.run(_replay([(q, pid) for pid in product_ids for q in questions], 1))
+    answers = {
+        f"{r['product_id']}|{r['question']}": {"rows": r["rows"], "hybrid": r["hybrid"]}
+        for r in warmup if "error" not in r
+    }
+
+    report_levels = []
+    for concurrency in levels:
+        _reset_query_caches()
+        results, wall = asyncio.run(_replay(work, concurrency))
+        stages: Dict[str, List[float]] = {}
+        errors = [r["error"] for r in results if "error" in r]
+        for r in results:
+            if "trace" not in r:
+                continue
+            trace = r["trace"]
+            stages.setdefault("qa.total", []).append(trace.total_ms)
+            for s in trace.spans:
+                stages.setdefault(s.name, []).append(s.duration_ms)
+        report_levels.append({
+            "concurrency": concurrency,
+            "requests": len(results),
+            "errors": len(errors),
+            "error_samples": errors[:3],
+            "wall_s": round(wall, 3),
+            "throughput_qps": round(len(results) / wall, 2) if wall else 0.0,
+            "stages": {name: _percentiles(values) for name, values in sorted(stages.items())},
+        })
+    return {
+        "questions": len(questions),
+        "products": product_ids,
+        "rounds": rounds,
+        "levels": report_levels,
+        "answers": answers,
+    }
+
+
+# ==============================
+# 결과 비교
+# ==============================
+
+def _git_commit() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float,
+    min_delta_ms: float = 0.0,
+) -> List[str]:
+    """
+    baseline 보다 나빠진 항목 목록. (지연은 p50/p95 가 threshold 비율 이상 늘면, 처리량은 그만큼 줄면)
+    수 ms 안쪽 단계는 비율이 크게 흔들리므로 min_delta_ms 보다 작게 늘어난 건 무시한다.
+    행 수가 바뀐 질문도 함께 알려준다. (쿼리 경로의 동작 변화)
+    """
+    problems: List[str] = []
+
+    def check(label: str, now: Dict[str, Any], base: Dict[str, Any]) -> None:
+        for key in ("p50", "p95"):
+            if key in now and base.get(key):
+                ratio = now[key] / base[key] - 1
+                if ratio > threshold and now[key] - base[key] > min_delta_ms:
+                    problems.append(f"{label} {key}: {base[key]:.2f} → {now[key]:.2f}ms (+{ratio:.0%})")
+
+    for stage, stats in current["ingest"]["stages"].items():
+        base = baseline.get("ingest", {}).get("stages", {}).get(stage)
+        if base:
+            check(stage, stats, base)
+
+    base_levels = {lvl["concurrency"]: lvl for lvl in baseline.get("query", {}).get("levels", [])}
+    for level in current["query"]["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        c = level["concurrency"]
+        if base["throughput_qps"] and level["throughput_qps"] < base["throughput_qps"] * (1 - threshold):
+            problems.append(f"c={c} 처리량: {base['throughput_qps']} → {level['throughput_qps']} q/s")
+        if level["errors"] > base["errors"]:
+            problems.append(f"c={c} 오류: {base['errors']} → {level['errors']}")
+        for stage, stats in level["stages"].items():
+            if stage.startswith("stage.") or stage == "qa.total":
+                base_stats = base["stages"].get(stage)
+                if base_stats:
+                    check(f"c={c} {stage}", stats, base_stats)
+
+    base_answers = baseline.get("query", {}).get("answers", {})
+    for key, now in current["query"]["answers"].items():
+        before = base_answers.get(key)
+        if before is not None and before != now:
+            problems.append(f"결과 변경 {key}: {before} → {now}")
+    return problems
+
+
+def _print_report(result: Dict[str, Any]) -> None:
+    ingest = result["ingest"]
+    print(
+        f"[적재] 상품 {ingest['products']}개 (원문에서 채움: {len(ingest['filled_from_text'])}), "
+        f"행 {ingest['rows']}, passage {ingest['passages']}, 청크 {ingest['chunks']}"
+    )
+    for stage, s in ingest["stages"].items():
+        print(f"  {stage:<22} p50={s['p50']:8.2f}ms p95={s['p95']:8.2f}ms p99={s['p99']:8.2f}ms")
+
+    query = result["query"]
+    print(f"\n[질문] {query['questions']}개 × 상품 {len(query['products'])}개 × {query['rounds']}회")
+    for level in query["levels"]:
+        print(
+            f"  c={level['concurrency']:<3} {level['throughput_qps']:8.1f} q/s "
+            f"(요청 {level['requests']}, 오류 {level['errors']}, {level['wall_s']:.2f}s)"
+        )
+        for stage, s in level["stages"].items():
+            if stage.startswith("stage.") or stage in ("qa.total", "llm.cypher", "llm.answer", "llm.plan", "neo4j.query"):
+                print(f"      {stage:<22} p50={s['p50']:8.2f}ms p95={s['p95']:8.2f}ms p99={s['p99']:8.2f}ms")
+    if result["checks"]["unsupported_queries"]:
+        print(f"\n⚠️  가짜 그래프가 모르는 쿼리 {result['checks']['unsupported_queries']}건")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GraphRAG 파이프라인 오프라인 종단 벤치마크")
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--levels", default="1,4,16", help="동시 질문 수 목록 (쉼표 구분)")
+    parser.add_argument("--rounds", type=int, default=1, help="수준마다 질문 세트를 재생할 횟수")
+    parser.add_argument("--ingest-repeats", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=20.0, help="스텁 LLM 요청 1회당 지연(ms)")
+    parser.add_argument("--token-latency-ms", type=float, default=0.5, help="답변 토큰 조각 간격(ms)")
+    parser.add_argument("--answer-tokens", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="가짜 그래프 쿼리 1회당 지연(ms)")
+    parser.add_argument("--out", help=f"결과 JSON 경로 (기본: {RESULTS_DIR}/<커밋>.json)")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="회귀로 볼 악화 비율 (기본 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="이보다 작게 늘어난 지연은 회귀로 보지 않음")
+    args = parser.parse_args()
+
+    os.makedirs(BENCH_WORK_DIR, exist_ok=True)
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    questions = load_questions(args.questions)
+
+    ingest, state = run_ingest(BENCH_WORK_DIR, max(1, args.ingest_repeats))
+    graph = FakeGraph(state["batch"], state["chunks"])
+    product_ids = sorted(graph.products)
+
+    vocabulary: Dict[str, List[str]] = {}
+    for pid in product_ids:
+        for key, values in graph._vocabulary(pid).items():
+            vocabulary.setdefault(key, []).extend(values)
+    llm = _StubLLM(
+        questions, vocabulary,
+        args.llm_latency_ms / 1000, args.token_latency_ms / 1000, args.answer_tokens,
+    )
+    install_stubs(graph, llm, args.db_latency_ms / 1000)
+    context_cache.clear()
+
+    query = run_queries(product_ids, questions, levels, max(1, args.rounds))
+
+    git = _git_commit()
+    result = {
+        "format": _FORMAT_VERSION,
+        "meta": {
+            **git,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "ingest": ingest,
+        "query": query,
+        "checks": {"unsupported_queries": graph.unsupported},
+    }
+    _print_report(result)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{git['commit'] or 'local'}{'-dirty' if git['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n결과: {out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(result, baseline, args.threshold, args.min_delta_ms)
+        print(f"\n[비교] {args.compare} (기준 {args.threshold:.0%})")
+        for line in problems:
+            print(f"  ✗ {line}")
+        if problems:
+            sys.exit(1)
+        print("  회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
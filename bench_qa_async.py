@@ -0,0 +1,239 @@
+"""
+비동기 QA 파이프라인 부하 테스트 (동시 질문 수에 따른 처리량)
+
+OpenAI / Neo4j 없이 돌릴 수 있도록
+- AsyncOpenAI 클라이언트 → 고정 지연 후 응답(스트리밍 포함)하는 로컬 스텁
+- 그래프 조회(섹션 쿼리 / 답변용 Cypher 실행) → 고정 지연 후 rows 를 돌려주는 스텁
+으로 바꿔치기하고, 동시 질문 수를 늘려 가며 초당 처리 질문 수를 잰다.
+질문은 매번 달라서 질문 캐시/템플릿에 걸리지 않고 매번 LLM 단계를 모두 거친다.
+--vague 를 주면 키워드 단서가 없는 질문을 써서 LLM 플래너까지 거치게 한다.
+(--no-speculative 와 비교하면 플래너 ∥ Cypher 추측 생성의 효과를 볼 수 있다)
+
+실행 예:
+    python bench_qa_async.py --llm-latency-ms 200 --db-latency-ms 30 --levels 1,4,16,64
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+# config.py 가 import 시점에 키를 요구하므로 벤치마크용 더미 값을 넣어준다.
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench-dummy")
+
+import cypher_repair  # noqa: E402
+import graph_context  # noqa: E402
+import llm_answer  # noqa: E402
+import llm_cypher  # noqa: E402
+import metadata_planner  # noqa: E402
+import qa_pipeline  # noqa: E402
+from config import QA_MAX_CONCURRENCY  # noqa: E402
+
+PRODUCT_ID = "BENCH_PRODUCT"
+STUB_CYPHER = (
+    "MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage) "
+    "RETURN c.name AS coverage LIMIT 20"
+)
+STUB_ROWS = [{"coverage": f"벤치마크 특약 {i}"} for i in range(5)]
+
+
+# -----------------------------
+# 로컬 스텁
+# -----------------------------
+
+class _StubStream:
+    """
+    AsyncOpenAI 스트리밍 응답 흉내: 토큰 조각을 일정 간격으로 내보내고 마지막에 usage.
+    """
+
+    def __init__(self, tokens: List[str], token_latency: float):
+        self._tokens = tokens
+        self._token_latency = token_latency
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for token in self._tokens:
+            await asyncio.sleep(self._token_latency)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None)
+        usage = SimpleNamespace(prompt_tokens=500, completion_tokens=len(self._tokens))
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    async def close(self) -> None:
+        pass
+
+
+class _StubCompletions:
+    def __init__(self, latency: float, token_latency: float, answer_tokens: int):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+
+    async def create(self, *, messages: List[Dict[str, str]], stream: bool = False, **kwargs: Any):
+        # 첫 토큰까지의 지연
+        await asyncio.sleep(self.latency)
+        if stream:
+            return _StubStream(["답변 "] * self.answer_tokens, self.token_latency)
+
+        system = messages[0]["content"] if messages else ""
+        content = '{"metadata_types": ["coverage_list"]}' if "metadata_types" in system else STUB_CYPHER
+        usage = SimpleNamespace(prompt_tokens=500, completion_tokens=40)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def _install_stubs(llm_latency: float, token_latency: float, answer_tokens: int, db_latency: float):
+    """
+    스텁을 설치하고, 답변용 Cypher 실행 스텁(execute)을 돌려준다.
+    """
+    stub_client = SimpleNamespace(chat=SimpleNamespace(
+        completions=_StubCompletions(llm_latency, token_latency, answer_tokens)
+    ))
+    metadata_planner.async_client = stub_client
+    llm_cypher.async_client = stub_client
+    llm_answer.async_client = stub_client
+
+    async def stub_async_run_cypher(cypher: str, params: Dict[str, Any] | None = None, **kwargs: Any):
+        await asyncio.sleep(db_latency)
+        return []
+
+    async def stub_execute(cypher: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        await asyncio.sleep(db_latency)
+        return list(STUB_ROWS)
+
+    # 버전 스탬프 / 상품 어휘 / 원문 검색 / 템플릿 학습은 그래프나 디스크를 보지 않게 한다.
+    graph_context.async_run_cypher = stub_async_run_cypher
+    graph_context.ensure_product_fresh = lambda product_id: None
+    graph_context.get_product_vocabulary = lambda product_id: {}
+    llm_cypher.get_product_vocabulary = lambda product_id: {}
+    qa_pipeline.get_product_vocabulary = lambda product_id: {}
+    cypher_repair.get_product_vocabulary = lambda product_id: {}
+    llm_cypher.template_library.match = lambda question, vocabulary=None: None
+    qa_pipeline.ensure_product_fresh = lambda product_id: None
+    qa_pipeline.search_passages = lambda question, product_id=None, k=0: []
+    qa_pipeline.learn_cypher_template = lambda question, product_id, cypher: None
+    return stub_execute
+
+
+# -----------------------------
+# 측정
+# -----------------------------
+
+_question_ids = itertools.count()
+
+
+_vague = False
+
+
+def _next_question() -> str:
+    # 매번 다른 질문 (질문 캐시 / 비슷한 질문 매칭에 걸리지 않게)
+    if _vague:
+        # 로컬 규칙에 걸리는 단서가 없는 질문 → LLM 플래너까지 간다
+        return f"벤치마크 질문 {next(_question_ids)}번 이거 어떻게 돼?"
+    return f"벤치마크 질문 {next(_question_ids)}번 보장 내용 알려줘"
+
+
+async def _run_level(execute, concurrency: int, total: int) -> List[float]:
+    timings: List[float] = []
+
+    async def one() -> None:
+        t0 = time.perf_counter()
+        events = await qa_pipeline.answer_question_async(_next_question(), PRODUCT_ID, execute=execute)
+        assert events[-1].stage == "answer", events[-1].stage
+        timings.append((time.perf_counter() - t0) * 1000)
+
+    pending = total
+    while pending > 0:
+        batch = min(concurrency, pending)
+        await asyncio.gather(*(one() for _ in range(batch)))
+        pending -= batch
+    return timings
+
+
+def _run_sync_wrapper(execute, concurrency: int, total: int) -> List[float]:
+    # main.py / app.py 처럼 동기 래퍼를 여러 스레드에서 동시에 부를 때
+    timings: List[float] = []
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def worker() -> None:
+        while next(counter) < total:
+            t0 = time.perf_counter()
+            events = list(qa_pipeline.run_qa_stream(
+                _next_question(), PRODUCT_ID, execute=execute
+            ))
+            assert events[-1].stage == "answer", events[-1].stage
+            with lock:
+                timings.append((time.perf_counter() - t0) * 1000)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return timings
+
+
+def _report(label: str, concurrency: int, timings: List[float], elapsed: float) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{label:>6} c={concurrency:<3}: {len(timings) / elapsed:7.1f} q/s "
+        f"mean={statistics.mean(timings):7.1f}ms p50={statistics.median(timings):7.1f}ms p95={p95:7.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="비동기 QA 파이프라인 부하 테스트")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="스텁 LLM 요청 1회당 지연(ms)")
+    parser.add_argument("--token-latency-ms", type=float, default=2.0, help="답변 토큰 조각 간격(ms)")
+    parser.add_argument("--answer-tokens", type=int, default=30)
+    parser.add_argument("--db-latency-ms", type=float, default=30.0, help="스텁 그래프 쿼리 1회당 지연(ms)")
+    parser.add_argument("--levels", default="1,4,16,64", help="동시 질문 수 목록 (쉼표 구분)")
+    parser.add_argument("--requests-per-level", type=int, default=64)
+    parser.add_argument(
+        "--max-concurrency", type=int, default=QA_MAX_CONCURRENCY,
+        help="파이프라인 동시 처리 상한 (기본: QA_MAX_CONCURRENCY)",
+    )
+    parser.add_argument("--sync", action="store_true", help="동기 래퍼(run_qa_stream)도 같은 수준으로 측정")
+    parser.add_argument("--vague", action="store_true", help="LLM 플래너가 필요한 질문으로 측정")
+    parser.add_argument("--no-speculative", action="store_true", help="플래너 ∥ Cypher 추측 생성 끄기")
+    args = parser.parse_args()
+
+    global _vague
+    _vague = args.vague
+    llm_cypher.QA_SPECULATIVE_CYPHER = not args.no_speculative
+
+    execute = _install_stubs(
+        args.llm_latency_ms / 1000,
+        args.token_latency_ms / 1000,
+        args.answer_tokens,
+        args.db_latency_ms / 1000,
+    )
+    qa_pipeline.QA_MAX_CONCURRENCY = args.max_concurrency
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+
+    print(
+        f"스텁 LLM {args.llm_latency_ms:.0f}ms + 토큰 {args.answer_tokens}×{args.token_latency_ms:.0f}ms, "
+        f"그래프 {args.db_latency_ms:.0f}ms, 수준별 {args.requests_per_level}건, "
+        f"동시 처리 상한 {args.max_concurrency}"
+    )
+    for concurrency in levels:
+        t0 = time.perf_counter()
+        timings = asyncio.run(_run_level(execute, concurrency, args.requests_per_level))
+        _report("async", concurrency, timings, time.perf_counter() - t0)
+    if args.sync:
+        for concurrency in levels:
+            t0 = time.perf_counter()
+            timings = _run_sync_wrapper(execute, concurrency, args.requests_per_level)
+            _report("sync", concurrency, timings, time.perf_counter() - t0)
+    print("cache stats:", qa_pipeline.qa_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
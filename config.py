@@ -1,8 +1,7 @@
 import os
 
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 # -----------------------------
 # .env 로드
@@ -22,16 +21,46 @@ if not OPENAI_API_KEY:
     raise ValueError("환경변수 OPENAI_API_KEY 가 설정되어 있지 않습니다. .env 에 설정했는지 확인하세요.")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
+# 비동기 파이프라인(qa_pipeline.run_qa_async)용. 이벤트 루프 하나에서 여러 요청을 동시에 보낸다.
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+# 로컬 메타데이터 플래너의 confidence 가 이 값보다 낮으면 LLM 플래너로 넘어간다.
+PLANNER_CONFIDENCE_THRESHOLD = float(os.getenv("PLANNER_CONFIDENCE_THRESHOLD", "0.6"))
 
 # -----------------------------
 # Neo4j 설정
 # -----------------------------
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "비밀번호를_여기에")  # .env 에 NEO4J_PASSWORD 넣는 걸 추천
-NEO4J_DB = os.getenv("NEO4J_DB", "shlife-kg")  # DB 이름도 필요하면 .env 로 뺄 수 있음
+# 접속 정보 / 커넥션 풀 설정과 공유 드라이버는 graph_client.py 에 있다.
+
+# 그래프 컨텍스트 섹션 쿼리를 동시에 보낼 때 쓰는 스레드 수
+# (메타데이터 타입이 5개이므로 기본값도 5)
+GRAPH_CONTEXT_MAX_WORKERS = int(os.getenv("GRAPH_CONTEXT_MAX_WORKERS", "5"))
+
+# 1 이면 여러 섹션을 UNION ALL 쿼리 하나로 조회한다. (0 이면 섹션별 쿼리)
+GRAPH_CONTEXT_COMBINED_QUERY = os.getenv("GRAPH_CONTEXT_COMBINED_QUERY", "1") == "1"
+
+# 답변 후보로 읽을 쿼리 결과의 토큰 상한. 0 이면 제한 없음.
+# 결과 스트림은 이 예산에 닿을 때까지만 읽고, 그중 프롬프트 예산에 맞는 행만
+# prompt_assembler 가 골라서 넣는다. (모델별 프롬프트 예산은 PROMPT_TOKEN_BUDGETS)
+ANSWER_ROWS_TOKEN_BUDGET = int(os.getenv("ANSWER_ROWS_TOKEN_BUDGET", "6000"))
+
+# -----------------------------
+# 동시 질문 처리 (비동기 파이프라인)
+# -----------------------------
+# 이벤트 루프 하나에서 동시에 진행하는 질문 수 상한 (넘으면 앞 요청이 끝날 때까지 대기)
+QA_MAX_CONCURRENCY = int(os.getenv("QA_MAX_CONCURRENCY", "16"))
+# 질문 하나의 최대 처리 시간 (초, 0 이면 제한 없음). 넘으면 진행 중인 LLM/DB 요청을 취소한다.
+QA_REQUEST_TIMEOUT_SEC = float(os.getenv("QA_REQUEST_TIMEOUT_SEC", "120"))
 
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+# 1 이면 LLM 플래너가 도는 동안 상품 기본 컨텍스트로 Cypher 생성을 미리 시작한다.
+# 플랜이 고른 섹션이 기본 컨텍스트 안에 다 들어 있으면 미리 만든 쿼리를 쓰고, 아니면 버리고 다시 만든다.
+QA_SPECULATIVE_CYPHER = os.getenv("QA_SPECULATIVE_CYPHER", "1") == "1"
+# 미리 생성할 때 쓰는 상품 기본 컨텍스트의 섹션 (쉼표 구분, 섹션 캐시를 그대로 쓴다)
+SPECULATIVE_CONTEXT_TYPES = [
+    t.strip()
+    for t in os.getenv("SPECULATIVE_CONTEXT_TYPES", "coverage_list,payable_event_summary").split(",")
+    if t.strip()
+]
 
 # -----------------------------
 # 기본 product_id
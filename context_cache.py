@@ -0,0 +1,156 @@
+# context_cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+# -----------------------------
+# 캐시 설정
+# -----------------------------
+# json2graph.py 처럼 OpenAI 키 없이 도는 스크립트에서도 import 할 수 있도록
+# config.py 대신 환경변수를 직접 읽는다.
+CONTEXT_CACHE_MAXSIZE = int(os.getenv("CONTEXT_CACHE_MAXSIZE", "256"))
+CONTEXT_CACHE_TTL_SEC = float(os.getenv("CONTEXT_CACHE_TTL_SEC", "600"))
+# 그래프에 저장된 상품 버전 스탬프(p.version)를 다시 확인하는 최소 간격
+CONTEXT_CACHE_VERSION_CHECK_SEC = float(os.getenv("CONTEXT_CACHE_VERSION_CHECK_SEC", "5"))
+
+# 버전을 아직 한 번도 확인하지 않은 상품 (None 은 "그래프에 상품이 없다" 는 확인된 버전이다)
+_UNCHECKED = object()
+
+
+class ContextCache:
+    """
+    (product_id, metadata_type) → 값 을 저장하는 LRU + TTL 캐시.
+
+    - 메타데이터 요약은 질문이 아니라 product_id 에만 의존하므로 상품 단위로 캐시한다.
+    - 상품이 다시 적재되면 invalidate_product() 로 해당 상품 항목만 지운다.
+    - 다른 프로세스에서 적재한 경우에는 그래프의 버전 스탬프를
+      ensure_fresh() 로 주기적으로 비교해서 감지한다.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = CONTEXT_CACHE_MAXSIZE,
+        ttl_sec: float = CONTEXT_CACHE_TTL_SEC,
+        version_check_sec: float = CONTEXT_CACHE_VERSION_CHECK_SEC,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl_sec = ttl_sec
+        self.version_check_sec = version_check_sec
+
+        # key → (만료 시각, 값)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        # product_id → 마지막으로 본 버전 스탬프
+        self._versions: Dict[str, Any] = {}
+        # product_id → 마지막으로 버전을 확인한 시각
+        self._version_checked_at: Dict[str, float] = {}
+        # 상품 무효화 시 함께 불러줄 콜백 (다른 상품 단위 캐시들)
+        self._listeners: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, product_id: str, metadata_type: str) -> Any | None:
+        key = (product_id, metadata_type)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, product_id: str, metadata_type: str, value: Any) -> None:
+        key = (product_id, metadata_type)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_sec, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, product_id: str, metadata_type: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(product_id, metadata_type)
+        if value is None:
+            value = compute()
+            self.put(product_id, metadata_type, value)
+        return value
+
+    def add_invalidation_listener(self, listener: Callable[[str], None]) -> None:
+        """
+        invalidate_product() 가 불릴 때 product_id 를 넘겨받을 콜백을 등록한다.
+        """
+        self._listeners.append(listener)
+
+    def invalidate_product(self, product_id: str) -> None:
+        """
+        해당 상품의 캐시 항목을 모두 지운다. (상품 재적재 시 호출)
+        등록된 리스너에게도 알린다.
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == product_id]:
+                del self._entries[key]
+            self._versions.pop(product_id, None)
+            self._version_checked_at.pop(product_id, None)
+            self.invalidations += 1
+        for listener in self._listeners:
+            listener(product_id)
+
+    def ensure_fresh(self, product_id: str, fetch_version: Callable[[], Any]) -> None:
+        """
+        그래프에 저장된 상품 버전 스탬프가 바뀌었으면 해당 상품 캐시를 비운다.
+        버전 조회는 version_check_sec 마다 최대 한 번만 한다.
+        """
+        now = time.monotonic()
+        with self._lock:
+            checked_at = self._version_checked_at.get(product_id)
+            if checked_at is not None and now - checked_at < self.version_check_sec:
+                return
+
+        version = fetch_version()
+
+        with self._lock:
+            known = self._versions.get(product_id, _UNCHECKED)
+            self._version_checked_at[product_id] = now
+            self._versions[product_id] = version
+        # 적재 전(None)에 캐시한 "데이터 없음" 도 상품이 적재되면 버려야 한다.
+        if known is not _UNCHECKED and known != version:
+            self.invalidate_product(product_id)
+            with self._lock:
+                self._versions[product_id] = version
+                self._version_checked_at[product_id] = now
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._version_checked_at.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# 프로세스 전체에서 공유하는 캐시 인스턴스
+context_cache = ContextCache()
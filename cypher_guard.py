@@ -0,0 +1,164 @@
+# cypher_guard.py
+
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Tuple
+
+from neo4j.exceptions import ClientError
+
+from cypher_validator import validate_cypher
+from graph_client import async_explain_plan
+from tracing import annotate, metrics
+
+# -----------------------------
+# 생성 Cypher 실행 전 점검 설정
+# -----------------------------
+# 1 이면 LLM 이 만든 쿼리를 실행하기 전에 EXPLAIN 으로 실행 계획을 확인한다.
+CYPHER_GUARD = os.getenv("CYPHER_GUARD", "1") == "1"
+# 실행 계획에 이 연산자가 있으면 거부한다. (그래프 전체 스캔 / 서로 연결되지 않은 패턴의 곱)
+CYPHER_GUARD_FORBIDDEN_OPERATORS = [
+    op.strip()
+    for op in os.getenv("CYPHER_GUARD_FORBIDDEN_OPERATORS", "AllNodesScan,CartesianProduct").split(",")
+    if op.strip()
+]
+# 어느 연산자든 예상 행 수가 이보다 크면 거부한다. 0 이면 보지 않음.
+CYPHER_GUARD_MAX_ESTIMATED_ROWS = float(os.getenv("CYPHER_GUARD_MAX_ESTIMATED_ROWS", "100000"))
+# 마지막 RETURN 에 LIMIT 이 없으면 붙일 값. 0 이면 붙이지 않음.
+# (graph_client.CYPHER_MAX_ROWS 보다 크게 두어야 결과가 잘렸는지 알 수 있다)
+CYPHER_GUARD_LIMIT = int(os.getenv("CYPHER_GUARD_LIMIT", "1000"))
+# 점검을 통과한 쿼리를 실행할 때 거는 서버 쪽 트랜잭션 타임아웃 (초, 0 이면 서버 설정)
+CYPHER_GUARD_TIMEOUT_SEC = float(os.getenv("CYPHER_GUARD_TIMEOUT_SEC", "10"))
+
+_RETURN_RE = re.compile(r"\bRETURN\b", re.IGNORECASE)
+_LIMIT_RE = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_UNION_RE = re.compile(r"\bUNION\b", re.IGNORECASE)
+
+
+@dataclass
+class GuardViolation:
+    code: str                           # cypher_validator 의 문제 코드 / "forbidden_operator" / "estimated_rows" / "invalid"
+    detail: str                         # 사유 설명 (재생성 프롬프트에도 그대로 넣는다)
+    operator: str | None = None
+    estimated_rows: float | None = None
+
+
+@dataclass
+class GuardResult:
+    """
+    점검 결과. cypher 는 실제로 실행할 쿼리 (LIMIT 을 붙였으면 붙인 쿼리).
+    """
+    cypher: str
+    violations: List[GuardViolation] = field(default_factory=list)
+    limit_injected: bool = False
+    max_estimated_rows: float | None = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.violations
+
+    def reason(self) -> str:
+        return "\n".join(f"- {v.detail}" for v in self.violations)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "ok": self.ok}
+
+
+def inject_limit(cypher: str, limit: int = CYPHER_GUARD_LIMIT) -> Tuple[str, bool]:
+    """
+    마지막 RETURN 뒤에 LIMIT 이 없으면 붙인다. 반환값: (쿼리, 붙였는지)
+    - UNION 쿼리는 갈래마다 따로 붙여야 하므로 건드리지 않는다. (행 수 상한은 graph_client 가 지킨다)
+    """
+    body = cypher.strip().rstrip(";").rstrip()
+    if not limit or _UNION_RE.search(body):
+        return body, False
+    returns = list(_RETURN_RE.finditer(body))
+    if not returns or _LIMIT_RE.search(body, returns[-1].end()):
+        return body, False
+    return f"{body}\nLIMIT {limit}", True
+
+
+def _walk(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("children") or []:
+        yield from _walk(child)
+
+
+def _operator_name(op: Dict[str, Any]) -> str:
+    # Neo4j 5 부터는 "AllNodesScan@neo4j" 처럼 DB 이름이 붙는다.
+    return str(op.get("operatorType", "")).split("@")[0]
+
+
+def inspect_plan(plan: Dict[str, Any]) -> Tuple[List[GuardViolation], float | None]:
+    """
+    EXPLAIN 계획 트리에서 금지 연산자와 과도한 예상 행 수를 찾는다.
+    - 반환값: (위반 목록, 계획 전체의 최대 예상 행 수)
+    """
+    violations: List[GuardViolation] = []
+    seen: set = set()
+    worst: Tuple[str, float] | None = None
+    for op in _walk(plan):
+        name = _operator_name(op)
+        if name in CYPHER_GUARD_FORBIDDEN_OPERATORS and name not in seen:
+            seen.add(name)
+            violations.append(GuardViolation(
+                code="forbidden_operator",
+                detail=f"실행 계획에 {name} 이(가) 있다. "
+                       "모든 노드 패턴을 $product_id 로 찾은 Product 에서 관계로 이어지게 작성해야 한다.",
+                operator=name,
+            ))
+        # 드라이버는 서버가 준 계획을 그대로 넘긴다. (Bolt 에서는 "args")
+        args = op.get("args") or op.get("arguments") or {}
+        estimated = args.get("EstimatedRows")
+        if isinstance(estimated, (int, float)) and (worst is None or estimated > worst[1]):
+            worst = (name, float(estimated))
+
+    if worst is not None and CYPHER_GUARD_MAX_ESTIMATED_ROWS and worst[1] > CYPHER_GUARD_MAX_ESTIMATED_ROWS:
+        violations.append(GuardViolation(
+            code="estimated_rows",
+            detail=f"{worst[0]} 단계의 예상 행 수가 {worst[1]:,.0f} 으로 "
+                   f"상한 {CYPHER_GUARD_MAX_ESTIMATED_ROWS:,.0f} 을 넘는다. 조건으로 범위를 좁혀야 한다.",
+            operator=worst[0],
+            estimated_rows=worst[1],
+        ))
+    return violations, worst[1] if worst is not None else None
+
+
+async def guard_cypher_async(
+    cypher: str,
+    params: Dict[str, Any] | None = None,
+    explain: bool = True,
+) -> GuardResult:
+    """
+    LLM 이 만든 쿼리를 실행하기 전에 점검한다.
+    1) 서버에 보내지 않고 스키마 / $product_id / 남은 마크다운을 검사하고 (cypher_validator)
+    2) 마지막 RETURN 에 LIMIT 이 없으면 붙이고
+    3) EXPLAIN 계획에 금지 연산자 / 과도한 예상 행 수가 없는지 본다.
+    - explain: False 면 1) 만 한다. (Neo4j 가 아닌 실행 함수를 쓸 때)
+    - 문법 오류 등 서버가 거부한 쿼리도 위반(invalid)으로 돌려준다. (연결 오류는 그대로 올린다)
+    """
+    params = params or {}
+    injected = False
+    if explain:
+        cypher, injected = inject_limit(cypher)
+    result = GuardResult(cypher=cypher, limit_injected=injected)
+
+    issues = validate_cypher(cypher, params)
+    result.violations.extend(GuardViolation(code=i.code, detail=i.detail) for i in issues)
+    if explain and result.ok:
+        try:
+            plan = await async_explain_plan(cypher, params)
+        except ClientError as e:
+            result.violations.append(GuardViolation(code="invalid", detail=f"Neo4j 가 쿼리를 거부했다: {e.message}"))
+        else:
+            violations, result.max_estimated_rows = inspect_plan(plan)
+            result.violations.extend(violations)
+
+    for v in result.violations:
+        metrics.inc("qa_cypher_guard_rejections_total", code=v.code)
+    annotate(
+        guard="ok" if result.ok else ",".join(v.code for v in result.violations),
+        limit_injected=injected,
+        estimated_rows=result.max_estimated_rows,
+    )
+    return result
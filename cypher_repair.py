@@ -0,0 +1,324 @@
+# cypher_repair.py
+
+import asyncio
+import os
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from difflib import SequenceMatcher
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from neo4j.exceptions import ClientError
+
+from cypher_guard import guard_cypher_async
+from cypher_templates import (
+    Slot,
+    despace,
+    despaced_positions,
+    find_literals,
+    resolve_value,
+    vocabulary_values,
+)
+from cypher_validator import CYPHER_VALIDATE
+from graph_context import get_product_vocabulary
+from llm_cypher import regenerate_cypher_async
+from prompt_assembler import PromptUsage
+from tracing import annotate, metrics, record_rows, span
+
+# -----------------------------
+# 실패 / 0행 Cypher 복구 설정
+# -----------------------------
+# 1 이면 LLM 이 만든 쿼리가 실행에 실패하거나 0행을 내면 복구를 시도한다.
+CYPHER_REPAIR = os.getenv("CYPHER_REPAIR", "1") == "1"
+# 리터럴을 상품 어휘 값으로 바꿀 최소 유사도 (0~1, 공백/문장부호를 뺀 문자열끼리 비교)
+CYPHER_REPAIR_MIN_SCORE = float(os.getenv("CYPHER_REPAIR_MIN_SCORE", "0.6"))
+# 1 이면 리터럴 교정으로도 안 될 때 오류 내용을 붙여서 LLM 에게 한 번 다시 만들게 한다.
+CYPHER_REPAIR_LLM = os.getenv("CYPHER_REPAIR_LLM", "1") == "1"
+
+# 이보다 짧은 리터럴은 어느 값과도 비슷해 보이므로 고치지 않는다.
+_MIN_LITERAL_LEN = 2
+# 상품 어휘 값의 괄호 부가 표기 ("(간편)", "[기본]", "(무배당, 갱신형)" ...)
+_ANNOTATION_RE = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+@dataclass
+class LiteralFix:
+    prop: str           # 비교 대상 프로퍼티 (category, name, type1 ...)
+    operator: str       # "CONTAINS" / "=" / "STARTS WITH" / "ENDS WITH"
+    old: str            # 쿼리에 있던 값
+    new: str            # 상품 어휘에서 찾은 값
+    score: float
+
+
+@dataclass
+class RepairAttempt:
+    method: str                 # "literal" (리터럴 교정) / "llm" (오류를 붙여 다시 생성)
+    cypher: str
+    rows: int = 0
+    error: str | None = None    # 실행 오류 / 점검 거부 사유
+
+
+@dataclass
+class RepairResult:
+    """
+    복구 단계 결과. original 은 처음 실행한 쿼리, error 는 그 실행 오류 (0행이었으면 None).
+    """
+    original: str
+    error: str | None = None
+    fixes: List[LiteralFix] = field(default_factory=list)
+    attempts: List[RepairAttempt] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.attempts) and self.attempts[-1].rows > 0
+
+    @property
+    def method(self) -> str | None:
+        return self.attempts[-1].method if self.ok else None
+
+    @property
+    def cypher(self) -> str:
+        # 결과를 낸 쿼리. 못 고쳤으면 처음 쿼리를 그대로 둔다.
+        return self.attempts[-1].cypher if self.ok else self.original
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "ok": self.ok, "method": self.method}
+
+
+# ==============================
+# 리터럴 교정 (LLM 없이)
+# ==============================
+
+def _ratio(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def _original_span(value: str, start: int, end: int) -> Tuple[int, int]:
+    """
+    공백/문장부호를 뺀 위치 [start, end) 를 원래 문자열 위치로 되돌리고 어절 단위로 넓힌다.
+    - 단어 중간에서 자르지 않는다. ('0년만기' → '10년만기')
+    - 괄호 안에서 끝나거나 시작하면 괄호 전체를 포함한다. ('갱신계약(10년만기' → '갱신계약(10년만기)')
+    """
+    index_map = despaced_positions(value)
+    kept = set(index_map)
+    lo, hi = index_map[start], index_map[end - 1] + 1
+    while lo - 1 in kept:
+        lo -= 1
+    while hi in kept:
+        hi += 1
+    for group in _ANNOTATION_RE.finditer(value):
+        if group.start() < lo < group.end():
+            lo = group.start()
+        if group.start() < hi < group.end():
+            hi = group.end()
+    return lo, hi
+
+
+def _best_window(target: str, compact: str) -> Tuple[float, int, int]:
+    """
+    compact 안에서 target 과 가장 비슷한 구간. 반환값: (유사도, 시작, 끝)
+    - 글자 하나가 빠지거나 더해진 오타도 잡도록 길이 ±1 구간까지 본다.
+    - 최소 유사도나 지금까지의 최고점을 넘을 수 없는 구간은 상한(quick_ratio)만 보고 건너뛴다.
+    """
+    if len(compact) <= len(target):
+        return _ratio(target, compact), 0, len(compact)
+    sizes = range(max(len(target) - 1, _MIN_LITERAL_LEN), min(len(target) + 1, len(compact)) + 1)
+    # 값 전체와 겹치는 글자 수로 구한 상한이 최소 유사도보다 낮으면 구간을 볼 필요가 없다.
+    shared = sum((Counter(target) & Counter(compact)).values())
+    if max((2 * min(shared, size) / (len(target) + size) for size in sizes), default=0.0) < CYPHER_REPAIR_MIN_SCORE:
+        return 0.0, 0, 0
+
+    matcher = SequenceMatcher(None, autojunk=False)
+    matcher.set_seq2(target)  # target 쪽 색인은 한 번만 만든다.
+    best = (0.0, 0, 0)
+    for size in sizes:
+        for start in range(len(compact) - size + 1):
+            matcher.set_seq1(compact[start : start + size])
+            floor = max(best[0], CYPHER_REPAIR_MIN_SCORE)
+            if matcher.real_quick_ratio() <= floor or matcher.quick_ratio() <= floor:
+                continue
+            score = matcher.ratio()
+            if score > best[0]:
+                best = (score, start, start + size)
+    return best
+
+
+def _core_name(value: str) -> str:
+    # "(간편)[기본]뇌혈관질환진단특약(무배당, 갱신형)" → "뇌혈관질환진단특약"
+    return despace(_ANNOTATION_RE.sub("", value))
+
+
+def _closest_value(literal: str, slot: Slot, vocabulary: Dict[str, List[str]]) -> Tuple[str, float] | None:
+    """
+    상품 어휘에서 리터럴과 가장 비슷한 값. 반환값: (바꿀 값, 유사도)
+    - CONTAINS: 값 안의 비슷한 구간을 찾아 어절 / 괄호 단위로 넓힌 부분으로 바꾼다.
+      (예: '뇌혈관질환진단비' → '뇌혈관질환진단특약')
+    - "=" / STARTS WITH / ENDS WITH: 값 전체(괄호 안 부가 표기를 뺀 이름 포함)와 비교해서 값 전체로 바꾼다.
+      가장 비슷한 값이 여럿이면 고르지 않는다.
+    - 숫자가 다른 값은 오타가 아니라 다른 상품 구분이므로 고르지 않는다. ('20년만기' ≠ '10년만기')
+    """
+    target = despace(literal)
+    if len(target) < _MIN_LITERAL_LEN:
+        return None
+    digits = _DIGITS_RE.findall(literal)
+
+    scored: List[Tuple[float, str]] = []
+    for value in vocabulary_values(vocabulary, slot.prop):
+        compact = despace(value)
+        if not compact:
+            continue
+        if slot.operator == "CONTAINS":
+            score, start, end = _best_window(target, compact)
+            if score < CYPHER_REPAIR_MIN_SCORE:
+                continue
+            lo, hi = _original_span(value, start, end)
+            candidate = value[lo:hi]
+            # 넓힌 부분으로 다시 잰다.
+            scored.append((_ratio(target, despace(candidate)), candidate))
+        else:
+            scored.append((max(_ratio(target, compact), _ratio(target, _core_name(value))), value))
+
+    scored = [(score, c) for score, c in scored if _DIGITS_RE.findall(c) == digits]
+    if not scored:
+        return None
+    score, candidate = max(scored, key=lambda s: s[0])
+    if score < CYPHER_REPAIR_MIN_SCORE:
+        return None
+    if slot.operator != "CONTAINS" and len({c for s, c in scored if s == score}) > 1:
+        return None
+    return candidate, score
+
+
+def _matches(literal: str, slot: Slot, vocabulary: Dict[str, List[str]]) -> bool:
+    # Neo4j 가 비교하는 그대로 (띄어쓰기 / 대소문자까지) 맞는 값이 있는지
+    for value in vocabulary_values(vocabulary, slot.prop):
+        if slot.operator == "=":
+            ok = value == literal
+        elif slot.operator == "STARTS WITH":
+            ok = value.startswith(literal)
+        elif slot.operator == "ENDS WITH":
+            ok = value.endswith(literal)
+        else:
+            ok = literal in value
+        if ok:
+            return True
+    return False
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def repair_literals(cypher: str, vocabulary: Dict[str, List[str]]) -> Tuple[str, List[LiteralFix]]:
+    """
+    쿼리 안의 문자열 리터럴 중 상품에 실제로 없는 category / coverage name / type1·type2 값을
+    가장 비슷한 실제 값으로 바꾼다. 반환값: (바꾼 쿼리, 바꾼 리터럴 목록)
+    - 띄어쓰기 / 문장부호만 다르면 저장된 표기로 바꾸고, 아니면 가장 비슷한 값으로 바꾼다.
+    - 이미 어휘와 맞는 리터럴, 어휘가 없는 프로퍼티(reason, text ...)의 리터럴은 그대로 둔다.
+    """
+    fixes: List[LiteralFix] = []
+    parts: List[str] = []
+    last = 0
+    for literal in find_literals(cypher):
+        value, slot = literal.value, literal.slot
+        if slot is None or not vocabulary_values(vocabulary, slot.prop):
+            continue
+        if _matches(value, slot, vocabulary):
+            continue
+        resolved = resolve_value(value, slot, vocabulary)
+        closest = (resolved, 1.0) if resolved is not None else _closest_value(value, slot, vocabulary)
+        if closest is None or closest[0] == value:
+            continue
+        new, score = closest
+        fixes.append(LiteralFix(prop=slot.prop, operator=slot.operator, old=value, new=new, score=round(score, 3)))
+        parts.append(cypher[last : literal.start])
+        parts.append(_quote(new))
+        last = literal.end
+    parts.append(cypher[last:])
+    return "".join(parts), fixes
+
+
+# ==============================
+# 복구 단계 (qa_pipeline)
+# ==============================
+
+async def _attempt(
+    execute: Callable[[str, Dict[str, Any]], Awaitable[List[Dict[str, Any]]]],
+    attempt: RepairAttempt,
+    params: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    try:
+        rows = await execute(attempt.cypher, params)
+    except ClientError as e:
+        attempt.error = e.message
+        return []
+    attempt.rows = len(rows)
+    return rows
+
+
+async def repair_cypher_async(
+    question: str,
+    product_id: str,
+    graph_context: str,
+    cypher: str,
+    params: Dict[str, Any],
+    error: str | None,
+    execute: Callable[[str, Dict[str, Any]], Awaitable[List[Dict[str, Any]]]],
+    guard: bool = False,
+    usage_sink: List[PromptUsage] | None = None,
+) -> Tuple[RepairResult, List[Dict[str, Any]]]:
+    """
+    LLM 이 만든 쿼리가 실행에 실패(error)했거나 0행을 냈을 때 최대 두 번 다시 실행한다.
+    1) 문자열 리터럴을 상품 어휘(상품 단위 캐시)의 가장 비슷한 값으로 바꿔서 다시 실행
+    2) 그래도 안 되면(CYPHER_REPAIR_LLM) 오류 내용을 붙여서 LLM 에게 한 번 다시 만들게 하고,
+       실행 전 점검(cypher_guard)을 통과하면 실행
+    - execute: (cypher, params) → rows. Neo4j 가 거부한 쿼리(ClientError)는 실패한 시도로 남긴다.
+    - 반환값: (복구 결과, 결과를 낸 시도의 rows. 못 고쳤으면 빈 리스트)
+    """
+    result = RepairResult(original=cypher, error=error)
+    rows: List[Dict[str, Any]] = []
+
+    vocabulary = await asyncio.to_thread(get_product_vocabulary, product_id)
+    fixed, result.fixes = repair_literals(cypher, vocabulary)
+    if result.fixes:
+        with span("repair.literals", fixes=len(result.fixes)):
+            attempt = RepairAttempt(method="literal", cypher=fixed)
+            result.attempts.append(attempt)
+            rows = await _attempt(execute, attempt, params)
+            record_rows(len(rows))
+
+    if not result.ok and CYPHER_REPAIR_LLM:
+        last = result.attempts[-1] if result.attempts else None
+        failed = last.cypher if last is not None else cypher
+        failure = last.error if last is not None else error
+        if failure:
+            problem, reason = "실행에 실패했다", f"- Neo4j 오류: {failure}"
+        else:
+            problem = "실행 결과가 0행이었다"
+            reason = "- 조건에 쓴 값이 그래프에 저장된 값과 다르거나, 관계 / 프로퍼티를 잘못 골랐을 수 있다."
+        with span("repair.regenerate"):
+            try:
+                regenerated = await regenerate_cypher_async(
+                    question, product_id, graph_context, failed, reason, usage_sink=usage_sink, problem=problem
+                )
+            except ValueError as e:
+                # 쓰기 연산이 들어간 쿼리는 실행하지 않는다.
+                result.attempts.append(RepairAttempt(method="llm", cypher="", error=str(e)))
+            else:
+                attempt = RepairAttempt(method="llm", cypher=regenerated)
+                result.attempts.append(attempt)
+                checked = None
+                if guard or CYPHER_VALIDATE:
+                    checked = await guard_cypher_async(regenerated, params, explain=guard)
+                    attempt.cypher = checked.cypher
+                if checked is not None and not checked.ok:
+                    attempt.error = checked.reason()
+                else:
+                    rows = await _attempt(execute, attempt, params)
+                    record_rows(len(rows))
+
+    outcome = result.method or ("failed" if result.attempts else "skipped")
+    metrics.inc("qa_cypher_repairs_total", outcome=outcome)
+    annotate(repair=outcome, literal_fixes=len(result.fixes))
+    return result, rows if result.ok else []
@@ -0,0 +1,308 @@
+# cypher_templates.py
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Tuple
+
+from qa_cache import normalize_question
+
+# -----------------------------
+# 템플릿 라이브러리 설정
+# -----------------------------
+CYPHER_TEMPLATE_MAXSIZE = int(os.getenv("CYPHER_TEMPLATE_MAXSIZE", "500"))
+# 비워두면 메모리에만 저장한다. 경로를 주면 JSON 으로 저장/복원한다.
+CYPHER_TEMPLATE_PATH = os.getenv("CYPHER_TEMPLATE_PATH", "")
+
+# 문자열 리터럴 ("..." 또는 '...')
+_STRING_LITERAL_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'')
+# 리터럴 바로 앞의 "x.prop CONTAINS" / "x.prop =" / "x.prop STARTS WITH" 등
+_COMPARISON_RE = re.compile(
+    r"\w+\.(\w+)\s*(CONTAINS|=|STARTS\s+WITH|ENDS\s+WITH)\s*$",
+    re.IGNORECASE,
+)
+# 리터럴 바로 앞의 인라인 맵 "{prop: "
+_MAP_PROPERTY_RE = re.compile(r"[{,]\s*(\w+)\s*:\s*$")
+
+# 프로퍼티 → 값 검증에 쓸 상품 어휘 키 (graph_context.get_product_vocabulary 형식)
+PROPERTY_VOCABULARY: Dict[str, List[str]] = {
+    "category": ["event_categories", "limitation_categories"],
+    "name": ["coverage_names"],
+    "coverage_name": ["coverage_names"],
+    "type1": ["qualification_types"],
+    "type2": ["qualification_types"],
+}
+
+_WORD_CHAR_RE = re.compile(r"\w")
+
+# 슬롯 표시 (정규화된 질문 안에는 나오지 않는 문자)
+_SLOT = "\x00{}\x00"
+_SLOT_RE = re.compile(r"\x00(\d+)\x00")
+
+
+def despace(text: str) -> str:
+    """
+    공백/문장부호를 뺀 소문자 문자열. (normalize_question 과 같은 기준으로 비교하기 위함)
+    """
+    return re.sub(r"[^\w]", "", text).lower()
+
+
+def despaced_positions(text: str) -> List[int]:
+    """
+    despace(text) 의 i 번째 글자가 text 의 몇 번째 글자인지. (despace 기준 위치 → 원래 위치)
+    """
+    return [i for i, ch in enumerate(text) if _WORD_CHAR_RE.match(ch)]
+
+
+def _unescape(literal: str) -> str:
+    return re.sub(r"\\(.)", r"\1", literal)
+
+
+@dataclass
+class Slot:
+    prop: str       # 비교 대상 프로퍼티 (category, name, type1 ...)
+    operator: str   # "CONTAINS" / "=" / "STARTS WITH" / "ENDS WITH"
+
+
+@dataclass
+class CypherTemplate:
+    shape: str              # 슬롯 자리를 표시한 정규화 질문
+    skeleton: str           # 리터럴을 $t0, $t1 ... 로 바꾼 Cypher
+    slots: List[Slot]
+    source_question: str
+
+
+@dataclass
+class CypherLiteral:
+    value: str              # 따옴표 / 이스케이프를 푼 값
+    slot: Slot | None       # 어떤 프로퍼티와 어떤 연산자로 비교되는지 (모르면 None)
+    start: int              # cypher 안에서 따옴표를 포함한 위치 [start, end)
+    end: int
+
+
+def find_literals(cypher: str) -> List[CypherLiteral]:
+    """
+    Cypher 안의 문자열 리터럴을 앞에서부터 찾는다. (parameterize / cypher_repair 가 같은 기준을 쓴다)
+    """
+    literals: List[CypherLiteral] = []
+    for m in _STRING_LITERAL_RE.finditer(cypher):
+        before = cypher[: m.start()]
+        slot: Slot | None = None
+        cm = _COMPARISON_RE.search(before)
+        if cm:
+            slot = Slot(prop=cm.group(1), operator=" ".join(cm.group(2).upper().split()))
+        else:
+            mm = _MAP_PROPERTY_RE.search(before)
+            if mm:
+                slot = Slot(prop=mm.group(1), operator="=")
+        value = _unescape(m.group(1) if m.group(1) is not None else m.group(2))
+        literals.append(CypherLiteral(value=value, slot=slot, start=m.start(), end=m.end()))
+    return literals
+
+
+def parameterize(cypher: str) -> Tuple[str, List[Tuple[str, Slot | None]]]:
+    """
+    Cypher 안의 문자열 리터럴을 $t0, $t1 ... 파라미터로 바꾼다.
+    - 반환값: (skeleton, [(리터럴 값, 슬롯 정보 또는 None), ...])
+    - 슬롯 정보는 리터럴이 어떤 프로퍼티와 어떤 연산자로 비교되는지를 담는다.
+    """
+    literals = find_literals(cypher)
+    parts: List[str] = []
+    last = 0
+    for i, literal in enumerate(literals):
+        parts.append(cypher[last : literal.start])
+        parts.append(f"$t{i}")
+        last = literal.end
+    parts.append(cypher[last:])
+    return "".join(parts), [(literal.value, literal.slot) for literal in literals]
+
+
+def vocabulary_values(vocabulary: Dict[str, List[str]], prop: str) -> List[str]:
+    values: List[str] = []
+    for key in PROPERTY_VOCABULARY.get(prop, []):
+        values.extend(v for v in vocabulary.get(key, []) if v)
+    return values
+
+
+def resolve_value(captured: str, slot: Slot, vocabulary: Dict[str, List[str]]) -> str | None:
+    """
+    질문에서 잘라낸 값(공백 제거됨)이 상품에 실제로 있는 값과 맞는지 확인하고,
+    맞으면 그래프에 저장된 원래 표기(띄어쓰기 포함)로 되돌려준다.
+    """
+    target = despace(captured)
+    if not target:
+        return None
+
+    for value in vocabulary_values(vocabulary, slot.prop):
+        compact = despace(value)
+        if slot.operator == "=":
+            ok = compact == target
+        elif slot.operator == "STARTS WITH":
+            ok = compact.startswith(target)
+        elif slot.operator == "ENDS WITH":
+            ok = compact.endswith(target)
+        else:
+            ok = target in compact
+        if not ok:
+            continue
+
+        if slot.operator == "=":
+            return value
+        # 공백/문장부호를 뺀 위치를 원래 문자열 위치로 되돌려서 원래 표기를 잘라낸다.
+        index_map = despaced_positions(value)
+        start = compact.index(target) if slot.operator != "ENDS WITH" else len(compact) - len(target)
+        end = start + len(target) - 1
+        return value[index_map[start] : index_map[end] + 1]
+    return None
+
+
+def _match_shape(
+    parts: List[str],
+    text: str,
+    slots: List[Slot],
+    vocabulary: Dict[str, List[str]],
+) -> Dict[str, Any] | None:
+    """
+    parts 는 _SLOT_RE.split(shape) 결과: [고정, 슬롯번호, 고정, 슬롯번호, ..., 고정].
+    고정 부분은 그대로 맞춰보고, 슬롯 부분은 가능한 길이를 긴 것부터 시도하면서
+    상품 어휘로 검증되는 값만 받아들인다. (슬롯이 붙어 있어도 나눌 수 있도록 백트래킹)
+    """
+    fixed = parts[0]
+    if not text.startswith(fixed):
+        return None
+    text = text[len(fixed):]
+    if len(parts) == 1:
+        return {} if not text else None
+
+    slot_index = int(parts[1])
+    rest = parts[2:]
+    for end in range(len(text), 0, -1):
+        value = resolve_value(text[:end], slots[slot_index], vocabulary)
+        if value is None:
+            continue
+        params = _match_shape(rest, text[end:], slots, vocabulary)
+        if params is not None:
+            params[f"t{slot_index}"] = value
+            return params
+    return None
+
+
+class CypherTemplateLibrary:
+    """
+    검증된(결과가 있었던) 생성 Cypher 를 "질문 모양 + 파라미터화된 쿼리" 로 저장해두고,
+    새 질문이 같은 모양이면 슬롯 값만 바꿔 끼워서 LLM 호출 없이 쿼리를 만든다.
+
+    - 모든 리터럴이 질문 안에 그대로 등장하고, 비교 대상 프로퍼티를
+      상품 어휘로 검증할 수 있는 쿼리만 템플릿으로 만든다.
+    - 같은 skeleton 텍스트가 파라미터만 바뀌어 나가므로 Neo4j 실행 계획 캐시도 재사용된다.
+    """
+
+    def __init__(self, maxsize: int = CYPHER_TEMPLATE_MAXSIZE, path: str = CYPHER_TEMPLATE_PATH) -> None:
+        self.maxsize = maxsize
+        self.path = path
+        self._templates: "OrderedDict[str, CypherTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+
+        if self.path and os.path.exists(self.path):
+            self.load(self.path)
+
+    def learn(self, question: str, cypher: str, vocabulary: Dict[str, List[str]]) -> CypherTemplate | None:
+        """
+        실행 결과가 있었던 Cypher 로부터 템플릿을 만든다. 만들 수 없으면 None.
+        """
+        skeleton, literals = parameterize(cypher)
+        if not literals:
+            return None
+
+        shape = normalize_question(question)
+        slots: List[Slot] = []
+        for i, (value, slot) in enumerate(literals):
+            if slot is None or slot.prop not in PROPERTY_VOCABULARY:
+                return None
+            if resolve_value(value, slot, vocabulary) is None:
+                return None
+            compact = despace(value)
+            if not compact or compact not in shape:
+                return None
+            shape = shape.replace(compact, _SLOT.format(i), 1)
+            slots.append(slot)
+
+        if len(_SLOT_RE.sub("", shape)) < 2:
+            # 고정 텍스트가 거의 없으면 아무 질문에나 맞아버린다.
+            return None
+
+        template = CypherTemplate(shape=shape, skeleton=skeleton, slots=slots, source_question=question)
+        with self._lock:
+            self._templates[shape] = template
+            self._templates.move_to_end(shape)
+            while len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+            self.learned += 1
+        if self.path:
+            self.save(self.path)
+        return template
+
+    def match(self, question: str, vocabulary: Dict[str, List[str]]) -> Tuple[str, Dict[str, Any]] | None:
+        """
+        질문이 저장된 템플릿 모양과 맞고, 슬롯 값이 상품에 실제로 있는 값이면
+        (skeleton, 파라미터) 를 돌려준다.
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+
+        with self._lock:
+            templates = list(reversed(self._templates.values()))
+
+        for template in templates:
+            params = _match_shape(_SLOT_RE.split(template.shape), normalized, template.slots, vocabulary)
+            if params is not None:
+                with self._lock:
+                    self.hits += 1
+                    if template.shape in self._templates:
+                        self._templates.move_to_end(template.shape)
+                return template.skeleton, params
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            data = [asdict(t) for t in self._templates.values()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def load(self, path: str) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            for item in data:
+                item["slots"] = [Slot(**s) for s in item["slots"]]
+                template = CypherTemplate(**item)
+                self._templates[template.shape] = template
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._templates),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "learned": self.learned,
+            }
+
+
+# 프로세스 전체에서 공유하는 템플릿 라이브러리
+template_library = CypherTemplateLibrary()
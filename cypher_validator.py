@@ -0,0 +1,588 @@
+# cypher_validator.py
+
+import difflib
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from prompts import CYTHER_SYSTEM_PROMPT
+
+logger = logging.getLogger("cypher_validator")
+
+# -----------------------------
+# 로컬 Cypher 검증 설정
+# -----------------------------
+# 1 이면 LLM 이 만든 쿼리를 서버에 보내기 전에 스키마 기준으로 검사한다. (실행 경로와 무관하게)
+CYPHER_VALIDATE = os.getenv("CYPHER_VALIDATE", "1") == "1"
+# 1 이면 프롬프트에 적힌 스키마에 DB 에서 읽은 스키마를 더한다. (처음 한 번만 조회)
+CYPHER_SCHEMA_INTROSPECT = os.getenv("CYPHER_SCHEMA_INTROSPECT", "0") == "1"
+
+
+@dataclass
+class CypherIssue:
+    code: str       # "markdown" / "syntax" / "unknown_label" / "unknown_relationship" / "unknown_property"
+                    # / "relationship_direction" / "missing_anchor" / "product_id_misuse" / "unknown_parameter"
+    detail: str     # 무엇을 어떻게 고쳐야 하는지 (재생성 프롬프트에 그대로 들어간다)
+    position: int   # 쿼리 안의 글자 위치
+
+
+@dataclass
+class CypherSchema:
+    labels: Dict[str, Set[str]] = field(default_factory=dict)                     # 라벨 → 프로퍼티
+    relationships: Dict[str, Set[Tuple[str, str]]] = field(default_factory=dict)  # 관계 타입 → {(시작, 끝)}
+    rel_properties: Dict[str, Set[str]] = field(default_factory=dict)              # 관계 타입 → 프로퍼티
+
+    def merge(self, other: "CypherSchema") -> "CypherSchema":
+        merged = CypherSchema()
+        for source in (self, other):
+            for label, props in source.labels.items():
+                merged.labels.setdefault(label, set()).update(props)
+            for rel, ends in source.relationships.items():
+                merged.relationships.setdefault(rel, set()).update(ends)
+            for rel, props in source.rel_properties.items():
+                merged.rel_properties.setdefault(rel, set()).update(props)
+        return merged
+
+
+# ==============================
+# 스키마
+# ==============================
+
+_NODE_LINE_RE = re.compile(r"^- (\w+(?:\s*/\s*\w+)*)\s*$")
+_PROPERTY_LINE_RE = re.compile(r"^\s+- ([\w\s,]+?)(?::.*)?$")
+_RELATIONSHIP_RE = re.compile(r"\((\w+)\)-\[:(\w+)\]->\((\w+)\)")
+
+
+def parse_prompt_schema(prompt: str = CYTHER_SYSTEM_PROMPT) -> CypherSchema:
+    """
+    Cypher 생성 프롬프트의 [Neo4j schema 요약] 에서 라벨 / 프로퍼티 / 관계를 읽는다.
+    (LLM 이 보는 스키마와 검사 기준이 어긋나지 않도록 프롬프트를 그대로 기준으로 쓴다)
+    """
+    schema = CypherSchema()
+    section = prompt.split("[Neo4j schema 요약]", 1)[-1].split("규칙:", 1)[0]
+    nodes_part, _, rels_part = section.partition("관계:")
+
+    current: List[str] = []
+    for line in nodes_part.splitlines():
+        node = _NODE_LINE_RE.match(line)
+        if node:
+            current = [label.strip() for label in node.group(1).split("/")]
+            for label in current:
+                schema.labels.setdefault(label, set())
+            continue
+        prop = _PROPERTY_LINE_RE.match(line)
+        if prop and current:
+            names = {p.strip() for p in prop.group(1).split(",") if p.strip()}
+            for label in current:
+                schema.labels[label].update(names)
+
+    for start, rel, end in _RELATIONSHIP_RE.findall(rels_part):
+        schema.relationships.setdefault(rel, set()).add((start, end))
+        schema.rel_properties.setdefault(rel, set())
+    return schema
+
+
+def introspect_schema() -> CypherSchema:
+    """
+    DB 의 라벨별 프로퍼티와 관계 양끝 라벨을 읽는다. (db.schema.* 프로시저)
+    """
+    from graph_client import run_in_session
+
+    node_rows, rel_rows, visual_rows = run_in_session([
+        ("CALL db.schema.nodeTypeProperties() YIELD nodeLabels, propertyName "
+         "RETURN nodeLabels, propertyName", {}),
+        ("CALL db.schema.relTypeProperties() YIELD relType, propertyName "
+         "RETURN relType, propertyName", {}),
+        ("CALL db.schema.visualization() YIELD relationships RETURN relationships", {}),
+    ])
+    schema = CypherSchema()
+    for row in node_rows:
+        for label in row["nodeLabels"] or []:
+            props = schema.labels.setdefault(label, set())
+            if row["propertyName"]:
+                props.add(row["propertyName"])
+    for row in rel_rows:
+        # relType 은 ":`HAS_EVENT`" 형식
+        rel = row["relType"].lstrip(":").strip("`")
+        props = schema.rel_properties.setdefault(rel, set())
+        if row["propertyName"]:
+            props.add(row["propertyName"])
+    for row in visual_rows:
+        # 가상 관계는 record.data() 에서 (시작 노드, 타입, 끝 노드) 로 풀리고, 노드의 name 이 라벨이다.
+        for rel in row["relationships"] or []:
+            if isinstance(rel, (list, tuple)) and len(rel) == 3:
+                start, rel_type, end = rel
+                schema.relationships.setdefault(rel_type, set()).add((start.get("name"), end.get("name")))
+    return schema
+
+
+_schema: CypherSchema | None = None
+_schema_lock = threading.Lock()
+
+
+def get_cypher_schema() -> CypherSchema:
+    """
+    검사에 쓸 스키마. 프롬프트 스키마 (+ CYPHER_SCHEMA_INTROSPECT 이면 DB 스키마) 를 한 번만 만든다.
+    DB 조회에 실패하면 프롬프트 스키마만 쓴다.
+    """
+    global _schema
+    if _schema is None:
+        with _schema_lock:
+            if _schema is None:
+                schema = parse_prompt_schema()
+                if CYPHER_SCHEMA_INTROSPECT:
+                    try:
+                        schema = schema.merge(introspect_schema())
+                    except Exception as e:
+                        logger.warning("DB 스키마 조회 실패, 프롬프트 스키마만 사용: %s", e)
+                _schema = schema
+    return _schema
+
+
+# ==============================
+# 토큰화
+# ==============================
+
+_TOKEN_RE = re.compile(
+    r"""
+      (?P<ws>\s+)
+    | (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<fence>```)
+    | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<name>`(?:[^`]|``)+`|[^\W\d]\w*)
+    | (?P<param>\$\w+)
+    | (?P<number>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+    | (?P<op><>|<=|>=|=~|\.\.|[-<>=+*/%^.,:;|&!(){}\[\]])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_CLAUSE_START = {"MATCH", "OPTIONAL", "WITH", "UNWIND", "CALL", "RETURN", "USE", "EXPLAIN", "PROFILE"}
+# 이 다음에 오는 "(" 는 노드 패턴
+_PATTERN_KEYWORDS = {"MATCH", "MERGE", "CREATE"}
+_CLOSING = {")": "(", "]": "[", "}": "{"}
+
+
+@dataclass
+class Token:
+    kind: str       # "name" / "string" / "param" / "number" / "op" / "fence"
+    value: str
+    pos: int
+
+    @property
+    def upper(self) -> str:
+        return self.value.upper() if self.kind == "name" else self.value
+
+    @property
+    def ident(self) -> str:
+        # `백틱 이름` 은 백틱을 벗긴다.
+        if self.kind == "name" and self.value.startswith("`"):
+            return self.value[1:-1].replace("``", "`")
+        return self.value
+
+
+def tokenize(cypher: str) -> Tuple[List[Token], List[CypherIssue]]:
+    """
+    Cypher 를 토큰으로 나눈다. (공백/주석 제외) 읽을 수 없는 글자는 문제로 돌려준다.
+    """
+    tokens: List[Token] = []
+    issues: List[CypherIssue] = []
+    pos = 0
+    while pos < len(cypher):
+        m = _TOKEN_RE.match(cypher, pos)
+        if m is None:
+            ch = cypher[pos]
+            if ch in "\"'`":
+                issues.append(CypherIssue("syntax", f"{pos + 1}번째 글자에서 시작한 {ch} 따옴표가 닫히지 않았다.", pos))
+                break
+            issues.append(CypherIssue("syntax", f"{pos + 1}번째 글자 {ch!r} 는 Cypher 에서 쓸 수 없다.", pos))
+            pos += 1
+            continue
+        kind = m.lastgroup
+        if kind not in ("ws", "comment"):
+            tokens.append(Token(kind, m.group(), pos))
+        pos = m.end()
+    return tokens, issues
+
+
+# ==============================
+# 검사
+# ==============================
+
+@dataclass
+class _Frame:
+    bracket: str                    # "(" / "[" / "{"
+    start: int                      # 여는 괄호의 토큰 위치
+    after_pattern_token: bool       # "-" / ">" / MATCH 등 바로 뒤에서 열렸는지
+    simple: bool = True             # 이름 / 라벨 / 속성 맵만 들어 있는지 (노드 패턴 모양)
+    var: str | None = None
+    labels: List[str] = field(default_factory=list)
+    rel: bool = False               # "-[" 로 열린 관계 패턴
+    incoming: bool = False          # "<-[" 이면 True
+    owner: Set[str] | None = None   # "{" 가 속성 맵 / 맵 프로젝션이면 그 라벨 (또는 관계 타입)
+    owner_is_rel: bool = False
+    projection: bool = False        # "{" 가 맵 프로젝션이면 True (key: 식 항목은 새 키라 보지 않는다)
+    last_key: str | None = None     # 맵 안에서 마지막으로 본 키
+
+
+def _suggest(name: str, candidates: Iterable[str]) -> str:
+    candidates = sorted(candidates)
+    lower = {c.lower(): c for c in candidates}
+    if name.lower() in lower:
+        return f" 대소문자가 다르다: {lower[name.lower()]}"
+    close = difflib.get_close_matches(name, candidates, n=1, cutoff=0.6)
+    return f" {close[0]} 을(를) 말한 것인가?" if close else ""
+
+
+class _Checker:
+    def __init__(self, tokens: List[Token], schema: CypherSchema, allowed_params: Set[str]) -> None:
+        self.tokens = tokens
+        self.schema = schema
+        self.allowed_params = allowed_params
+        self.issues: List[CypherIssue] = []
+        self.stack: List[_Frame] = []
+        # 변수 → 라벨 (노드) 또는 관계 타입 (관계)
+        self.nodes: Dict[str, Set[str]] = {}
+        self.rels: Dict[str, Set[str]] = {}
+        # 직전 노드 패턴의 라벨과, 그 뒤에 나온 관계 패턴 (다음 노드 패턴에서 양끝을 맞춰본다)
+        self.last_node: Set[str] | None = None
+        self.pending_rel: Tuple[Set[str], str] | None = None
+        self.clause = ""
+        self.anchored = False
+
+    def add(self, code: str, detail: str, token: Token) -> None:
+        if all(i.detail != detail for i in self.issues):
+            self.issues.append(CypherIssue(code, detail, token.pos))
+
+    def tok(self, i: int) -> Token | None:
+        return self.tokens[i] if 0 <= i < len(self.tokens) else None
+
+    def value(self, i: int) -> str:
+        t = self.tok(i)
+        return t.upper if t is not None else ""
+
+    # -- 스키마 대조 ----------------------------------------------------
+
+    def check_label(self, label: str, token: Token) -> None:
+        if label not in self.schema.labels:
+            self.add(
+                "unknown_label",
+                f"라벨 :{label} 은(는) 스키마에 없다.{_suggest(label, self.schema.labels)} "
+                f"(쓸 수 있는 라벨: {', '.join(sorted(self.schema.labels))})",
+                token,
+            )
+
+    def check_rel_type(self, rel: str, token: Token) -> None:
+        if rel not in self.schema.relationships:
+            self.add(
+                "unknown_relationship",
+                f"관계 타입 :{rel} 은(는) 스키마에 없다.{_suggest(rel, self.schema.relationships)} "
+                f"(쓸 수 있는 관계: {', '.join(sorted(self.schema.relationships))})",
+                token,
+            )
+
+    def check_property(self, owner: Set[str], is_rel: bool, prop: str, token: Token) -> None:
+        known = self.schema.rel_properties if is_rel else self.schema.labels
+        if not owner or any(o not in known for o in owner):
+            return  # 라벨을 모르면(이미 따로 보고됨) 프로퍼티는 보지 않는다.
+        allowed = set().union(*(known[o] for o in owner))
+        if prop in allowed:
+            return
+        what = "/".join(sorted(owner))
+        if is_rel:
+            detail = f"관계 :{what} 에는 프로퍼티가 없다. ({prop} 을(를) 쓸 수 없다)"
+        else:
+            detail = (
+                f"{what} 에는 {prop} 프로퍼티가 없다.{_suggest(prop, allowed)} "
+                f"(쓸 수 있는 프로퍼티: {', '.join(sorted(allowed))})"
+            )
+        self.add("unknown_property", detail, token)
+
+    def check_endpoints(self, types: Set[str], direction: str, left: Set[str], right: Set[str], token: Token) -> Set[str]:
+        """
+        관계 양끝 라벨을 스키마와 맞춰본다. 오른쪽 노드에 라벨이 없으면 스키마로 추정한 라벨을 돌려준다.
+        """
+        known = [t for t in types if t in self.schema.relationships]
+        if not known or any(label not in self.schema.labels for label in left | right):
+            return right  # 모르는 타입/라벨은 이미 따로 보고된다.
+        pairs = set().union(*(self.schema.relationships[t] for t in known))
+        if direction == "in":
+            pairs = {(end, start) for start, end in pairs}
+        elif direction == "both":
+            pairs = pairs | {(end, start) for start, end in pairs}
+
+        if left and right:
+            if not any(a in left and b in right for a, b in pairs):
+                shapes = ", ".join(
+                    f"({a})-[:{t}]->({b})" for t in known for a, b in sorted(self.schema.relationships[t])
+                )
+                self.add(
+                    "relationship_direction",
+                    f"({'/'.join(sorted(left))}) 와 ({'/'.join(sorted(right))}) 는 "
+                    f":{'|'.join(known)} 로 이어지지 않는다. 스키마의 관계: {shapes}",
+                    token,
+                )
+            return right
+        if not right:
+            return {b for a, b in pairs if not left or a in left}
+        return right
+
+    # -- 순회 ------------------------------------------------------------
+
+    def run(self) -> List[CypherIssue]:
+        tokens = self.tokens
+        if not tokens:
+            return [CypherIssue("syntax", "쿼리가 비어 있다.", 0)]
+
+        for t in tokens:
+            if t.kind == "fence":
+                self.add("markdown", "마크다운 코드블록 표시(```)가 남아 있다. 순수한 Cypher 텍스트만 출력해야 한다.", t)
+        first = tokens[0]
+        if first.kind != "fence" and first.upper not in _CLAUSE_START:
+            self.add(
+                "markdown",
+                f"쿼리가 {first.value!r} 로 시작한다. 설명 문장 없이 MATCH / OPTIONAL MATCH / WITH 등 "
+                "Cypher 절로 시작해야 한다.",
+                first,
+            )
+        if self.issues:
+            # 쿼리 밖 텍스트가 섞여 있으면 나머지 검사 결과는 의미가 없다.
+            return self.issues
+
+        for i, t in enumerate(tokens):
+            if t.kind == "fence":
+                continue
+            frame = self.stack[-1] if self.stack else None
+            if frame is not None and frame.bracket == "(" and i > frame.start + 1 and not self._simple_part(i, frame):
+                frame.simple = False
+
+            if t.kind == "name" and not self.stack and t.upper in _PATTERN_KEYWORDS | {"WITH", "RETURN", "WHERE", "UNWIND"}:
+                self.clause = t.upper
+                self.last_node = None
+                self.pending_rel = None
+            elif t.value in ("(", "[", "{") and t.kind == "op":
+                self.open(i, t)
+            elif t.value in _CLOSING and t.kind == "op":
+                self.close(i, t)
+            elif t.value == ":" and t.kind == "op":
+                self.colon(i, t)
+            elif t.value == "." and t.kind == "op":
+                self.dot(i, t)
+            elif t.kind == "param":
+                self.param(i, t)
+            elif t.kind == "string":
+                self.literal(i, t)
+
+        for frame in self.stack:
+            opener = tokens[frame.start]
+            self.add("syntax", f"{opener.pos + 1}번째 글자의 {frame.bracket} 가 닫히지 않았다.", opener)
+        if not self.anchored:
+            self.add(
+                "missing_anchor",
+                "쿼리에 $product_id 가 없다. (p:Product {product_id: $product_id}) 처럼 "
+                "$product_id 파라미터로 상품을 찾아서 출발해야 한다.",
+                tokens[0],
+            )
+        return self.issues
+
+    def _simple_part(self, i: int, frame: _Frame) -> bool:
+        t = self.tokens[i]
+        return t.kind == "name" or t.value in (":", "|", "&", "!", "{", ")")
+
+    def open(self, i: int, t: Token) -> None:
+        prev = self.tok(i - 1)
+        prev_value = self.value(i - 1)
+        after_pattern = prev_value in ("-", ">") or (
+            self.clause in _PATTERN_KEYWORDS and prev_value in _PATTERN_KEYWORDS | {",", "=", "MATCH"}
+        )
+        frame = _Frame(bracket=t.value, start=i, after_pattern_token=after_pattern)
+
+        if t.value == "(":
+            nxt = self.tok(i + 1)
+            if nxt is not None and nxt.kind == "name" and self.value(i + 2) in (":", "{", ")"):
+                frame.var = nxt.ident
+        elif t.value == "[":
+            frame.rel = prev_value == "-"
+            frame.incoming = frame.rel and self.value(i - 2) == "<"
+            nxt = self.tok(i + 1)
+            if frame.rel and nxt is not None and nxt.kind == "name" and self.value(i + 2) in (":", "]", "{", "*"):
+                frame.var = nxt.ident
+        else:
+            parent = self.stack[-1] if self.stack else None
+            if parent is not None and parent.bracket == "(" and prev is not None and prev.kind == "name" \
+                    and (parent.labels or (parent.var and parent.after_pattern_token)):
+                # (c:Coverage {name: ...}) 의 속성 맵. collect(e {...}) 처럼 함수 호출 괄호 안이면
+                # 패턴이 아니라 맵 프로젝션이다.
+                frame.owner = set(parent.labels) or self.nodes.get(parent.var or "")
+            elif parent is not None and parent.bracket == "[" and parent.rel:
+                frame.owner, frame.owner_is_rel = set(parent.labels), True
+            elif prev is not None and prev.kind == "name":
+                # e {.category, .reason} 맵 프로젝션
+                frame.projection = True
+                if prev.ident in self.nodes:
+                    frame.owner = self.nodes[prev.ident]
+                elif prev.ident in self.rels:
+                    frame.owner, frame.owner_is_rel = self.rels[prev.ident], True
+        self.stack.append(frame)
+
+    def close(self, i: int, t: Token) -> None:
+        if not self.stack or self.stack[-1].bracket != _CLOSING[t.value]:
+            self.add("syntax", f"{t.pos + 1}번째 글자의 {t.value} 와 짝이 맞는 여는 괄호가 없다.", t)
+            return
+        frame = self.stack.pop()
+        if frame.bracket == "(":
+            node = frame.simple and (frame.after_pattern_token or self.value(i + 1) in ("-", "<"))
+            if node:
+                self.node_done(frame, t)
+        elif frame.bracket == "[" and frame.rel:
+            types = set(frame.labels)
+            if frame.var and types:
+                self.rels[frame.var] = types
+            if self.value(i + 1) == "-" and self.value(i + 2) == ">":
+                direction = "out"
+            else:
+                direction = "in" if frame.incoming else "both"
+            self.pending_rel = (types, direction) if types else None
+
+    def node_done(self, frame: _Frame, t: Token) -> None:
+        labels = set(frame.labels)
+        if not labels and frame.var:
+            labels = set(self.nodes.get(frame.var, set()))
+        if self.pending_rel is not None and self.last_node is not None:
+            types, direction = self.pending_rel
+            labels = self.check_endpoints(types, direction, self.last_node, labels, t)
+        self.pending_rel = None
+        if frame.var and labels:
+            self.nodes.setdefault(frame.var, set()).update(labels)
+        self.last_node = labels
+
+    def colon(self, i: int, t: Token) -> None:
+        frame = self.stack[-1] if self.stack else None
+        if frame is not None and frame.bracket == "{":
+            key = self.tok(i - 1)
+            if key is not None and key.kind == "name":
+                frame.last_key = key.ident
+                # 패턴의 속성 맵만 키를 프로퍼티로 본다. (맵 프로젝션의 events: collect(...) 는 새 키)
+                if frame.owner is not None and not frame.projection:
+                    self.check_property(frame.owner, frame.owner_is_rel, key.ident, key)
+            return
+
+        # 라벨 / 관계 타입 식: ":A|B", ":A&B", ":!A", ":A:B"
+        names: List[Token] = []
+        j = i + 1
+        while True:
+            nxt = self.tok(j)
+            if nxt is None:
+                break
+            if nxt.kind == "name":
+                names.append(nxt)
+            elif nxt.value not in ("|", "&", "!", ":"):
+                break
+            j += 1
+        if not names:
+            self.add("syntax", f"{t.pos + 1}번째 글자의 : 뒤에 라벨이나 관계 타입 이름이 없다.", t)
+            return
+
+        rel = frame is not None and frame.bracket == "[" and frame.rel
+        for name in names:
+            if rel:
+                self.check_rel_type(name.ident, name)
+            else:
+                self.check_label(name.ident, name)
+        if frame is not None and frame.bracket in ("(", "["):
+            frame.labels.extend(n.ident for n in names)
+        # WHERE n:Label 처럼 패턴 밖에서 라벨을 붙인 경우도 변수 라벨로 기억한다.
+        var = self.tok(i - 1)
+        if not rel and var is not None and var.kind == "name" and (frame is None or frame.bracket != "("):
+            self.nodes.setdefault(var.ident, set()).update(n.ident for n in names)
+
+    def dot(self, i: int, t: Token) -> None:
+        prop = self.tok(i + 1)
+        if prop is None or prop.kind != "name":
+            return
+        prev = self.tok(i - 1)
+        frame = self.stack[-1] if self.stack else None
+        if prev is not None and prev.value in ("{", ",") and frame is not None and frame.bracket == "{":
+            # 맵 프로젝션 안의 .prop
+            if frame.owner is not None:
+                self.check_property(frame.owner, frame.owner_is_rel, prop.ident, prop)
+            return
+        if prev is None or prev.kind != "name" or self.value(i - 2) == ".":
+            return  # a.b.c / 함수 이름공간 등은 보지 않는다.
+        if prev.ident in self.nodes:
+            self.check_property(self.nodes[prev.ident], False, prop.ident, prop)
+        elif prev.ident in self.rels:
+            self.check_property(self.rels[prev.ident], True, prop.ident, prop)
+
+    def _compared_property(self, i: int) -> str | None:
+        """
+        i 번째 토큰(값)이 비교/매칭되는 프로퍼티 이름. ({prop: 값}, x.prop = 값, x.prop CONTAINS 값 ...)
+        """
+        frame = self.stack[-1] if self.stack else None
+        if self.value(i - 1) == ":" and frame is not None and frame.bracket == "{":
+            if frame.projection:
+                return None
+            key = self.tok(i - 2)
+            return key.ident if key is not None and key.kind == "name" else None
+        j = i - 1
+        if self.value(j) in ("=", "<>", "CONTAINS", "IN"):
+            j -= 1
+        elif self.value(j) == "WITH" and self.value(j - 1) in ("STARTS", "ENDS"):
+            j -= 2
+        else:
+            return None
+        if self.value(j - 1) == ".":
+            prop = self.tok(j)
+            return prop.ident if prop is not None and prop.kind == "name" else None
+        return None
+
+    def param(self, i: int, t: Token) -> None:
+        name = t.value[1:]
+        if name not in self.allowed_params:
+            self.add(
+                "unknown_parameter",
+                f"${name} 파라미터는 전달되지 않는다. 쓸 수 있는 파라미터는 "
+                f"{', '.join('$' + p for p in sorted(self.allowed_params))} 뿐이고, 나머지 값은 리터럴로 넣어야 한다.",
+                t,
+            )
+            return
+        if name != "product_id":
+            return
+        self.anchored = True
+        prop = self._compared_property(i)
+        if prop is not None and prop != "product_id":
+            self.add(
+                "product_id_misuse",
+                f"$product_id 를 {prop} 와 비교하고 있다. $product_id 는 product_id 프로퍼티에만 써야 한다.",
+                t,
+            )
+
+    def literal(self, i: int, t: Token) -> None:
+        if self._compared_property(i) == "product_id":
+            self.add(
+                "product_id_misuse",
+                f"product_id 를 리터럴 {t.value} 로 적었다. 상품은 $product_id 파라미터로만 지정해야 한다.",
+                t,
+            )
+
+
+def validate_cypher(
+    cypher: str,
+    params: Dict[str, Any] | Iterable[str] | None = None,
+    schema: CypherSchema | None = None,
+) -> List[CypherIssue]:
+    """
+    서버에 보내지 않고 쿼리를 검사한다. 문제가 없으면 빈 리스트.
+    - 라벨 / 관계 타입 / 프로퍼티를 스키마와 대조하고, 관계 양끝 라벨과 방향도 맞춰본다.
+    - $product_id 로 상품을 지정하는지, 전달되지 않는 파라미터를 쓰지 않는지 본다.
+    - 마크다운 코드블록이나 설명 문장이 남아 있는지 본다.
+    - params: 실행할 때 넘길 파라미터 (이름 목록이나 dict). 생략하면 product_id 만.
+    """
+    tokens, issues = tokenize(cypher)
+    allowed = set(params) if params is not None else {"product_id"}
+    allowed.add("product_id")
+    checker = _Checker(tokens, schema or get_cypher_schema(), allowed)
+    return issues + checker.run()
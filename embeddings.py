@@ -0,0 +1,124 @@
+# embeddings.py
+
+import importlib
+import math
+import os
+import re
+import zlib
+from typing import Callable, Dict, Iterable, List, Protocol
+
+# -----------------------------
+# 임베딩 설정
+# -----------------------------
+# "hashing" (기본, 오프라인/결정적) / "openai" / "패키지.모듈:팩토리" (로컬 모델 플러그인)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class Embedder(Protocol):
+    """
+    텍스트 목록 → 같은 길이의 (L2 정규화된) 벡터 목록.
+    name 은 인덱스에 기록해서, 다른 모델로 만든 인덱스를 섞어 쓰지 않도록 한다.
+    """
+    name: str
+    dim: int
+
+    def embed(self, texts: List[str]) -> List[List[float]]: ...
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        return vector
+    return [v / norm for v in vector]
+
+
+class HashingEmbedder:
+    """
+    문자 bigram 을 feature hashing 한 결정적 임베딩. (모델/네트워크 없이 동작)
+    같은 입력이면 어느 프로세스에서나 같은 벡터가 나오므로 오프라인 환경과 테스트용으로 쓴다.
+    의미 유사도는 못 잡지만, 표기가 조금 다른 질문("뇌출혈진단" ↔ "뇌출혈 진단비")은 가깝게 나온다.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM) -> None:
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in _WORD_RE.findall(text.lower()):
+            grams = [word] if len(word) == 1 else [word[i : i + 2] for i in range(len(word) - 1)]
+            for gram in grams:
+                h = zlib.crc32(gram.encode("utf-8"))
+                # 부호도 해시로 정해서 충돌이 한쪽으로 쌓이지 않게 한다.
+                vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return _normalize(vector)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed_one(t) for t in texts]
+
+
+class OpenAIEmbedder:
+    """
+    OpenAI 임베딩 API. (네트워크/키 필요)
+    """
+
+    def __init__(self, model: str = OPENAI_EMBEDDING_MODEL) -> None:
+        from config import client
+
+        self._client = client
+        self.model = model
+        self.name = f"openai-{model}"
+        self.dim = 0  # 첫 응답에서 정해진다.
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self._client.embeddings.create(model=self.model, input=texts)
+        vectors = [_normalize(list(d.embedding)) for d in response.data]
+        if vectors:
+            self.dim = len(vectors[0])
+        return vectors
+
+
+_BACKENDS: Dict[str, Callable[[], Embedder]] = {
+    "hashing": HashingEmbedder,
+    "openai": OpenAIEmbedder,
+}
+
+
+def get_embedder(backend: str = EMBEDDING_BACKEND) -> Embedder:
+    """
+    설정된 임베딩 백엔드를 만든다.
+    "패키지.모듈:팩토리" 형식이면 그 팩토리를 import 해서 호출한다.
+    (예: 로컬 sentence-transformers 래퍼. embed(texts) / name / dim 만 있으면 된다)
+    """
+    if backend in _BACKENDS:
+        return _BACKENDS[backend]()
+    module_name, _, factory_name = backend.partition(":")
+    if not factory_name:
+        raise ValueError(f"알 수 없는 임베딩 백엔드입니다: {backend}")
+    factory = getattr(importlib.import_module(module_name), factory_name)
+    return factory()
+
+
+def embed_in_batches(
+    embedder: Embedder,
+    texts: Iterable[str],
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+) -> List[List[float]]:
+    """
+    texts 를 batch_size 개씩 나눠서 임베딩한다. (API 요청 수 / 모델 호출 수를 줄이기 위함)
+    """
+    vectors: List[List[float]] = []
+    batch: List[str] = []
+    for text in texts:
+        batch.append(text)
+        if len(batch) >= batch_size:
+            vectors.extend(embedder.embed(batch))
+            batch = []
+    if batch:
+        vectors.extend(embedder.embed(batch))
+    return vectors
@@ -0,0 +1,131 @@
+"""
+로컬 메타데이터 플래너 vs LLM 플래너 오프라인 평가
+
+- 질문 세트(sample_docs/questions.txt)에 대해 로컬 규칙 플래너와 LLM 플래너의 선택을 비교한다.
+- LLM 결과를 --save-labels 로 저장해두면, 이후에는 --labels 로 그 파일을 정답으로 써서
+  API 호출 없이 반복 평가할 수 있다.
+- 정확도(정확 일치, 평균 Jaccard, 타입별 precision/recall)와 지연 시간을 함께 보고한다.
+
+실행 예:
+    python eval_planner.py --save-labels planner_labels.json     # LLM 호출 (OPENAI_API_KEY 필요)
+    python eval_planner.py --labels planner_labels.json          # 완전 오프라인
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Set
+
+QUESTIONS_PATH = "./sample_docs/questions.txt"
+
+
+def load_questions(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="로컬 메타데이터 플래너 오프라인 평가")
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--labels", help="LLM 플래너 결과(JSON: 질문 → 타입 리스트). 주면 LLM 을 호출하지 않는다.")
+    parser.add_argument("--save-labels", help="LLM 플래너 결과를 이 경로에 저장")
+    parser.add_argument("--vocabulary", help="(선택) 상품 어휘 JSON (graph_context.get_product_vocabulary 형식)")
+    parser.add_argument("--show-diff", action="store_true", help="불일치 질문을 출력")
+    args = parser.parse_args()
+
+    if args.labels:
+        # 라벨 파일만으로 평가할 때는 OpenAI 키가 필요 없다.
+        os.environ.setdefault("OPENAI_API_KEY", "sk-eval-dummy")
+
+    from config import PLANNER_CONFIDENCE_THRESHOLD
+    from metadata_planner import ALLOWED_METADATA_TYPES, plan_metadata_types_llm, plan_metadata_types_local
+
+    questions = load_questions(args.questions)
+
+    vocabulary = None
+    if args.vocabulary:
+        with open(args.vocabulary, "r", encoding="utf-8") as f:
+            vocabulary = json.load(f)
+
+    labels: Dict[str, List[str]] = {}
+    llm_ms: List[float] = []
+    if args.labels:
+        with open(args.labels, "r", encoding="utf-8") as f:
+            labels = json.load(f)
+    else:
+        for q in questions:
+            t0 = time.perf_counter()
+            labels[q] = plan_metadata_types_llm(q)
+            llm_ms.append((time.perf_counter() - t0) * 1000)
+
+    # 라벨이 없는 질문은 평가에서 뺀다.
+    questions = [q for q in questions if q in labels]
+
+    if args.save_labels:
+        with open(args.save_labels, "w", encoding="utf-8") as f:
+            json.dump(labels, f, ensure_ascii=False, indent=2)
+
+    local_us: List[float] = []
+    exact = 0
+    jaccards: List[float] = []
+    fallbacks = 0
+    tp = {t: 0 for t in ALLOWED_METADATA_TYPES}
+    fp = {t: 0 for t in ALLOWED_METADATA_TYPES}
+    fn = {t: 0 for t in ALLOWED_METADATA_TYPES}
+
+    for q in questions:
+        t0 = time.perf_counter()
+        local, confidence = plan_metadata_types_local(q, vocabulary)
+        local_us.append((time.perf_counter() - t0) * 1e6)
+
+        expected = set(labels[q]) & ALLOWED_METADATA_TYPES
+        predicted = set(local)
+        if confidence < PLANNER_CONFIDENCE_THRESHOLD:
+            # 실제 운영에서는 LLM 으로 넘어가는 질문
+            fallbacks += 1
+
+        if predicted == expected:
+            exact += 1
+        elif args.show_diff:
+            print(f"- {q}\n    local={sorted(predicted)} (conf={confidence:.2f})\n    llm  ={sorted(expected)}")
+        jaccards.append(_jaccard(predicted, expected))
+
+        for t in ALLOWED_METADATA_TYPES:
+            if t in predicted and t in expected:
+                tp[t] += 1
+            elif t in predicted:
+                fp[t] += 1
+            elif t in expected:
+                fn[t] += 1
+
+    n = len(questions)
+    if not n:
+        print("평가할 질문이 없습니다.")
+        return
+    print(f"질문 수: {n}")
+    print(f"정확 일치: {exact}/{n} ({exact / n:.1%})")
+    print(f"평균 Jaccard: {statistics.mean(jaccards):.3f}")
+    print(f"LLM fallback 비율 (conf < {PLANNER_CONFIDENCE_THRESHOLD}): {fallbacks}/{n} ({fallbacks / n:.1%})")
+    print()
+    print(f"{'type':<24}{'precision':>10}{'recall':>10}")
+    for t in sorted(ALLOWED_METADATA_TYPES):
+        precision = tp[t] / (tp[t] + fp[t]) if tp[t] + fp[t] else 0.0
+        recall = tp[t] / (tp[t] + fn[t]) if tp[t] + fn[t] else 0.0
+        print(f"{t:<24}{precision:>10.2f}{recall:>10.2f}")
+    print()
+    print(f"로컬 플래너 지연: mean={statistics.mean(local_us):.1f}us p50={statistics.median(local_us):.1f}us")
+    if llm_ms:
+        print(f"LLM 플래너 지연:  mean={statistics.mean(llm_ms):.1f}ms p50={statistics.median(llm_ms):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
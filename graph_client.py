@@ -1,29 +1,400 @@
-from typing import Any, Dict, List
+import asyncio
+import json
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Tuple
 
-from config import driver, NEO4J_DB
+from dotenv import load_dotenv
+from neo4j import (
+    AsyncDriver,
+    AsyncGraphDatabase,
+    AsyncSession,
+    Driver,
+    GraphDatabase,
+    Query,
+    READ_ACCESS,
+    Session,
+    WRITE_ACCESS,
+)
 
+from graph_schema import check_schema, format_schema_report
+from tracing import record_rows, span
 
-def run_cypher(cypher: str, params: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+# -----------------------------
+# Neo4j 설정
+# -----------------------------
+# 적재 스크립트(json2graph.py 등)는 OpenAI 키 없이도 돌아야 하므로
+# Neo4j 설정은 config.py 가 아니라 여기서 .env / 환경변수로 직접 읽는다.
+load_dotenv()
+
+# bolt:// 는 단일 서버, neo4j:// 는 클러스터 라우팅(읽기는 팔로워, 쓰기는 리더로 분산)
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "비밀번호를_여기에")  # .env 에 NEO4J_PASSWORD 넣는 걸 추천
+NEO4J_DB = os.getenv("NEO4J_DB", "shlife-kg")  # DB 이름도 필요하면 .env 로 뺄 수 있음
+
+# 커넥션 풀 설정 (Streamlit 동시 접속 수에 맞춰 조정)
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+# 풀이 꽉 찼을 때 커넥션을 기다리는 최대 시간
+NEO4J_ACQUISITION_TIMEOUT_SEC = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT_SEC", "30"))
+# 새 커넥션을 맺을 때의 타임아웃
+NEO4J_CONNECTION_TIMEOUT_SEC = float(os.getenv("NEO4J_CONNECTION_TIMEOUT_SEC", "15"))
+# 이 시간보다 오래된 커넥션은 풀에서 버리고 새로 맺는다 (LB/방화벽 idle 끊김 대비)
+NEO4J_MAX_CONNECTION_LIFETIME_SEC = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME_SEC", "3600"))
+NEO4J_KEEP_ALIVE = os.getenv("NEO4J_KEEP_ALIVE", "1") == "1"
+
+# -----------------------------
+# 쿼리 결과 크기 제한
+# -----------------------------
+# LIMIT 없는 생성 쿼리가 노드 전체를 돌려줘도 메모리/프롬프트가 터지지 않도록
+# 행 수와 (JSON 기준) 바이트 수 상한을 둔다. 0 이면 제한 없음.
+CYPHER_MAX_ROWS = int(os.getenv("CYPHER_MAX_ROWS", "200"))
+CYPHER_MAX_BYTES = int(os.getenv("CYPHER_MAX_BYTES", str(256 * 1024)))
+# 서버에서 한 번에 받아오는 레코드 수 (작을수록 조기 중단 시 덜 받아온다)
+CYPHER_FETCH_SIZE = int(os.getenv("CYPHER_FETCH_SIZE", "100"))
+
+_driver: Driver | None = None
+_driver_lock = threading.Lock()
+
+# 비동기 드라이버는 만든 이벤트 루프에서만 쓸 수 있으므로 루프마다 하나씩 둔다.
+_async_drivers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncDriver]" = weakref.WeakKeyDictionary()
+
+
+def _driver_options() -> Dict[str, Any]:
+    return {
+        "auth": (NEO4J_USER, NEO4J_PASSWORD),
+        "max_connection_pool_size": NEO4J_MAX_POOL_SIZE,
+        "connection_acquisition_timeout": NEO4J_ACQUISITION_TIMEOUT_SEC,
+        "connection_timeout": NEO4J_CONNECTION_TIMEOUT_SEC,
+        "max_connection_lifetime": NEO4J_MAX_CONNECTION_LIFETIME_SEC,
+        "keep_alive": NEO4J_KEEP_ALIVE,
+    }
+
+
+def get_driver() -> Driver:
+    """
+    프로세스 전체에서 공유하는 Neo4j 드라이버 (커넥션 풀 포함).
+    처음 필요할 때 만들고, 이후에는 같은 인스턴스를 돌려준다.
+    """
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(NEO4J_URI, **_driver_options())
+    return _driver
+
+
+def get_async_driver() -> AsyncDriver:
+    """
+    지금 이벤트 루프에서 공유하는 비동기 Neo4j 드라이버. (커넥션 풀 설정은 동기 드라이버와 같다)
+    """
+    loop = asyncio.get_running_loop()
+    driver = _async_drivers.get(loop)
+    if driver is None:
+        driver = AsyncGraphDatabase.driver(NEO4J_URI, **_driver_options())
+        _async_drivers[loop] = driver
+    return driver
+
+
+def _open_session(database: str | None = None, read_only: bool = False, **config: Any) -> Session:
+    return get_driver().session(
+        database=database or NEO4J_DB,
+        default_access_mode=READ_ACCESS if read_only else WRITE_ACCESS,
+        **config,
+    )
+
+
+@contextmanager
+def session(database: str | None = None, read_only: bool = False, **config: Any) -> Iterator[Session]:
+    """
+    풀에서 커넥션을 빌려 쓰는 세션.
+    - database: 생략하면 NEO4J_DB
+    - read_only: True 이면 READ 모드 (클러스터에서는 팔로워로 라우팅)
+    - config: 그 밖의 세션 설정 (fetch_size 등)
+    """
+    with _open_session(database, read_only, **config) as s:
+        yield s
+
+
+class CypherRows(list):
+    """
+    쿼리 결과 rows (dict 리스트) + 크기 제한 때문에 뒤쪽이 잘렸는지 여부.
+    """
+    truncated: bool = False
+
+
+def _query(cypher: str, timeout: float | None) -> str | Query:
+    # 서버 쪽 트랜잭션 타임아웃은 Query 객체로만 줄 수 있다. (넘으면 서버가 트랜잭션을 끊는다)
+    return Query(cypher, timeout=timeout) if timeout else cypher
+
+
+def _row_bytes(row: Dict[str, Any]) -> int:
+    return len(json.dumps(row, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class CypherResult:
+    """
+    읽기 쿼리 결과를 한 행씩 흘려주는 스트림.
+
+    - 처음 순회할 때 세션을 열고, 서버에서 fetch_size 개씩 받아온다.
+    - max_rows / max_bytes 에 닿으면 더 받지 않고 멈추며 truncated=True 가 된다.
+    - 소비하는 쪽(답변 단계 등)이 중간에 멈추면 close() 에서 남은 레코드를 버린다.
+      (남은 레코드가 있었으면 역시 truncated=True)
+    - 지금까지 받은 행은 rows 로 다시 볼 수 있다.
+    - timeout: 서버 쪽 트랜잭션 타임아웃(초). 생략하면 서버 설정을 따른다.
+
+    with 문으로 쓰거나, 다 쓴 뒤 close() 를 호출한다.
+    """
+
+    def __init__(
+        self,
+        cypher: str,
+        params: Dict[str, Any] | None = None,
+        max_rows: int | None = None,
+        max_bytes: int | None = None,
+        fetch_size: int | None = None,
+        database: str | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        self.cypher = cypher
+        self.params = params or {}
+        self.max_rows = CYPHER_MAX_ROWS if max_rows is None else max_rows
+        self.max_bytes = CYPHER_MAX_BYTES if max_bytes is None else max_bytes
+        self.fetch_size = fetch_size or CYPHER_FETCH_SIZE
+        self.database = database
+        self.timeout = timeout
+
+        self.rows = CypherRows()
+        self.bytes = 0
+        self._session: Session | None = None
+        self._result = None
+        self._done = False
+
+    @property
+    def truncated(self) -> bool:
+        return self.rows.truncated
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        yield from list(self.rows)
+        while not self._done:
+            row = self._next_row()
+            if row is None:
+                break
+            yield row
+
+    def _next_row(self) -> Dict[str, Any] | None:
+        if self._result is None:
+            self._session = _open_session(self.database, read_only=True, fetch_size=self.fetch_size)
+            self._result = self._session.run(_query(self.cypher, self.timeout), **self.params)
+
+        if self.max_rows and len(self.rows) >= self.max_rows:
+            self._finish(truncated=self._result.peek() is not None)
+            return None
+
+        record = next(self._result, None)
+        if record is None:
+            self._finish(truncated=False)
+            return None
+
+        row = record.data()
+        size = _row_bytes(row)
+        if self.max_bytes and self.bytes + size > self.max_bytes:
+            self._finish(truncated=True)
+            return None
+
+        self.bytes += size
+        self.rows.append(row)
+        return row
+
+    def _finish(self, truncated: bool) -> None:
+        self.rows.truncated = self.rows.truncated or truncated
+        self._done = True
+        self._close_session()
+
+    def _close_session(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def close(self) -> None:
+        """
+        더 읽지 않고 끝낸다. 서버에 남은 레코드가 있었으면 truncated 로 표시한다.
+        """
+        if not self._done and self._result is not None:
+            self.rows.truncated = self._result.peek() is not None
+        self._done = True
+        self._close_session()
+
+    def __enter__(self) -> "CypherResult":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def stream_cypher(
+    cypher: str,
+    params: Dict[str, Any] | None = None,
+    max_rows: int | None = None,
+    max_bytes: int | None = None,
+    fetch_size: int | None = None,
+    timeout: float | None = None,
+) -> CypherResult:
+    """
+    결과를 한꺼번에 받지 않고 필요한 만큼만 읽는 run_cypher.
+    - max_rows / max_bytes: 생략하면 CYPHER_MAX_ROWS / CYPHER_MAX_BYTES (0 이면 제한 없음)
+    - fetch_size: 서버에서 한 번에 받아오는 레코드 수
+    - timeout: 서버 쪽 트랜잭션 타임아웃(초)
+    """
+    return CypherResult(
+        cypher, params, max_rows=max_rows, max_bytes=max_bytes, fetch_size=fetch_size, timeout=timeout
+    )
+
+
+def run_cypher(
+    cypher: str,
+    params: Dict[str, Any] | None = None,
+    max_rows: int | None = None,
+    max_bytes: int | None = None,
+    timeout: float | None = None,
+) -> CypherRows:
     """
     주어진 Cypher 쿼리를 실행하고, 결과를 딕셔너리 리스트로 반환한다.
     각 원소는 한 행(row)에 해당한다.
+    - 행 수 / 바이트 상한을 넘는 부분은 받지 않고, 반환값의 truncated 가 True 가 된다.
+    - timeout: 서버 쪽 트랜잭션 타임아웃(초)
     """
-    if params is None:
-        params = {}
-
     # 필요하면 디버깅용 출력
     # print("[DEBUG] run_cypher] cypher:", cypher)
     # print("[DEBUG] run_cypher] params:", params)
 
-    with driver.session(database=NEO4J_DB) as session:
-        result = session.run(cypher, **params)
-        rows: List[Dict[str, Any]] = [record.data() for record in result]
+    with span("neo4j.query"):
+        with stream_cypher(cypher, params, max_rows=max_rows, max_bytes=max_bytes, timeout=timeout) as result:
+            for _ in result:
+                pass
+        record_rows(len(result.rows), result.truncated)
+    return result.rows
+
+
+@asynccontextmanager
+async def async_session(
+    database: str | None = None,
+    read_only: bool = False,
+    **config: Any,
+) -> AsyncIterator[AsyncSession]:
+    """
+    session 의 비동기 버전.
+    """
+    s = get_async_driver().session(
+        database=database or NEO4J_DB,
+        default_access_mode=READ_ACCESS if read_only else WRITE_ACCESS,
+        **config,
+    )
+    async with s:
+        yield s
+
+
+async def async_run_cypher(
+    cypher: str,
+    params: Dict[str, Any] | None = None,
+    max_rows: int | None = None,
+    max_bytes: int | None = None,
+    fetch_size: int | None = None,
+    timeout: float | None = None,
+    stop: Callable[[Dict[str, Any]], bool] | None = None,
+) -> CypherRows:
+    """
+    run_cypher 의 비동기 버전. (같은 행 수 / 바이트 상한, 넘으면 truncated=True)
+    취소되면 세션을 닫으면서 남은 레코드는 받지 않는다.
+    - stop: 받은 행마다 불러서 True 면 그 행까지만 받고 멈춘다. (답변 토큰 예산 등, 남은 레코드가 있으면 truncated)
+    """
+    max_rows = CYPHER_MAX_ROWS if max_rows is None else max_rows
+    max_bytes = CYPHER_MAX_BYTES if max_bytes is None else max_bytes
+    rows = CypherRows()
+    size = 0
 
+    with span("neo4j.query"):
+        async with async_session(read_only=True, fetch_size=fetch_size or CYPHER_FETCH_SIZE) as s:
+            result = await s.run(_query(cypher, timeout), **(params or {}))
+            async for record in result:
+                row = record.data()
+                row_size = _row_bytes(row)
+                if max_bytes and size + row_size > max_bytes:
+                    rows.truncated = True
+                    break
+                size += row_size
+                rows.append(row)
+                if (max_rows and len(rows) >= max_rows) or (stop is not None and stop(row)):
+                    rows.truncated = await result.peek() is not None
+                    break
+        record_rows(len(rows), rows.truncated)
     return rows
 
 
+def explain_plan(cypher: str, params: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """
+    EXPLAIN 으로 실행 계획만 받아온다. (쿼리는 실행하지 않는다)
+    - 반환값: 서버가 준 계획 트리 {"operatorType", "args", "identifiers", "children"}
+    """
+    with span("neo4j.explain"):
+        with session(read_only=True) as s:
+            return s.run("EXPLAIN " + cypher, **(params or {})).consume().plan or {}
+
+
+async def async_explain_plan(cypher: str, params: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """
+    explain_plan 의 비동기 버전.
+    """
+    with span("neo4j.explain"):
+        async with async_session(read_only=True) as s:
+            result = await s.run("EXPLAIN " + cypher, **(params or {}))
+            summary = await result.consume()
+            return summary.plan or {}
+
+
+def run_in_session(
+    queries: List[Tuple[str, Dict[str, Any]]],
+    read_only: bool = True,
+) -> List[List[Dict[str, Any]]]:
+    """
+    여러 쿼리를 세션 하나, 트랜잭션 하나에서 차례로 실행한다.
+    (커넥션을 한 번만 빌리고, 일시적 오류는 드라이버가 재시도)
+    - 반환값: 쿼리별 rows 리스트
+    """
+    def work(tx) -> List[List[Dict[str, Any]]]:
+        return [[record.data() for record in tx.run(cypher, **params)] for cypher, params in queries]
+
+    with session(read_only=read_only) as s:
+        if read_only:
+            return s.execute_read(work)
+        return s.execute_write(work)
+
+
+def schema_report() -> str:
+    """
+    기대하는 제약조건/인덱스가 DB 에 있는지 점검한 요약 (애플리케이션 시작 시 표시용)
+    """
+    with session(read_only=True) as s:
+        return format_schema_report(check_schema(s))
+
+
 def close_driver() -> None:
     """
     애플리케이션 종료 시 Neo4j 드라이버를 닫고 싶을 때 사용.
     """
-    driver.close()
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+
+
+async def close_async_driver() -> None:
+    """
+    지금 이벤트 루프의 비동기 드라이버를 닫는다.
+    """
+    driver = _async_drivers.pop(asyncio.get_running_loop(), None)
+    if driver is not None:
+        await driver.close()
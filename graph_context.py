@@ -1,25 +1,130 @@
 # graph_context.py
 
-from typing import Dict, Any, List
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Tuple
 
-from graph_client import run_cypher
-from metadata_planner import plan_metadata_types
+from config import GRAPH_CONTEXT_COMBINED_QUERY, GRAPH_CONTEXT_MAX_WORKERS, SPECULATIVE_CONTEXT_TYPES
+from context_cache import context_cache
+from graph_client import async_run_cypher, run_cypher
+from metadata_planner import plan_metadata_types, plan_metadata_types_async
+from tracing import record_cache, span
 
 
-def _get_payable_event_summary(product_id: str) -> str:
-    rows = run_cypher(
-        """
+# -----------------------------
+# 섹션별 Cypher 조각
+# -----------------------------
+# 각 조각은 $product_id 의 섹션 rows 를 정렬된 순서 그대로 collect 해서
+# `rows` 하나로 만든다. 뒤에 RETURN '<타입>' AS section, rows 를 붙이면
+# 단독 쿼리가 되고, UNION ALL 로 이어 붙이면 여러 섹션을 한 번에 조회한다.
+# (집계 결과라서 데이터가 없어도 항상 한 행(rows=[])이 나온다)
+SECTION_QUERIES: Dict[str, str] = {
+    "payable_event_summary": """
         MATCH (p:Product {product_id: $product_id})
               -[:HAS_COVERAGE]->(c:Coverage)-[:HAS_EVENT]->(e:PayableEvent)
-        RETURN
+        WITH
           e.category AS category,
           collect(DISTINCT c.name)[0..5]   AS coverages,
           collect(DISTINCT e.reason)[0..5] AS reasons
         ORDER BY category
+        WITH collect({category: category, coverages: coverages, reasons: reasons}) AS rows
         """,
-        {"product_id": product_id},
-    )
+    "coverage_list": """
+        MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage)
+        WITH c.type AS type, collect(c.name) AS names
+        ORDER BY type
+        WITH collect({type: type, names: names}) AS rows
+        """,
+    "qualification_summary": """
+        MATCH (p:Product {product_id: $product_id})-[:HAS_QUALIFICATION]->(q:Qualification)
+        WITH q
+        ORDER BY q.type1, q.type2
+        WITH collect({
+          type1: q.type1,
+          type2: q.type2,
+          insurance_period: q.insurance_period,
+          payment_period: q.payment_period,
+          age_male_min: q.age_male_min,
+          age_male_max: q.age_male_max,
+          age_female_min: q.age_female_min,
+          age_female_max: q.age_female_max,
+          payment_cycle: q.payment_cycle
+        }) AS rows
+        """,
+    "limitation_summary": """
+        MATCH (p:Product {product_id: $product_id})
+              -[:HAS_COVERAGE]->(c:Coverage)-[:HAS_LIMITATION]->(l:Limitation)
+        WITH
+          l.category AS category,
+          collect(DISTINCT c.name)[0..5] AS coverages,
+          collect(DISTINCT l.text)[0..5] AS texts
+        ORDER BY category
+        WITH collect({category: category, coverages: coverages, texts: texts}) AS rows
+        """,
+    "meta_nodes": """
+        MATCH (p:Product {product_id: $product_id})
+        OPTIONAL MATCH (p)-[:HAS_REQUIRED_SUBSCRIPTION]->(rs:RequiredSubscription)
+        OPTIONAL MATCH (p)-[:HAS_DIVIDEND_INFO]->(d:DividendInfo)
+        OPTIONAL MATCH (p)-[:HAS_PREMIUM_INFO]->(pi:PremiumInfo)
+        OPTIONAL MATCH (p)-[:HAS_PREMIUM_DISCOUNT]->(pd:PremiumDiscount)
+        OPTIONAL MATCH (p)-[:HAS_PREPAYMENT_INFO]->(pp:PrepaymentInfo)
+        WITH collect({
+          required_subscription: rs.text,
+          dividend_info: d.text,
+          premium_info: pi.text,
+          premium_discount: pd.text,
+          prepayment_info: pp.text
+        }) AS rows
+        """,
+}
+
+
+def build_context_query(metadata_types: List[str]) -> str:
+    """
+    선택된 메타데이터 타입들의 섹션 조각을 UNION ALL 로 이어 붙여서
+    (section, rows) 를 돌려주는 Cypher 한 문장을 만든다.
+    - 중복/모르는 타입은 빼고, 타입이 없으면 빈 문자열
+    """
+    parts = [
+        SECTION_QUERIES[t] + f"RETURN '{t}' AS section, rows"
+        for t in dict.fromkeys(metadata_types)
+        if t in SECTION_QUERIES
+    ]
+    return "\nUNION ALL\n".join(parts)
+
+
+def fetch_section_rows(metadata_types: List[str], product_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    여러 섹션의 rows 를 쿼리 한 번(네트워크 왕복 한 번, 트랜잭션 하나)으로 가져온다.
+    - 반환값: {메타데이터 타입: rows}
+    """
+    cypher = build_context_query(metadata_types)
+    if not cypher:
+        return {}
+    records = run_cypher(cypher, {"product_id": product_id})
+    return {r["section"]: r.get("rows") or [] for r in records}
 
+
+async def fetch_section_rows_async(
+    metadata_types: List[str],
+    product_id: str,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    fetch_section_rows 의 비동기 버전 (비동기 드라이버)
+    """
+    cypher = build_context_query(metadata_types)
+    if not cypher:
+        return {}
+    records = await async_run_cypher(cypher, {"product_id": product_id})
+    return {r["section"]: r.get("rows") or [] for r in records}
+
+
+# -----------------------------
+# 섹션 rows → 컨텍스트 텍스트
+# -----------------------------
+
+def _format_payable_event_summary(rows: List[Dict[str, Any]]) -> str:
     if not rows:
         return "PayableEvent 데이터가 없습니다."
 
@@ -39,16 +144,7 @@ def _get_payable_event_summary(product_id: str) -> str:
     return "\n".join(lines)
 
 
-def _get_coverage_list(product_id: str) -> str:
-    rows = run_cypher(
-        """
-        MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage)
-        RETURN c.type AS type, collect(c.name) AS names
-        ORDER BY type
-        """,
-        {"product_id": product_id},
-    )
-
+def _format_coverage_list(rows: List[Dict[str, Any]]) -> str:
     if not rows:
         return "Coverage 데이터가 없습니다."
 
@@ -61,25 +157,7 @@ def _get_coverage_list(product_id: str) -> str:
     return "\n".join(lines)
 
 
-def _get_qualification_summary(product_id: str) -> str:
-    rows = run_cypher(
-        """
-        MATCH (p:Product {product_id: $product_id})-[:HAS_QUALIFICATION]->(q:Qualification)
-        RETURN
-          q.type1 AS type1,
-          q.type2 AS type2,
-          q.insurance_period AS insurance_period,
-          q.payment_period AS payment_period,
-          q.age_male_min AS age_male_min,
-          q.age_male_max AS age_male_max,
-          q.age_female_min AS age_female_min,
-          q.age_female_max AS age_female_max,
-          q.payment_cycle AS payment_cycle
-        ORDER BY type1, type2
-        """,
-        {"product_id": product_id},
-    )
-
+def _format_qualification_summary(rows: List[Dict[str, Any]]) -> str:
     if not rows:
         return "Qualification 데이터가 없습니다."
 
@@ -95,20 +173,7 @@ def _get_qualification_summary(product_id: str) -> str:
     return "\n".join(lines)
 
 
-def _get_limitation_summary(product_id: str) -> str:
-    rows = run_cypher(
-        """
-        MATCH (p:Product {product_id: $product_id})
-              -[:HAS_COVERAGE]->(c:Coverage)-[:HAS_LIMITATION]->(l:Limitation)
-        RETURN
-          l.category AS category,
-          collect(DISTINCT c.name)[0..5] AS coverages,
-          collect(DISTINCT l.text)[0..5] AS texts
-        ORDER BY category
-        """,
-        {"product_id": product_id},
-    )
-
+def _format_limitation_summary(rows: List[Dict[str, Any]]) -> str:
     if not rows:
         return "Limitation 데이터가 없습니다."
 
@@ -127,25 +192,7 @@ def _get_limitation_summary(product_id: str) -> str:
     return "\n".join(lines)
 
 
-def _get_meta_nodes(product_id: str) -> str:
-    rows = run_cypher(
-        """
-        MATCH (p:Product {product_id: $product_id})
-        OPTIONAL MATCH (p)-[:HAS_REQUIRED_SUBSCRIPTION]->(rs:RequiredSubscription)
-        OPTIONAL MATCH (p)-[:HAS_DIVIDEND_INFO]->(d:DividendInfo)
-        OPTIONAL MATCH (p)-[:HAS_PREMIUM_INFO]->(pi:PremiumInfo)
-        OPTIONAL MATCH (p)-[:HAS_PREMIUM_DISCOUNT]->(pd:PremiumDiscount)
-        OPTIONAL MATCH (p)-[:HAS_PREPAYMENT_INFO]->(pp:PrepaymentInfo)
-        RETURN
-          rs.text AS required_subscription,
-          d.text AS dividend_info,
-          pi.text AS premium_info,
-          pd.text AS premium_discount,
-          pp.text AS prepayment_info
-        """,
-        {"product_id": product_id},
-    )
-
+def _format_meta_nodes(rows: List[Dict[str, Any]]) -> str:
     if not rows:
         return "메타 노드 데이터가 없습니다."
 
@@ -169,33 +216,261 @@ def _get_meta_nodes(product_id: str) -> str:
     return "\n".join(lines)
 
 
-def build_graph_context(question: str, product_id: str) -> str:
+SECTION_FORMATTERS: Dict[str, Callable[[List[Dict[str, Any]]], str]] = {
+    "payable_event_summary": _format_payable_event_summary,
+    "coverage_list": _format_coverage_list,
+    "qualification_summary": _format_qualification_summary,
+    "limitation_summary": _format_limitation_summary,
+    "meta_nodes": _format_meta_nodes,
+}
+
+
+def _section_getter(mtype: str) -> Callable[[str], str]:
     """
-    1) LLM이 질문을 보고 어떤 메타데이터 타입이 필요할지 결정(plan_metadata_types)
-    2) 각 타입에 맞는 Cypher를 실행해서 요약 텍스트를 만든다.
-    3) 다음 단계(싸이퍼 생성)에 넘길 수 있는 하나의 큰 문자열로 합친다.
+    섹션 하나만 단독 쿼리로 조회해서 텍스트로 만드는 함수. (동시 실행 모드용)
+    """
+    def get_section(product_id: str) -> str:
+        with span(f"context.{mtype}"):
+            rows = fetch_section_rows([mtype], product_id).get(mtype, [])
+            return SECTION_FORMATTERS[mtype](rows)
+
+    return get_section
+
+
+_get_payable_event_summary = _section_getter("payable_event_summary")
+_get_coverage_list = _section_getter("coverage_list")
+_get_qualification_summary = _section_getter("qualification_summary")
+_get_limitation_summary = _section_getter("limitation_summary")
+_get_meta_nodes = _section_getter("meta_nodes")
+
+
+def _get_product_version(product_id: str) -> Any:
+    """
+    json2graph 가 적재할 때 Product 노드에 찍어두는 버전 스탬프를 읽는다.
+    (캐시 무효화 판단용)
+    """
+    rows = run_cypher(
+        """
+        MATCH (p:Product {product_id: $product_id})
+        RETURN p.version AS version
+        """,
+        {"product_id": product_id},
+    )
+    if not rows:
+        return None
+    return rows[0].get("version")
+
+
+def ensure_product_fresh(product_id: str) -> None:
+    """
+    상품이 다른 프로세스에서 재적재됐는지 버전 스탬프로 확인하고,
+    바뀌었으면 상품 단위 캐시들(메타데이터 / 질문 캐시)을 비운다.
+    """
+    context_cache.ensure_fresh(product_id, lambda: _get_product_version(product_id))
+
+
+def _query_product_vocabulary(product_id: str) -> Dict[str, List[str]]:
+    rows = run_cypher(
+        """
+        MATCH (p:Product {product_id: $product_id})
+        OPTIONAL MATCH (p)-[:HAS_COVERAGE]->(c:Coverage)
+        WITH p, collect(DISTINCT c.name) AS coverage_names
+        OPTIONAL MATCH (p)-[:HAS_COVERAGE]->(:Coverage)-[:HAS_EVENT]->(e:PayableEvent)
+        WITH p, coverage_names, collect(DISTINCT e.category) AS event_categories
+        OPTIONAL MATCH (l:Limitation {product_id: $product_id})
+        WITH p, coverage_names, event_categories, collect(DISTINCT l.category) AS limitation_categories
+        OPTIONAL MATCH (p)-[:HAS_QUALIFICATION]->(q:Qualification)
+        RETURN
+          coverage_names,
+          event_categories,
+          limitation_categories,
+          collect(DISTINCT q.type1) + collect(DISTINCT q.type2) AS qualification_types
+        """,
+        {"product_id": product_id},
+    )
+
+    row = rows[0] if rows else {}
+    return {
+        "coverage_names": row.get("coverage_names") or [],
+        "event_categories": row.get("event_categories") or [],
+        "limitation_categories": row.get("limitation_categories") or [],
+        "qualification_types": row.get("qualification_types") or [],
+    }
+
+
+def get_product_vocabulary(product_id: str) -> Dict[str, List[str]]:
     """
-    metadata_types = plan_metadata_types(question)
+    상품에 실제로 저장된 category / coverage name / limitation category / type1·type2 값.
+    (로컬 메타데이터 플래너의 키워드 보강용, 상품 단위로 캐시)
+    """
+    ensure_product_fresh(product_id)
+    return context_cache.get_or_compute(
+        product_id, "vocabulary", lambda: _query_product_vocabulary(product_id)
+    )
+
+
+# 메타데이터 타입 → (섹션 헤더, 조회 함수)
+SECTION_BUILDERS: Dict[str, Tuple[str, Callable[[str], str]]] = {
+    "payable_event_summary": ("=== PayableEvent 요약 ===", _get_payable_event_summary),
+    "coverage_list": ("=== Coverage 목록 ===", _get_coverage_list),
+    "qualification_summary": ("=== Qualification 요약 ===", _get_qualification_summary),
+    "limitation_summary": ("=== Limitation 요약 ===", _get_limitation_summary),
+    "meta_nodes": ("=== 메타 노드 요약 ===", _get_meta_nodes),
+}
+
+# 섹션 쿼리를 동시에 보내기 위한 스레드 풀 (처음 필요할 때 만든다)
+# Neo4j 드라이버는 스레드 세이프하고, 세션은 드라이버의 커넥션 풀에서 빌려 쓴다.
+_executor: ThreadPoolExecutor | None = None
 
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=GRAPH_CONTEXT_MAX_WORKERS,
+            thread_name_prefix="graph-context",
+        )
+    return _executor
+
+
+def _cached_sections(selected: List[str], product_id: str) -> Dict[str, str]:
+    """
+    캐시에 있는 섹션 본문. (상품이 재적재됐으면 먼저 캐시를 비운다)
+    """
+    ensure_product_fresh(product_id)
+    bodies: Dict[str, str] = {}
+    for mtype in selected:
+        cached = context_cache.get(product_id, mtype)
+        record_cache("context", cached is not None)
+        if cached is not None:
+            bodies[mtype] = cached
+    return bodies
+
+
+def _join_sections(selected: List[str], bodies: Dict[str, str]) -> str:
     sections: List[str] = []
-    for mtype in metadata_types:
-        if mtype == "payable_event_summary":
-            sections.append("=== PayableEvent 요약 ===")
-            sections.append(_get_payable_event_summary(product_id))
-        elif mtype == "coverage_list":
-            sections.append("=== Coverage 목록 ===")
-            sections.append(_get_coverage_list(product_id))
-        elif mtype == "qualification_summary":
-            sections.append("=== Qualification 요약 ===")
-            sections.append(_get_qualification_summary(product_id))
-        elif mtype == "limitation_summary":
-            sections.append("=== Limitation 요약 ===")
-            sections.append(_get_limitation_summary(product_id))
-        elif mtype == "meta_nodes":
-            sections.append("=== 메타 노드 요약 ===")
-            sections.append(_get_meta_nodes(product_id))
+    for mtype in selected:
+        sections.append(SECTION_BUILDERS[mtype][0])
+        sections.append(bodies[mtype])
+    return "\n".join(sections)
+
+
+def build_context_sections(
+    metadata_types: List[str],
+    product_id: str,
+    concurrent: bool = True,
+    use_cache: bool = True,
+    combined: bool = GRAPH_CONTEXT_COMBINED_QUERY,
+) -> str:
+    """
+    메타데이터 타입 목록에 해당하는 섹션 쿼리를 실행해서 하나의 문자열로 합친다.
+    - use_cache=True 이면 (product_id, metadata_type) 단위로 캐시된 섹션을 재사용하고,
+      캐시에 없는 섹션만 Neo4j 에 조회한다.
+    - combined=True 이면 캐시에 없는 섹션들을 UNION ALL 쿼리 하나로 조회한다.
+      (네트워크 왕복 한 번, 트랜잭션 하나)
+    - combined=False 이고 concurrent=True 이면 섹션 쿼리들을 스레드 풀에서 한꺼번에 보낸다.
+      (전체 지연 = 가장 느린 쿼리 하나)
+    - 결과는 항상 metadata_types 순서대로 합친다.
+    - 모르는 타입은 무시한다.
+    """
+    selected = [t for t in metadata_types if t in SECTION_BUILDERS]
+    if not selected:
+        return ""
+
+    with span("context", sections=selected):
+        bodies = _cached_sections(selected, product_id) if use_cache else {}
+
+        missing = [t for t in dict.fromkeys(selected) if t not in bodies]
+        if combined and len(missing) > 1:
+            section_rows = fetch_section_rows(missing, product_id)
+            fetched = {t: SECTION_FORMATTERS[t](section_rows.get(t, [])) for t in missing}
+        elif concurrent and len(missing) > 1:
+            executor = _get_executor()
+            # 풀 스레드에서 연 span 도 지금 trace 에 모이도록 컨텍스트를 복사해서 넘긴다.
+            futures = {
+                t: executor.submit(contextvars.copy_context().run, SECTION_BUILDERS[t][1], product_id)
+                for t in missing
+            }
+            fetched = {t: f.result() for t, f in futures.items()}
         else:
-            # 안전장치: 모르는 타입은 무시
-            continue
+            fetched = {t: SECTION_BUILDERS[t][1](product_id) for t in missing}
 
-    return "\n".join(sections)
+        for mtype, body in fetched.items():
+            bodies[mtype] = body
+            if use_cache:
+                context_cache.put(product_id, mtype, body)
+
+        return _join_sections(selected, bodies)
+
+
+async def build_context_sections_async(
+    metadata_types: List[str],
+    product_id: str,
+    use_cache: bool = True,
+) -> str:
+    """
+    build_context_sections 의 비동기 버전.
+    캐시에 없는 섹션은 개수와 상관없이 UNION ALL 쿼리 하나로 조회한다.
+    (버전 스탬프 확인은 동기 드라이버를 쓰므로 스레드에서)
+    """
+    selected = [t for t in metadata_types if t in SECTION_BUILDERS]
+    if not selected:
+        return ""
+
+    with span("context", sections=selected):
+        bodies = await asyncio.to_thread(_cached_sections, selected, product_id) if use_cache else {}
+
+        missing = [t for t in dict.fromkeys(selected) if t not in bodies]
+        if missing:
+            section_rows = await fetch_section_rows_async(missing, product_id)
+            for mtype in missing:
+                bodies[mtype] = SECTION_FORMATTERS[mtype](section_rows.get(mtype, []))
+                if use_cache:
+                    context_cache.put(product_id, mtype, bodies[mtype])
+
+        return _join_sections(selected, bodies)
+
+
+def build_graph_context(question: str, product_id: str) -> str:
+    """
+    1) 질문을 보고 어떤 메타데이터 타입이 필요할지 결정(plan_metadata_types)
+       - 상품 어휘로 보강한 로컬 규칙이 먼저, 확신이 없을 때만 LLM
+    2) 각 타입에 맞는 섹션들을 한 번의 쿼리로 조회해서 요약 텍스트를 만든다.
+    3) 다음 단계(싸이퍼 생성)에 넘길 수 있는 하나의 큰 문자열로 합친다.
+    """
+    metadata_types = plan_metadata_types(question, get_product_vocabulary(product_id))
+    return build_context_sections(metadata_types, product_id)
+
+
+async def plan_graph_context_async(question: str, product_id: str) -> Tuple[List[str], str]:
+    """
+    build_graph_context 의 비동기 버전. (플랜이 고른 타입 목록, 컨텍스트 텍스트)
+    (상품 어휘는 상품 단위로 캐시되므로 스레드에서 읽고, LLM 플래너 / 섹션 조회만 await)
+    """
+    vocabulary = await asyncio.to_thread(get_product_vocabulary, product_id)
+    metadata_types = await plan_metadata_types_async(question, vocabulary)
+    return metadata_types, await build_context_sections_async(metadata_types, product_id)
+
+
+async def build_graph_context_async(question: str, product_id: str) -> str:
+    """
+    build_graph_context 의 비동기 버전 (컨텍스트 텍스트만)
+    """
+    _, context_text = await plan_graph_context_async(question, product_id)
+    return context_text
+
+
+async def default_context_async(product_id: str) -> str:
+    """
+    플랜 없이 쓰는 상품 기본 컨텍스트 (SPECULATIVE_CONTEXT_TYPES 섹션).
+    섹션 캐시를 그대로 쓰므로 한 번 만든 뒤에는 DB 를 보지 않는다.
+    """
+    return await build_context_sections_async(SPECULATIVE_CONTEXT_TYPES, product_id)
+
+
+def covered_by_default_context(metadata_types: List[str]) -> bool:
+    """
+    플랜이 고른 섹션이 기본 컨텍스트에 모두 들어 있는지.
+    (그렇다면 기본 컨텍스트로 만든 Cypher 도 플랜의 컨텍스트를 다 보고 만든 것)
+    """
+    return {t for t in metadata_types if t in SECTION_BUILDERS} <= set(SPECULATIVE_CONTEXT_TYPES)
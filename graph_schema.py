@@ -0,0 +1,186 @@
+# graph_schema.py
+
+from typing import Dict, List, Tuple
+
+# ==============================
+# 보험 그래프 스키마 (제약조건 / 인덱스)
+# ==============================
+# (이름, 생성 Cypher). 모두 IF NOT EXISTS 이므로 여러 번 실행해도 안전하다.
+
+CONSTRAINTS: List[Tuple[str, str]] = [
+    # MERGE (p:Product {product_id}) / 모든 조회의 시작점
+    (
+        "product_id_unique",
+        "CREATE CONSTRAINT product_id_unique IF NOT EXISTS "
+        "FOR (n:Product) REQUIRE n.product_id IS UNIQUE",
+    ),
+    # json2graph._load_coverages 의 MERGE 키
+    (
+        "coverage_key_unique",
+        "CREATE CONSTRAINT coverage_key_unique IF NOT EXISTS "
+        "FOR (n:Coverage) REQUIRE (n.product_id, n.name, n.type) IS UNIQUE",
+    ),
+    # json2graph._load_qualifications 의 MERGE 키
+    (
+        "qualification_key_unique",
+        "CREATE CONSTRAINT qualification_key_unique IF NOT EXISTS "
+        "FOR (n:Qualification) "
+        "REQUIRE (n.product_id, n.type1, n.type2, n.insurance_period, n.payment_period) IS UNIQUE",
+    ),
+    # 메타 노드는 상품당 하나씩
+    (
+        "required_subscription_product_unique",
+        "CREATE CONSTRAINT required_subscription_product_unique IF NOT EXISTS "
+        "FOR (n:RequiredSubscription) REQUIRE n.product_id IS UNIQUE",
+    ),
+    (
+        "dividend_info_product_unique",
+        "CREATE CONSTRAINT dividend_info_product_unique IF NOT EXISTS "
+        "FOR (n:DividendInfo) REQUIRE n.product_id IS UNIQUE",
+    ),
+    (
+        "premium_info_product_unique",
+        "CREATE CONSTRAINT premium_info_product_unique IF NOT EXISTS "
+        "FOR (n:PremiumInfo) REQUIRE n.product_id IS UNIQUE",
+    ),
+    (
+        "premium_discount_product_unique",
+        "CREATE CONSTRAINT premium_discount_product_unique IF NOT EXISTS "
+        "FOR (n:PremiumDiscount) REQUIRE n.product_id IS UNIQUE",
+    ),
+    (
+        "prepayment_info_product_unique",
+        "CREATE CONSTRAINT prepayment_info_product_unique IF NOT EXISTS "
+        "FOR (n:PrepaymentInfo) REQUIRE n.product_id IS UNIQUE",
+    ),
+    # json2graph._load_chunks 의 MERGE 키 / vector_index 확장 조회의 시작점
+    (
+        "chunk_id_unique",
+        "CREATE CONSTRAINT chunk_id_unique IF NOT EXISTS "
+        "FOR (n:Chunk) REQUIRE n.chunk_id IS UNIQUE",
+    ),
+]
+
+INDEXES: List[Tuple[str, str]] = [
+    # 상품 단위 조회/삭제 (MATCH (c:Coverage {product_id: $product_id}), clear_products 등)
+    (
+        "coverage_product_id",
+        "CREATE INDEX coverage_product_id IF NOT EXISTS FOR (n:Coverage) ON (n.product_id)",
+    ),
+    (
+        "qualification_product_id",
+        "CREATE INDEX qualification_product_id IF NOT EXISTS FOR (n:Qualification) ON (n.product_id)",
+    ),
+    (
+        "chunk_product_id",
+        "CREATE INDEX chunk_product_id IF NOT EXISTS FOR (n:Chunk) ON (n.product_id)",
+    ),
+    # PayableEvent / Limitation MERGE 는 긴 텍스트(reason, text)를 키에 포함하므로
+    # 제약조건 대신 앞쪽 프로퍼티 복합 인덱스로 후보를 좁힌다.
+    (
+        "payable_event_key",
+        "CREATE INDEX payable_event_key IF NOT EXISTS "
+        "FOR (n:PayableEvent) ON (n.product_id, n.coverage_name, n.category)",
+    ),
+    (
+        "payable_event_product_id",
+        "CREATE INDEX payable_event_product_id IF NOT EXISTS FOR (n:PayableEvent) ON (n.product_id)",
+    ),
+    (
+        "limitation_key",
+        "CREATE INDEX limitation_key IF NOT EXISTS "
+        "FOR (n:Limitation) ON (n.product_id, n.coverage_name, n.category)",
+    ),
+    (
+        "limitation_product_id",
+        "CREATE INDEX limitation_product_id IF NOT EXISTS FOR (n:Limitation) ON (n.product_id)",
+    ),
+    # 생성 Cypher 의 CONTAINS 필터용 TEXT 인덱스
+    # (e.category CONTAINS "암", c.name CONTAINS "...특약", q.type2 CONTAINS "최초계약")
+    (
+        "payable_event_category_text",
+        "CREATE TEXT INDEX payable_event_category_text IF NOT EXISTS "
+        "FOR (n:PayableEvent) ON (n.category)",
+    ),
+    (
+        "coverage_name_text",
+        "CREATE TEXT INDEX coverage_name_text IF NOT EXISTS FOR (n:Coverage) ON (n.name)",
+    ),
+    (
+        "limitation_category_text",
+        "CREATE TEXT INDEX limitation_category_text IF NOT EXISTS "
+        "FOR (n:Limitation) ON (n.category)",
+    ),
+    (
+        "qualification_type2_text",
+        "CREATE TEXT INDEX qualification_type2_text IF NOT EXISTS "
+        "FOR (n:Qualification) ON (n.type2)",
+    ),
+]
+
+
+def ensure_schema(session) -> List[str]:
+    """
+    제약조건/인덱스를 모두 생성한다. (이미 있으면 건너뜀)
+    적재 전에 한 번 호출한다. 실행한 항목 이름 목록을 돌려준다.
+    - session: neo4j 세션 (스키마 명령은 자동 커밋 트랜잭션으로 실행해야 한다)
+    """
+    names: List[str] = []
+    for name, statement in CONSTRAINTS + INDEXES:
+        session.run(statement).consume()
+        names.append(name)
+    return names
+
+
+def check_schema(session) -> Dict[str, List[str]]:
+    """
+    기대하는 제약조건/인덱스 중 DB 에 없는 것과, 아직 ONLINE 이 아닌 인덱스를 돌려준다.
+    - 반환값: {"missing_constraints": [...], "missing_indexes": [...], "not_online": [...]}
+    """
+    constraint_names = {
+        record["name"] for record in session.run("SHOW CONSTRAINTS YIELD name")
+    }
+    index_states = {
+        record["name"]: record["state"]
+        for record in session.run("SHOW INDEXES YIELD name, state")
+    }
+
+    return {
+        "missing_constraints": [name for name, _ in CONSTRAINTS if name not in constraint_names],
+        "missing_indexes": [name for name, _ in INDEXES if name not in index_states],
+        "not_online": [
+            name
+            for name, state in index_states.items()
+            if name in dict(INDEXES) and state != "ONLINE"
+        ],
+    }
+
+
+def format_schema_report(report: Dict[str, List[str]]) -> str:
+    """
+    check_schema 결과를 사람이 읽을 수 있는 한 줄 요약으로.
+    """
+    problems = []
+    if report["missing_constraints"]:
+        problems.append("제약조건 없음: " + ", ".join(report["missing_constraints"]))
+    if report["missing_indexes"]:
+        problems.append("인덱스 없음: " + ", ".join(report["missing_indexes"]))
+    if report["not_online"]:
+        problems.append("인덱스 준비 중: " + ", ".join(report["not_online"]))
+    if not problems:
+        return "스키마 OK"
+    return " / ".join(problems) + " (python graph_schema.py 로 생성)"
+
+
+# ==============================
+# 엔트리포인트: 스키마 생성 + 점검
+# ==============================
+
+if __name__ == "__main__":
+    import graph_client
+
+    with graph_client.session() as session:
+        created = ensure_schema(session)
+        print(f"제약조건/인덱스 {len(created)}개 확인")
+        print(format_schema_report(check_schema(session)))
+    graph_client.close_driver()
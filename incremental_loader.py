@@ -0,0 +1,338 @@
+# incremental_loader.py
+
+import argparse
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import graph_client
+from context_cache import context_cache
+from json2graph import (
+    _ensure_product,
+    _ensure_schema_once,
+    _load_coverages,
+    _load_limitations,
+    _load_meta_nodes,
+    _load_payable_events,
+    _load_qualifications,
+    _product_name,
+    _with_product_id,
+)
+from product_schema import META_KEYS, normalize_product
+
+# ==============================
+# 섹션별 자연키 / 비교 대상 값
+# ==============================
+# 자연키는 json2graph 의 MERGE 키와 같다. (키가 같으면 같은 노드 → id 유지)
+
+COVERAGE_KEY = ("name", "type")
+EVENT_KEY = ("coverage_name", "coverage_type", "category", "reason")
+EVENT_VALUES = ("amount",)
+LIMITATION_KEY = ("coverage_name", "category", "text")
+QUALIFICATION_KEY = ("type1", "type2", "insurance_period", "payment_period")
+QUALIFICATION_VALUES = (
+    "age_male_min", "age_male_max", "age_female_min", "age_female_max", "payment_cycle",
+)
+META_VALUES = {
+    "required_subscription": ("required", "text"),
+    "dividend_info": ("text",),
+    "premium_info": ("text",),
+    "premium_discount": ("text",),
+    "prepayment_info": ("text",),
+}
+
+
+@dataclass
+class SectionDiff:
+    added: List[Dict[str, Any]] = field(default_factory=list)
+    removed: List[Dict[str, Any]] = field(default_factory=list)
+    changed: List[Dict[str, Any]] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+
+@dataclass
+class ProductDiff:
+    product_id: str
+    sections: Dict[str, SectionDiff] = field(default_factory=dict)
+    seconds: float = 0.0
+    applied: bool = False
+
+    def is_empty(self) -> bool:
+        return all(s.is_empty() for s in self.sections.values())
+
+    def summary(self) -> str:
+        lines = [f"[{self.product_id}] 변경 사항 ({self.seconds * 1000:.1f}ms)"]
+        for name, diff in self.sections.items():
+            if diff.is_empty():
+                continue
+            lines.append(
+                f"  - {name}: +{len(diff.added)} / -{len(diff.removed)} / ~{len(diff.changed)}"
+            )
+        if self.is_empty():
+            lines.append("  변경 없음")
+        return "\n".join(lines)
+
+
+def _key(item: Dict[str, Any], fields: Tuple[str, ...]) -> Tuple[Any, ...]:
+    return tuple(item.get(f) for f in fields)
+
+
+def _diff_section(
+    incoming: List[Dict[str, Any]],
+    stored: List[Dict[str, Any]],
+    key_fields: Tuple[str, ...],
+    value_fields: Tuple[str, ...] = (),
+) -> SectionDiff:
+    new_by_key = {_key(item, key_fields): item for item in incoming}
+    old_by_key = {_key(item, key_fields): item for item in stored}
+
+    diff = SectionDiff()
+    for k, item in new_by_key.items():
+        old = old_by_key.get(k)
+        if old is None:
+            diff.added.append(item)
+        elif any(item.get(f) != old.get(f) for f in value_fields):
+            diff.changed.append(item)
+    for k, item in old_by_key.items():
+        if k not in new_by_key:
+            diff.removed.append(item)
+    return diff
+
+
+# ==============================
+# 현재 저장된 상품 서브그래프 읽기
+# ==============================
+
+def _read_stored(tx, product_id: str) -> Dict[str, Any]:
+    def rows(query: str) -> List[Dict[str, Any]]:
+        return [r.data() for r in tx.run(query, product_id=product_id)]
+
+    stored: Dict[str, Any] = {
+        "exists": bool(rows("MATCH (p:Product {product_id: $product_id}) RETURN p.product_id AS id")),
+        "coverages": rows(
+            """
+            MATCH (c:Coverage {product_id: $product_id})
+            RETURN c.name AS name, c.type AS type
+            """
+        ),
+        "payable_events": rows(
+            """
+            MATCH (c:Coverage {product_id: $product_id})-[:HAS_EVENT]->(e:PayableEvent)
+            RETURN e.coverage_name AS coverage_name, c.type AS coverage_type,
+                   e.category AS category, e.reason AS reason, e.amount AS amount
+            """
+        ),
+        "limitations": rows(
+            """
+            MATCH (l:Limitation {product_id: $product_id})
+            RETURN l.coverage_name AS coverage_name, l.category AS category, l.text AS text
+            """
+        ),
+        "qualifications": rows(
+            """
+            MATCH (q:Qualification {product_id: $product_id})
+            RETURN q.type1 AS type1, q.type2 AS type2,
+                   q.insurance_period AS insurance_period, q.payment_period AS payment_period,
+                   q.age_male_min AS age_male_min, q.age_male_max AS age_male_max,
+                   q.age_female_min AS age_female_min, q.age_female_max AS age_female_max,
+                   q.payment_cycle AS payment_cycle
+            """
+        ),
+    }
+
+    meta_rows = rows(
+        """
+        MATCH (p:Product {product_id: $product_id})
+        OPTIONAL MATCH (p)-[:HAS_REQUIRED_SUBSCRIPTION]->(rs:RequiredSubscription)
+        OPTIONAL MATCH (p)-[:HAS_DIVIDEND_INFO]->(d:DividendInfo)
+        OPTIONAL MATCH (p)-[:HAS_PREMIUM_INFO]->(pi:PremiumInfo)
+        OPTIONAL MATCH (p)-[:HAS_PREMIUM_DISCOUNT]->(pd:PremiumDiscount)
+        OPTIONAL MATCH (p)-[:HAS_PREPAYMENT_INFO]->(pp:PrepaymentInfo)
+        RETURN
+          CASE WHEN rs IS NULL THEN null ELSE {required: rs.required, text: rs.text} END
+            AS required_subscription,
+          CASE WHEN d IS NULL THEN null ELSE {text: d.text} END AS dividend_info,
+          CASE WHEN pi IS NULL THEN null ELSE {text: pi.text} END AS premium_info,
+          CASE WHEN pd IS NULL THEN null ELSE {text: pd.text} END AS premium_discount,
+          CASE WHEN pp IS NULL THEN null ELSE {text: pp.text} END AS prepayment_info
+        """
+    )
+    stored["meta"] = meta_rows[0] if meta_rows else {}
+    return stored
+
+
+def compute_diff(product_id: str, data: dict, stored: Dict[str, Any]) -> ProductDiff:
+    """
+    들어온 상품 JSON 과 저장된 서브그래프를 섹션별로 비교한다.
+    """
+    diff = ProductDiff(product_id=product_id)
+    diff.sections["coverages"] = _diff_section(data["coverages"], stored["coverages"], COVERAGE_KEY)
+    diff.sections["payable_events"] = _diff_section(
+        data["payable_events"], stored["payable_events"], EVENT_KEY, EVENT_VALUES
+    )
+    diff.sections["limitations"] = _diff_section(
+        data["limitations"], stored["limitations"], LIMITATION_KEY
+    )
+    diff.sections["qualifications"] = _diff_section(
+        data["qualifications"], stored["qualifications"], QUALIFICATION_KEY, QUALIFICATION_VALUES
+    )
+
+    meta = SectionDiff()
+    for key in META_KEYS:
+        new = data.get(key) or {}
+        old = stored["meta"].get(key)
+        if old is None:
+            meta.added.append({"meta": key})
+        elif any(new.get(f) != old.get(f) for f in META_VALUES[key]):
+            meta.changed.append({"meta": key})
+    diff.sections["meta_nodes"] = meta
+    return diff
+
+
+# ==============================
+# 변경분 적용 (한 트랜잭션)
+# ==============================
+
+def _limitations_to_load(data: dict, diff: ProductDiff) -> List[Dict[str, Any]]:
+    """
+    다시 MERGE 할 Limitation 행.
+    - 추가된 Limitation
+    - 새로 추가된 Coverage 에 걸리는 Limitation 전부. LIMITATION_KEY 에는 coverage_type 이 없어서
+      type 만 바뀐 Coverage 를 지웠다 만들면 변경 없음으로 보이지만, HAS_LIMITATION 은
+      DETACH DELETE 로 사라졌으므로 다시 이어야 한다. (Coverage 가 없어서 못 이었던 것도 여기서 이어진다)
+    """
+    added_coverages = {_key(c, COVERAGE_KEY) for c in diff.sections["coverages"].added}
+    rows = {_key(x, LIMITATION_KEY): x for x in diff.sections["limitations"].added}
+    for x in data["limitations"]:
+        if (x.get("coverage_name"), x.get("coverage_type")) in added_coverages:
+            rows.setdefault(_key(x, LIMITATION_KEY), x)
+    return list(rows.values())
+
+
+def _delete_removed(tx, product_id: str, diff: ProductDiff) -> None:
+    sections = diff.sections
+    if sections["payable_events"].removed:
+        tx.run(
+            """
+            UNWIND $keys AS k
+            MATCH (c:Coverage {product_id: $product_id, name: k.coverage_name, type: k.coverage_type})
+                  -[:HAS_EVENT]->(e:PayableEvent {category: k.category, reason: k.reason})
+            DETACH DELETE e
+            """,
+            product_id=product_id,
+            keys=[{f: e.get(f) for f in EVENT_KEY} for e in sections["payable_events"].removed],
+        )
+    if sections["limitations"].removed:
+        tx.run(
+            """
+            UNWIND $keys AS k
+            MATCH (l:Limitation {product_id: $product_id, coverage_name: k.coverage_name,
+                                 category: k.category, text: k.text})
+            DETACH DELETE l
+            """,
+            product_id=product_id,
+            keys=[{f: x.get(f) for f in LIMITATION_KEY} for x in sections["limitations"].removed],
+        )
+    if sections["qualifications"].removed:
+        tx.run(
+            """
+            UNWIND $keys AS k
+            MATCH (q:Qualification {product_id: $product_id, type1: k.type1, type2: k.type2,
+                                    insurance_period: k.insurance_period,
+                                    payment_period: k.payment_period})
+            DETACH DELETE q
+            """,
+            product_id=product_id,
+            keys=[{f: x.get(f) for f in QUALIFICATION_KEY} for x in sections["qualifications"].removed],
+        )
+    if sections["coverages"].removed:
+        # 지워지는 Coverage 에만 달려 있던 PayableEvent 도 함께 지운다.
+        tx.run(
+            """
+            UNWIND $keys AS k
+            MATCH (c:Coverage {product_id: $product_id, name: k.name, type: k.type})
+            OPTIONAL MATCH (c)-[:HAS_EVENT]->(e:PayableEvent)
+            DETACH DELETE e, c
+            """,
+            product_id=product_id,
+            keys=[{f: x.get(f) for f in COVERAGE_KEY} for x in sections["coverages"].removed],
+        )
+
+
+def _apply_incremental_tx(tx, product_id: str, data: dict, dry_run: bool) -> ProductDiff:
+    stored = _read_stored(tx, product_id)
+    diff = compute_diff(product_id, data, stored)
+    if dry_run or (stored["exists"] and diff.is_empty()):
+        return diff
+
+    _delete_removed(tx, product_id, diff)
+
+    # 추가/변경분만 기존 로더(MERGE)로 다시 보낸다.
+    # 키가 같은 노드는 MATCH 되어 id 가 유지되고, 값만 SET 된다.
+    s = diff.sections
+    _ensure_product(
+        tx, [{"product_id": product_id, "name": _product_name(data), "version": time.time_ns()}]
+    )
+    if s["coverages"].added:
+        _load_coverages(tx, _with_product_id(product_id, s["coverages"].added))
+    events = s["payable_events"].added + s["payable_events"].changed
+    if events:
+        _load_payable_events(tx, _with_product_id(product_id, events))
+    limitations = _limitations_to_load(data, diff)
+    if limitations:
+        _load_limitations(tx, _with_product_id(product_id, limitations))
+    quals = s["qualifications"].added + s["qualifications"].changed
+    if quals:
+        _load_qualifications(tx, _with_product_id(product_id, quals))
+    if not s["meta_nodes"].is_empty():
+        _load_meta_nodes(tx, [{"product_id": product_id, **{k: data[k] for k in META_KEYS}}])
+
+    diff.applied = True
+    return diff
+
+
+def load_product_incremental(
+    product_id: str,
+    data: dict,
+    dry_run: bool = False,
+    database: str | None = None,
+) -> ProductDiff:
+    """
+    저장된 상품 서브그래프와 들어온 JSON 의 차이만 한 트랜잭션으로 적용한다.
+    - 바뀌지 않은 노드는 건드리지 않으므로 coverage_id / event_id 등이 유지된다.
+    - 변경이 없으면 아무것도 쓰지 않고(버전 스탬프도 유지) 캐시도 그대로 둔다.
+    - dry_run=True 이면 차이만 계산해서 돌려준다.
+    형식이 틀리면 아무것도 쓰기 전에 ProductValidationError.
+    """
+    data = normalize_product(data).to_dict()
+    t0 = time.perf_counter()
+    with graph_client.session(database=database) as session:
+        _ensure_schema_once(session)
+        diff = session.execute_write(_apply_incremental_tx, product_id, data, dry_run)
+    diff.seconds = time.perf_counter() - t0
+
+    if diff.applied:
+        context_cache.invalidate_product(product_id)
+    return diff
+
+
+# ==============================
+# 엔트리포인트
+# ==============================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="상품 JSON 변경분만 Neo4j 에 반영")
+    parser.add_argument("--file", required=True, help="상품 JSON 경로")
+    parser.add_argument("--product-id", required=True)
+    parser.add_argument("--dry-run", action="store_true", help="차이만 출력하고 쓰지 않음")
+    args = parser.parse_args()
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        product = json.load(f)
+
+    result = load_product_incremental(args.product_id, product, dry_run=args.dry_run)
+    graph_client.close_driver()
+    print(result.summary())
@@ -1,21 +1,30 @@
+import argparse
+import glob
+import hashlib
 import json
-from neo4j import GraphDatabase
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# ==============================
-# Neo4j 접속 정보
-# ==============================
-URI = "bolt://localhost:7687"
-USER = "neo4j"
-PASSWORD = "wnsgk7575"
+from context_cache import context_cache
+import graph_client
+from graph_schema import ensure_schema
+from product_schema import META_KEYS, ProductValidationError, normalize_product, read_normalized
+from text_index import build_index, indexed_product_ids, product_ids_from_json_dir, product_key
+from vector_index import build_vector_index, chunk_rows, make_chunks
+
+# Neo4j 접속 정보 / 커넥션 풀 설정은 graph_client.py (.env) 에서 관리한다.
+
+logger = logging.getLogger("json2graph")
 
 # JSON 파일 경로
 JSON_PATH = "./sample_docs/jsons/상품요약서_신한(간편가입)굿닥터뇌심치료보험(무배당, 갱신형)_251104.json"  # 네 파일 이름/경로에 맞게 수정
 
 # 이 JSON이 대표하는 상품 ID (네가 규칙 정해서 사용)
 PRODUCT_ID = "PRD_SHLIFE_GOODDOCTOR_EASY_001"
-
-
-driver = GraphDatabase.driver(URI, auth=(USER, PASSWORD))
+# 원문 txt 디렉토리 (적재하면서 BM25 원문 인덱스도 같이 만든다)
+TXT_DIR = "./sample_docs/txt"
 
 
 # ==============================
@@ -30,42 +39,93 @@ def clear_database(tx):
     tx.run("MATCH (n) DETACH DELETE n")
 
 
-def _ensure_product(tx, product_id, product_name):
+# 상품 단위로 지울 때 대상이 되는 라벨들 (모두 product_id 프로퍼티를 가진다)
+PRODUCT_LABELS = [
+    "Product",
+    "Coverage",
+    "PayableEvent",
+    "Limitation",
+    "Qualification",
+    "RequiredSubscription",
+    "DividendInfo",
+    "PremiumInfo",
+    "PremiumDiscount",
+    "PrepaymentInfo",
+    "Chunk",
+]
+
+
+
+_schema_ready = False
+
+
+def _ensure_schema_once(session):
+    """
+    MERGE 가 라벨 스캔으로 떨어지지 않도록 적재 전에 제약조건/인덱스를 한 번 만들어둔다.
+    """
+    global _schema_ready
+    if not _schema_ready:
+        ensure_schema(session)
+        _schema_ready = True
+
+
+def clear_products(tx, product_ids):
+    """
+    지정한 상품들의 서브그래프만 지운다. (다른 상품은 그대로)
+    """
+    for label in PRODUCT_LABELS:
+        tx.run(
+            f"MATCH (n:{label}) WHERE n.product_id IN $product_ids DETACH DELETE n",
+            product_ids=product_ids,
+        )
+
+
+def _with_product_id(product_id, items):
+    """
+    UNWIND 배치에 여러 상품을 섞어 넣을 수 있도록 각 행에 product_id 를 붙인다.
+    """
+    return [{**item, "product_id": product_id} for item in items]
+
+
+def _ensure_product(tx, products):
     """
     Product 노드가 없으면 생성.
+    - products: [{product_id, name, version}, ...]
+    version 은 적재할 때마다 새로 찍는 스탬프로, 메타데이터 캐시 무효화에 쓰인다.
     """
     query = """
-    MERGE (p:Product {product_id: $product_id})
-    ON CREATE SET p.name = $product_name
+    UNWIND $products AS row
+    MERGE (p:Product {product_id: row.product_id})
+    ON CREATE SET p.name = row.name
+    SET p.version = row.version
     """
-    tx.run(query, product_id=product_id, product_name=product_name)
+    return tx.run(query, products=products).consume().counters
 
 
-def _load_coverages(tx, product_id, coverages):
+def _load_coverages(tx, coverages):
     query = """
-    MATCH (p:Product {product_id: $product_id})
     UNWIND $coverages AS c
+    MATCH (p:Product {product_id: c.product_id})
     MERGE (p)-[:HAS_COVERAGE]->(cov:Coverage {
-      product_id: $product_id,
+      product_id: c.product_id,
       name:       c.name,
       type:       c.type
     })
     ON CREATE SET cov.coverage_id = randomUUID()
     """
-    tx.run(query, product_id=product_id, coverages=coverages)
+    return tx.run(query, coverages=coverages).consume().counters
 
 
-def _load_payable_events(tx, product_id, events):
+def _load_payable_events(tx, events):
     query = """
-    MATCH (p:Product {product_id: $product_id})
     UNWIND $events AS e
     MATCH (cov:Coverage {
-      product_id: $product_id,
+      product_id: e.product_id,
       name:       e.coverage_name,
       type:       e.coverage_type
     })
     MERGE (ev:PayableEvent {
-      product_id:    $product_id,
+      product_id:    e.product_id,
       coverage_name: e.coverage_name,
       category:      e.category,
       reason:        e.reason
@@ -77,20 +137,19 @@ def _load_payable_events(tx, product_id, events):
       ev.amount   = e.amount
     MERGE (cov)-[:HAS_EVENT]->(ev)
     """
-    tx.run(query, product_id=product_id, events=events)
+    return tx.run(query, events=events).consume().counters
 
 
-def _load_limitations(tx, product_id, limitations):
+def _load_limitations(tx, limitations):
     query = """
-    MATCH (p:Product {product_id: $product_id})
     UNWIND $limitations AS l
     OPTIONAL MATCH (cov:Coverage {
-      product_id: $product_id,
+      product_id: l.product_id,
       name:       l.coverage_name,
       type:       l.coverage_type
     })
     MERGE (lim:Limitation {
-      product_id:    $product_id,
+      product_id:    l.product_id,
       coverage_name: l.coverage_name,
       category:      l.category,
       text:          l.text
@@ -100,15 +159,15 @@ def _load_limitations(tx, product_id, limitations):
     WHERE cov IS NOT NULL
     MERGE (cov)-[:HAS_LIMITATION]->(lim)
     """
-    tx.run(query, product_id=product_id, limitations=limitations)
+    return tx.run(query, limitations=limitations).consume().counters
 
 
-def _load_qualifications(tx, product_id, qualifications):
+def _load_qualifications(tx, qualifications):
     query = """
-    MATCH (p:Product {product_id: $product_id})
     UNWIND $qualifications AS q
+    MATCH (p:Product {product_id: q.product_id})
     MERGE (p)-[:HAS_QUALIFICATION]->(qual:Qualification {
-      product_id:       $product_id,
+      product_id:       q.product_id,
       type1:            q.type1,
       type2:            q.type2,
       insurance_period: q.insurance_period,
@@ -122,87 +181,457 @@ def _load_qualifications(tx, product_id, qualifications):
       qual.age_female_max = q.age_female_max,
       qual.payment_cycle  = q.payment_cycle
     """
-    tx.run(query, product_id=product_id, qualifications=qualifications)
+    return tx.run(query, qualifications=qualifications).consume().counters
 
 
-def _load_meta_nodes(tx, product_id, data):
+def _load_meta_nodes(tx, metas):
+    """
+    - metas: [{product_id, required_subscription, dividend_info, ...}, ...]
+    """
     query = """
-    MATCH (p:Product {product_id: $product_id})
+    UNWIND $metas AS m
+    MATCH (p:Product {product_id: m.product_id})
     // required_subscription
-    MERGE (rs:RequiredSubscription {product_id: $product_id})
+    MERGE (rs:RequiredSubscription {product_id: m.product_id})
     ON CREATE SET rs.required_id = randomUUID()
-    SET rs.required = $required_subscription.required,
-        rs.text     = $required_subscription.text
+    SET rs.required = m.required_subscription.required,
+        rs.text     = m.required_subscription.text
     MERGE (p)-[:HAS_REQUIRED_SUBSCRIPTION]->(rs)
 
     // dividend_info
-    MERGE (d:DividendInfo {product_id: $product_id})
+    MERGE (d:DividendInfo {product_id: m.product_id})
     ON CREATE SET d.dividend_id = randomUUID()
-    SET d.text = $dividend_info.text
+    SET d.text = m.dividend_info.text
     MERGE (p)-[:HAS_DIVIDEND_INFO]->(d)
 
     // premium_info
-    MERGE (pi:PremiumInfo {product_id: $product_id})
+    MERGE (pi:PremiumInfo {product_id: m.product_id})
     ON CREATE SET pi.premium_info_id = randomUUID()
-    SET pi.text = $premium_info.text
+    SET pi.text = m.premium_info.text
     MERGE (p)-[:HAS_PREMIUM_INFO]->(pi)
 
     // premium_discount
-    MERGE (pd:PremiumDiscount {product_id: $product_id})
+    MERGE (pd:PremiumDiscount {product_id: m.product_id})
     ON CREATE SET pd.premium_discount_id = randomUUID()
-    SET pd.text = $premium_discount.text
+    SET pd.text = m.premium_discount.text
     MERGE (p)-[:HAS_PREMIUM_DISCOUNT]->(pd)
 
     // prepayment_info
-    MERGE (pp:PrepaymentInfo {product_id: $product_id})
+    MERGE (pp:PrepaymentInfo {product_id: m.product_id})
     ON CREATE SET pp.prepayment_id = randomUUID()
-    SET pp.text = $prepayment_info.text
+    SET pp.text = m.prepayment_info.text
     MERGE (p)-[:HAS_PREPAYMENT_INFO]->(pp)
     """
-    tx.run(
-        query,
-        product_id=product_id,
-        required_subscription=data["required_subscription"],
-        dividend_info=data["dividend_info"],
-        premium_info=data["premium_info"],
-        premium_discount=data["premium_discount"],
-        prepayment_info=data["prepayment_info"],
-    )
+    return tx.run(query, metas=metas).consume().counters
 
 
-def load_product_structured(product_id: str, data: dict):
-    """
-    JSON 하나를 받아서 Product + 관련 노드들을 모두 적재
-    """
+def _product_name(data: dict) -> str:
     # 주계약 이름 (MAIN) 하나 뽑아서 상품 이름으로 사용
-    main_name = next(
+    return next(
         (c["name"] for c in data["coverages"] if c.get("type") == "MAIN"),
         "UNKNOWN_PRODUCT",
     )
 
-    with driver.session(database="shlife-kg") as session:  # 멀티 DB 쓰면 database="shlife-kg" 같이 지정
-        # 필요하면 DB 전체 비우기 (한 번만 쓰고 주석 처리해도 됨)
-        session.execute_write(clear_database)
 
-        session.execute_write(_ensure_product, product_id, main_name)
-        session.execute_write(_load_coverages, product_id, data["coverages"])
-        session.execute_write(_load_payable_events, product_id, data["payable_events"])
-        session.execute_write(_load_limitations, product_id, data["limitations"])
-        session.execute_write(_load_qualifications, product_id, data["qualifications"])
-        session.execute_write(_load_meta_nodes, product_id, data)
+def _build_batch(products):
+    """
+    [(product_id, data), ...] → 로더별 UNWIND 파라미터 묶음
+    """
+    version = time.time_ns()
+    batch = {
+        "product_ids": [],
+        "products": [],
+        "coverages": [],
+        "events": [],
+        "limitations": [],
+        "qualifications": [],
+        "metas": [],
+    }
+    for product_id, data in products:
+        batch["product_ids"].append(product_id)
+        batch["products"].append(
+            {"product_id": product_id, "name": _product_name(data), "version": version}
+        )
+        batch["coverages"] += _with_product_id(product_id, data["coverages"])
+        batch["events"] += _with_product_id(product_id, data["payable_events"])
+        batch["limitations"] += _with_product_id(product_id, data["limitations"])
+        batch["qualifications"] += _with_product_id(product_id, data["qualifications"])
+        batch["metas"].append(
+            {"product_id": product_id, **{key: data[key] for key in META_KEYS}}
+        )
+    return batch
+
+
+# 한 상품의 행 수(Coverage + 지급사유 + 제한사항 + 가입자격)가 이보다 많으면
+# 트랜잭션 하나가 너무 커지지 않도록 지급사유/제한사항을 이 크기로 나눠 커밋한다.
+LOAD_CHUNK_ROWS = int(os.getenv("LOAD_CHUNK_ROWS", "5000"))
+
+# 적재 단계 (로더, _build_batch 키). Coverage 가 지급사유/제한사항보다 먼저여야 한다.
+LOAD_STAGES = (
+    (_ensure_product, "products"),
+    (_load_coverages, "coverages"),
+    (_load_payable_events, "events"),
+    (_load_limitations, "limitations"),
+    (_load_qualifications, "qualifications"),
+    (_load_meta_nodes, "metas"),
+)
+
+
+def _run_stages(tx, batch, stages, timings):
+    """
+    stages 를 tx 하나에서 순서대로 실행한다. 단계별 소요 시간을 timings 에 더한다.
+    - 반환값: (생성된 노드 수, 생성된 관계 수)
+    """
+    nodes = rels = 0
+    for loader, key in stages:
+        t0 = time.perf_counter()
+        counters = loader(tx, batch[key])
+        timings[key] = timings.get(key, 0.0) + time.perf_counter() - t0
+        nodes += counters.nodes_created
+        rels += counters.relationships_created
+    return nodes, rels
+
+
+def _replace_products_tx(tx, batch, stages=LOAD_STAGES):
+    """
+    기존 서브그래프 삭제 + stages 적재를 트랜잭션 하나로.
+    execute_write 가 일시 오류로 다시 호출할 수 있으므로 시간은 호출마다 새로 잰다.
+    - 반환값: (노드 수, 관계 수, 단계별 시간)
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    clear_products(tx, batch["product_ids"])
+    timings["clear"] = time.perf_counter() - t0
+    nodes, rels = _run_stages(tx, batch, stages, timings)
+    return nodes, rels, timings
+
+
+def _load_chunk_tx(tx, loader, key, rows):
+    timings = {}
+    nodes, rels = _run_stages(tx, {key: rows}, ((loader, key),), timings)
+    return nodes, rels, timings
+
+
+# 나눠 커밋하는 큰 상품은 이 접미사를 붙인 임시 product_id 로 먼저 적재한다.
+# (조회는 모두 실제 product_id 로 하므로 다 들어가기 전까지는 보이지 않는다)
+_STAGING_SUFFIX = "__staging"
+
+
+def _swap_staged_tx(tx, staging_id, product_id):
+    """
+    기존 서브그래프를 지우고 임시 product_id 로 적재해 둔 노드를 실제 product_id 로 바꾼다.
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    clear_products(tx, [product_id])
+    timings["clear"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for label in PRODUCT_LABELS:
+        tx.run(
+            f"MATCH (n:{label}) WHERE n.product_id = $staging_id SET n.product_id = $product_id",
+            staging_id=staging_id,
+            product_id=product_id,
+        )
+    timings["swap"] = time.perf_counter() - t0
+    return 0, 0, timings
+
+
+def load_product_structured(product_id: str, data: dict, chunk_rows: int = LOAD_CHUNK_ROWS):
+    """
+    JSON 하나를 받아서 Product + 관련 노드들을 모두 적재
+    (같은 product_id 의 기존 서브그래프만 지우고 다시 적재한다)
+    형식이 틀리면 아무것도 쓰기 전에 ProductValidationError.
+
+    - 기본: 삭제부터 메타 노드까지 트랜잭션 하나. 실패하면 전부 롤백되어 기존 그래프가 그대로 남는다.
+    - 행 수가 chunk_rows 를 넘는 큰 상품: 임시 product_id 로 Product/Coverage/가입자격/메타를 넣고
+      지급사유/제한사항을 chunk_rows 개씩 커밋한 뒤, 마지막 트랜잭션에서 기존 서브그래프와 바꾼다.
+      중간에 실패하면 임시 노드만 지우고 예외를 다시 던진다. (기존 그래프는 그대로)
+    - 반환값: {transactions, nodes_created, relationships_created, seconds, stages: {단계: 초}}
+      stages 의 "commit" 은 트랜잭션 왕복/커밋에 든 나머지 시간.
+    """
+    data = normalize_product(data).to_dict()
+    batch = _build_batch([(product_id, data)])
+    total_rows = sum(len(batch[key]) for key in ("coverages", "events", "limitations", "qualifications"))
+    chunked = total_rows > chunk_rows
+
+    report = {"transactions": 0, "nodes_created": 0, "relationships_created": 0, "stages": {}}
+
+    def commit(session, work, *args):
+        t0 = time.perf_counter()
+        nodes, rels, timings = session.execute_write(work, *args)
+        elapsed = time.perf_counter() - t0
+        report["transactions"] += 1
+        report["nodes_created"] += nodes
+        report["relationships_created"] += rels
+        stages = report["stages"]
+        for key, seconds in timings.items():
+            stages[key] = stages.get(key, 0.0) + seconds
+        stages["commit"] = stages.get("commit", 0.0) + elapsed - sum(timings.values())
+
+    t0 = time.perf_counter()
+    with graph_client.session() as session:
+        _ensure_schema_once(session)
+        if not chunked:
+            commit(session, _replace_products_tx, batch)
+        else:
+            staging_id = product_id + _STAGING_SUFFIX
+            staged = _build_batch([(staging_id, data)])
+            deferred = {"events": _load_payable_events, "limitations": _load_limitations}
+            try:
+                # 첫 트랜잭션은 이전에 실패하고 남은 임시 노드도 지운다.
+                commit(
+                    session,
+                    _replace_products_tx,
+                    staged,
+                    [(loader, key) for loader, key in LOAD_STAGES if key not in deferred],
+                )
+                for key, loader in deferred.items():
+                    rows = staged[key]
+                    for i in range(0, len(rows), chunk_rows):
+                        commit(session, _load_chunk_tx, loader, key, rows[i : i + chunk_rows])
+                commit(session, _swap_staged_tx, staging_id, product_id)
+            except Exception:
+                logger.error("상품 %s 나눠 적재 실패: 임시 노드를 지우고 기존 그래프를 유지한다.", product_id)
+                session.execute_write(clear_products, [staging_id])
+                raise
+    report["seconds"] = time.perf_counter() - t0
+
+    # 같은 프로세스의 메타데이터 캐시는 바로 비운다.
+    # (다른 프로세스는 Product.version 스탬프 변경으로 감지)
+    context_cache.invalidate_product(product_id)
+    return report
+
+
+# ==============================
+# 대량 적재 (디렉토리 단위)
+# ==============================
+
+def derive_product_id(path: str, data: dict) -> str:
+    """
+    JSON 안에 product_id 가 있으면 그대로 쓰고,
+    없으면 파일 이름에서 결정적인 ID 를 만든다. (같은 파일 → 항상 같은 ID)
+    """
+    if data.get("product_id"):
+        return data["product_id"]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(stem.encode("utf-8")).hexdigest()[:12].upper()
+    return f"PRD_{digest}"
+
+
+def _load_batch_tx(tx, batch):
+    """
+    상품 여러 개를 한 트랜잭션에서 교체 적재한다. 생성된 노드/관계 수를 돌려준다.
+    """
+    nodes, rels, _ = _replace_products_tx(tx, batch)
+    return nodes, rels
+
+
+def load_products_bulk(products, batch_size=50, workers=1, database=None):
+    """
+    [(product_id, data), ...] 를 batch_size 개씩 묶어서 적재한다.
+    - 배치 하나 = 트랜잭션 하나 (로더마다 UNWIND 한 번)
+    - workers > 1 이면 배치들을 여러 세션에서 동시에 적재한다.
+    - database: 생략하면 NEO4J_DB
+    - 반환값: 처리량 리포트 dict
+    """
+    batches = [
+        _build_batch(products[i : i + batch_size])
+        for i in range(0, len(products), batch_size)
+    ]
+
+    def run(batch):
+        with graph_client.session(database=database) as session:
+            return session.execute_write(_load_batch_tx, batch)
+
+    with graph_client.session(database=database) as session:
+        _ensure_schema_once(session)
+
+    t0 = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run, batches))
+    else:
+        results = [run(batch) for batch in batches]
+    elapsed = time.perf_counter() - t0
+
+    for product_id, _ in products:
+        context_cache.invalidate_product(product_id)
+
+    nodes = sum(n for n, _ in results)
+    rels = sum(r for _, r in results)
+    return {
+        "products": len(products),
+        "batches": len(batches),
+        "nodes_created": nodes,
+        "relationships_created": rels,
+        "seconds": elapsed,
+        "products_per_sec": len(products) / elapsed if elapsed else 0.0,
+        "nodes_per_sec": nodes / elapsed if elapsed else 0.0,
+    }
+
+
+def read_product_dir(directory: str, id_map: dict | None = None, warnings: list | None = None):
+    """
+    디렉토리의 *.json 을 읽고 검증/정규화해서 [(product_id, data), ...] 와 건너뛴 파일 목록을 돌려준다.
+    - id_map: (선택) {파일 이름: product_id}. 없으면 derive_product_id 로 만든다.
+    - warnings: (선택) 주면 적재는 되지만 알려야 할 문제 (path, 메시지) 를 채운다.
+    """
+    products = []
+    skipped = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        name = os.path.basename(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            record = normalize_product(data, name)
+        except (OSError, json.JSONDecodeError, ProductValidationError) as e:
+            skipped.append((path, str(e)))
+            continue
+        if warnings is not None:
+            warnings.extend((path, line) for line in record.warnings)
+        product_id = (id_map or {}).get(name) or derive_product_id(path, data)
+        products.append((product_id, record.to_dict()))
+    return products, skipped
 
 
 # ==============================
 # 엔트리포인트
 # ==============================
 
-if __name__ == "__main__":
-    # 1) JSON 파일 읽기
-    with open(JSON_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def _parse_args():
+    parser = argparse.ArgumentParser(description="상품 JSON → Neo4j 적재")
+    parser.add_argument("--dir", help="상품 JSON 디렉토리 (예: sample_docs/jsons). 주면 대량 적재 모드")
+    parser.add_argument("--normalized", help="product_schema.py 가 만든 정규화 JSONL. 주면 검증 없이 바로 적재")
+    parser.add_argument("--id-map", help="(선택) {파일 이름: product_id} JSON 파일")
+    parser.add_argument("--batch-size", type=int, default=50, help="트랜잭션 하나에 넣을 상품 수")
+    parser.add_argument("--workers", type=int, default=1, help="동시에 적재할 세션 수")
+    parser.add_argument("--txt-dir", default=TXT_DIR, help="원문 txt 디렉토리 (BM25 인덱스용, 없으면 건너뜀)")
+    return parser.parse_args()
 
-    # 2) Neo4j에 적재
-    load_product_structured(PRODUCT_ID, data)
 
-    driver.close()
-    print("✅ 그래프 적재 완료")
+def _coverage_names(tx, product_ids):
+    query = """
+    MATCH (c:Coverage) WHERE c.product_id IN $product_ids
+    RETURN c.product_id AS product_id, collect(DISTINCT c.name) AS names
+    """
+    return {r["product_id"]: r["names"] for r in tx.run(query, product_ids=product_ids)}
+
+
+def _load_chunks(tx, product_ids, chunks):
+    """
+    원문 청크를 (:Chunk) 로 넣고 Product / Coverage 와 HAS_CHUNK 로 잇는다.
+    - 상품의 기존 청크는 먼저 지운다. (원문이 바뀌면 청크 경계도 바뀐다)
+    - chunks: vector_index.chunk_rows 결과
+    """
+    tx.run(
+        "MATCH (ch:Chunk) WHERE ch.product_id IN $product_ids DETACH DELETE ch",
+        product_ids=product_ids,
+    )
+    query = """
+    UNWIND $chunks AS row
+    MATCH (p:Product {product_id: row.product_id})
+    MERGE (ch:Chunk {chunk_id: row.chunk_id})
+    SET ch.product_id = row.product_id,
+        ch.source     = row.source,
+        ch.seq        = row.seq,
+        ch.text       = row.text
+    MERGE (p)-[:HAS_CHUNK]->(ch)
+    WITH ch, row
+    UNWIND row.coverage_names AS coverage_name
+    MATCH (cov:Coverage {product_id: row.product_id, name: coverage_name})
+    MERGE (cov)-[:HAS_CHUNK]->(ch)
+    """
+    return tx.run(query, chunks=chunks).consume().counters
+
+
+def _loaded_product_ids(tx):
+    return [r["product_id"] for r in tx.run("MATCH (p:Product) RETURN p.product_id AS product_id")]
+
+
+def _build_text_index(txt_dir: str, product_ids: dict) -> None:
+    """
+    원문 txt 로 BM25 인덱스와 청크(+벡터 인덱스)를 만든다.
+    - product_ids: {product_key: product_id}
+    - 두 인덱스 모두 통째로 다시 만들므로, 이번에 적재하지 않은 상품도 빠지지 않도록
+      기존 BM25 인덱스가 알던 상품과 합친다. (Neo4j 에 Product 노드가 있는 상품만)
+    """
+    if not txt_dir or not os.path.isdir(txt_dir):
+        print(f"⚠️  원문 인덱스 건너뜀: {txt_dir} 없음")
+        return
+    with graph_client.session() as session:
+        loaded = set(session.execute_read(_loaded_product_ids))
+    merged = {**indexed_product_ids(), **product_ids}
+    product_ids = {key: pid for key, pid in merged.items() if pid in loaded}
+
+    report = build_index(txt_dir, product_ids)
+    print(
+        f"✅ 원문 인덱스: 문서 {report['documents']}개, passage {report['passages']}개, "
+        f"용어 {report['terms']}개, {report['seconds']:.2f}s"
+    )
+
+    ids = sorted(set(product_ids.values()))
+    with graph_client.session() as session:
+        _ensure_schema_once(session)
+        names = session.execute_read(_coverage_names, ids)
+        chunks = make_chunks(txt_dir, product_ids, names)
+        counters = session.execute_write(_load_chunks, ids, chunk_rows(chunks))
+    report = build_vector_index(chunks)
+    print(
+        f"✅ 청크/벡터 인덱스: 청크 {report['chunks']}개 (관계 {counters.relationships_created}개), "
+        f"IVF 리스트 {report['lists']}개, {report['embedder']}, {report['seconds']:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+
+    if args.dir or args.normalized:
+        if args.normalized:
+            sources = {}
+            products = read_normalized(args.normalized, sources)
+            text_product_ids = {product_key(name): pid for name, pid in sources.items()}
+        else:
+            id_map = None
+            if args.id_map:
+                with open(args.id_map, "r", encoding="utf-8") as f:
+                    id_map = json.load(f)
+
+            warnings = []
+            products, skipped = read_product_dir(args.dir, id_map, warnings)
+            for path, reason in skipped:
+                print(f"⚠️  건너뜀: {path} ({reason})")
+            for path, line in warnings:
+                print(f"⚠️  {os.path.basename(path)}: {line}")
+            text_product_ids = product_ids_from_json_dir(args.dir, id_map)
+
+        report = load_products_bulk(products, batch_size=args.batch_size, workers=args.workers)
+
+        for product_id, _ in products:
+            print(f"  - {product_id}")
+        print(
+            f"✅ 대량 적재 완료: 상품 {report['products']}개 / 배치 {report['batches']}개, "
+            f"노드 {report['nodes_created']}개, 관계 {report['relationships_created']}개, "
+            f"{report['seconds']:.2f}s "
+            f"({report['products_per_sec']:.1f} products/s, {report['nodes_per_sec']:.0f} nodes/s)"
+        )
+        _build_text_index(args.txt_dir, text_product_ids)
+        graph_client.close_driver()
+    else:
+        # 1) JSON 파일 읽기
+        with open(JSON_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        # 2) Neo4j에 적재 (트랜잭션 하나)
+        report = load_product_structured(PRODUCT_ID, data)
+
+        stages = ", ".join(f"{key} {seconds * 1000:.0f}ms" for key, seconds in report["stages"].items())
+        print(
+            f"✅ 그래프 적재 완료: 트랜잭션 {report['transactions']}개, "
+            f"노드 {report['nodes_created']}개, 관계 {report['relationships_created']}개, "
+            f"{report['seconds']:.2f}s ({stages})"
+        )
+        # 같은 디렉토리의 다른 상품도 인덱스에 남도록 디렉토리 전체 규칙으로 만들고 이 상품만 덮어쓴다.
+        text_product_ids = product_ids_from_json_dir(os.path.dirname(JSON_PATH) or ".")
+        text_product_ids[product_key(JSON_PATH)] = PRODUCT_ID
+        _build_text_index(args.txt_dir, text_product_ids)
+        graph_client.close_driver()
@@ -1,54 +1,81 @@
 # llm_answer.py
 
-from typing import List, Dict, Any
+import time
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Dict, Any, Tuple
 
-from config import client
+from config import ANSWER_ROWS_TOKEN_BUDGET, async_client, client
+from prompt_assembler import ANSWER_ROWS_SHARE, PromptAssembler, PromptUsage, row_budget, take_rows
+from text_index import Passage
+from tracing import span
 
+ANSWER_MODEL = "gpt-4o-mini"
 
-def _rows_to_text(rows: List[Dict[str, Any]]) -> str:
+
+def read_rows(
+    rows: Iterable[Dict[str, Any]],
+    token_budget: int = ANSWER_ROWS_TOKEN_BUDGET,
+) -> List[Dict[str, Any]]:
     """
-    Cypher 결과 rows(list of dict)를 LLM이 읽기 쉬운 텍스트로 변환.
+    쿼리 결과(리스트 또는 graph_client.CypherResult 스트림)를 답변 후보로 쓸 만큼만 읽는다.
+    (0 이면 끝까지 읽는다) 실제로 프롬프트에 넣을 행은 _build_messages 에서 고른다.
     """
-    if not rows:
-        return "그래프 쿼리 결과: 0행 (데이터 없음)."
+    return take_rows(rows, token_budget, ANSWER_MODEL)
 
-    lines: List[str] = []
-    for i, row in enumerate(rows, start=1):
-        parts = []
-        for k, v in row.items():
-            parts.append(f"{k}={v}")
-        line = f"{i}. " + ", ".join(parts)
-        lines.append(line)
 
-    return "\n".join(lines)
+def answer_row_budget(token_budget: int = ANSWER_ROWS_TOKEN_BUDGET) -> Callable[[Dict[str, Any]], bool]:
+    """
+    read_rows 와 같은 예산으로, DB 에서 받는 도중에 멈출 시점을 알려주는 함수. (쿼리 한 번마다 새로 만든다)
+    """
+    return row_budget(token_budget, ANSWER_MODEL)
 
 
-def generate_answer(
+def _build_messages(
     question: str,
     cypher: str,
     rows: List[Dict[str, Any]],
     graph_context: str | None = None,
-) -> str:
+    params: Dict[str, Any] | None = None,
+    evidence: List[Passage] | None = None,
+) -> Tuple[List[Dict[str, str]], PromptUsage]:
     """
-    - question: 사용자 질문 원문
-    - cypher: 실제로 실행한 Cypher 쿼리
-    - rows: 쿼리 결과 (record.data()로 받은 dict 리스트)
-    - graph_context: (선택) graph_context.build_graph_context 에서 만든 요약 텍스트
+    generate_answer / generate_answer_stream 이 공통으로 쓰는 chat messages 구성.
+    - 질문/쿼리/지시문은 그대로 두고, 남은 토큰 예산을 쿼리 결과 → 원문 발췌 → 그래프 컨텍스트 순으로 나눠 쓴다.
+    - evidence: (선택) text_index 에서 찾은 상품 문서 원문 passage
+    - 반환값: (messages, 토큰 사용량)
     """
 
-    rows_text = _rows_to_text(rows)
-
     # 시스템 프롬프트: "그래프 쿼리 결과만 믿고 한국어로 답해라"
     system_prompt = (
         "너는 보험 상품에 대한 질문에 답하는 어시스턴트이다. "
         "Neo4j 그래프에서 가져온 데이터(rows_text)와, "
         "그래프 메타데이터 요약(graph_context)이 주어진다. "
+        "상품 문서 원문 발췌(evidence)가 함께 주어지면 그것도 근거로 쓸 수 있다. "
         "반드시 이 데이터에 근거해서만 답변해야 한다. "
         "데이터에 없는 내용은 추측하지 말고, "
         "그래프에 해당 정보가 없다고 솔직하게 말해라. "
         "답변은 한국어로 자연스럽게 작성해라."
     )
 
+    params_text = ", ".join(f"${k}={v}" for k, v in (params or {}).items())
+    instructions = (
+        "\n위 정보를 바탕으로, 사용자의 질문에 친절하게 답변해라. "
+        "숫자나 조건 등은 가능한 한 그대로 인용하되, "
+        "표현은 사용자에게 이해하기 쉽게 풀어서 설명해라."
+        "사용자의 질문에 최대한 자세하고 정확하게 답변해라."
+    )
+
+    assembler = PromptAssembler(question, ANSWER_MODEL, "answer")
+    assembler.add_fixed(system_prompt, question, cypher, params_text, instructions)
+    rows_text = assembler.add_rows(rows, share=ANSWER_ROWS_SHARE)
+    evidence_text = ""
+    if evidence:
+        # 쿼리 결과가 없으면 원문이 주 근거이므로 예산을 더 준다.
+        evidence_text = assembler.add_passages(
+            [p.text for p in evidence], share=0.5 if rows else 0.8
+        )
+    if graph_context:
+        graph_context = assembler.add_context(graph_context)
+
     # 유저 컨텍스트 구성
     user_parts: List[str] = []
 
@@ -58,6 +85,10 @@ def generate_answer(
     user_parts.append("\n=== 실행된 Cypher 쿼리 ===")
     user_parts.append(cypher)
 
+    if params:
+        user_parts.append("\n=== 쿼리 파라미터 ===")
+        user_parts.append(params_text)
+
     if graph_context:
         user_parts.append("\n=== 그래프 메타데이터 요약 ===")
         user_parts.append(graph_context)
@@ -65,22 +96,129 @@ def generate_answer(
     user_parts.append("\n=== 그래프 쿼리 결과(요약) ===")
     user_parts.append(rows_text)
 
-    user_parts.append(
-        "\n위 정보를 바탕으로, 사용자의 질문에 친절하게 답변해라. "
-        "숫자나 조건 등은 가능한 한 그대로 인용하되, "
-        "표현은 사용자에게 이해하기 쉽게 풀어서 설명해라."
-        "사용자의 질문에 최대한 자세하고 정확하게 답변해라."
-    )
+    if evidence_text:
+        user_parts.append("\n=== 상품 문서 원문 발췌 ===")
+        user_parts.append(evidence_text)
+
+    user_parts.append(instructions)
 
     user_content = "\n".join(user_parts)
 
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content},
-        ],
-        temperature=0.2,
-    )
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ]
+    return messages, assembler.finish(messages)
+
+
+def generate_answer(
+    question: str,
+    cypher: str,
+    rows: List[Dict[str, Any]],
+    graph_context: str | None = None,
+    params: Dict[str, Any] | None = None,
+    usage_sink: List[PromptUsage] | None = None,
+    evidence: List[Passage] | None = None,
+) -> str:
+    """
+    - question: 사용자 질문 원문
+    - cypher: 실제로 실행한 Cypher 쿼리
+    - rows: 쿼리 결과 (record.data()로 받은 dict 리스트)
+    - graph_context: (선택) graph_context.build_graph_context 에서 만든 요약 텍스트
+    - params: (선택) 템플릿 쿼리일 때 $t0, $t1 ... 에 들어간 값
+    - usage_sink: (선택) 이 요청의 토큰 사용량(PromptUsage)을 받아갈 리스트
+    - evidence: (선택) text_index.search_passages 로 찾은 원문 passage
+    """
+    messages, usage = _build_messages(question, cypher, rows, graph_context, params, evidence)
+    with span("llm.answer", model=ANSWER_MODEL):
+        completion = client.chat.completions.create(
+            model=ANSWER_MODEL,
+            messages=messages,
+            temperature=0.2,
+        )
+        usage.record_api_usage(completion.usage)
+    if usage_sink is not None:
+        usage_sink.append(usage)
 
     return completion.choices[0].message.content or ""
+
+
+def generate_answer_stream(
+    question: str,
+    cypher: str,
+    rows: List[Dict[str, Any]],
+    graph_context: str | None = None,
+    params: Dict[str, Any] | None = None,
+    usage_sink: List[PromptUsage] | None = None,
+    evidence: List[Passage] | None = None,
+) -> Iterator[str]:
+    """
+    generate_answer 의 스트리밍 버전.
+    chat completion 을 stream=True 로 호출해서 토큰(델타 텍스트)이 도착하는 대로 yield 한다.
+    (토큰 사용량은 스트림 마지막 청크로 받는다)
+    """
+    messages, usage = _build_messages(question, cypher, rows, graph_context, params, evidence)
+    if usage_sink is not None:
+        usage_sink.append(usage)
+    with span("llm.answer", model=ANSWER_MODEL, stream=True) as s:
+        t0 = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=ANSWER_MODEL,
+            messages=messages,
+            temperature=0.2,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage.record_api_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if "ttft_ms" not in s.attrs:
+                    s.set(ttft_ms=round((time.perf_counter() - t0) * 1000, 1))
+                yield delta
+
+
+async def generate_answer_stream_async(
+    question: str,
+    cypher: str,
+    rows: List[Dict[str, Any]],
+    graph_context: str | None = None,
+    params: Dict[str, Any] | None = None,
+    usage_sink: List[PromptUsage] | None = None,
+    evidence: List[Passage] | None = None,
+) -> AsyncIterator[str]:
+    """
+    generate_answer_stream 의 비동기 버전 (AsyncOpenAI).
+    소비하는 쪽이 중간에 멈추거나 취소되면 스트림(HTTP 응답)을 바로 닫는다.
+    """
+    messages, usage = _build_messages(question, cypher, rows, graph_context, params, evidence)
+    if usage_sink is not None:
+        usage_sink.append(usage)
+    with span("llm.answer", model=ANSWER_MODEL, stream=True) as s:
+        t0 = time.perf_counter()
+        stream = await async_client.chat.completions.create(
+            model=ANSWER_MODEL,
+            messages=messages,
+            temperature=0.2,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage.record_api_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if "ttft_ms" not in s.attrs:
+                        # 첫 토큰까지 걸린 시간 (스트리밍 전체 시간은 소비하는 쪽 속도에도 달려 있다)
+                        s.set(ttft_ms=round((time.perf_counter() - t0) * 1000, 1))
+                    yield delta
+        finally:
+            await stream.close()
@@ -1,6 +1,22 @@
+import asyncio
 import re
-from config import client
+from typing import Any, Dict, List, Tuple
+
+from config import QA_SPECULATIVE_CYPHER, async_client, client
+from cypher_templates import template_library
+from graph_context import (
+    build_graph_context_async,
+    covered_by_default_context,
+    default_context_async,
+    get_product_vocabulary,
+    plan_graph_context_async,
+)
+from metadata_planner import needs_llm_plan
+from prompt_assembler import PromptAssembler, PromptUsage
 from prompts import CYTHER_SYSTEM_PROMPT
+from tracing import annotate, span
+
+CYPHER_MODEL = "gpt-4o"
 
 
 def _strip_markdown_fence(text: str) -> str:
@@ -20,28 +36,40 @@ def _strip_markdown_fence(text: str) -> str:
     return s
 
 
-def generate_cypher(question: str, product_id: str, graph_context: str) -> str:
-    user_content = (
+def _cypher_messages(question: str, graph_context: str) -> Tuple[List[Dict[str, str]], PromptUsage]:
+    """
+    - graph_context 는 프롬프트 토큰 예산을 넘으면 질문과 관련 높은 항목만 남겨서 넣는다.
+    """
+    instructions = (
         "다음은 특정 보험상품에 대해 Neo4j 그래프에서 조회한 메타데이터 요약이다.\n"
         "이 요약에 포함된 category / coverage / qualification / limitation / 메타 노드 정보를 "
         "실제 그래프에 존재하는 값으로 간주하라.\n"
         "이 값들을 활용해서, 사용자 질문에 답하기 위한 '읽기 전용 Cypher 쿼리' 한 개를 작성하라.\n"
         "쿼리 안에서는 product_id 를 $product_id 파라미터로 사용해야 한다.\n"
         "마크다운 코드블록(백틱 세 개)을 사용하지 말고, 순수한 Cypher 텍스트만 출력하라.\n\n"
-        "=== 그래프 메타데이터 요약 ===\n"
+    )
+    assembler = PromptAssembler(question, CYPHER_MODEL, "cypher")
+    assembler.add_fixed(CYTHER_SYSTEM_PROMPT, instructions, question)
+    graph_context = assembler.add_context(graph_context)
+
+    user_content = (
+        instructions
+        + "=== 그래프 메타데이터 요약 ===\n"
         f"{graph_context}\n\n"
         "=== 사용자 질문 ===\n"
         f"{question}\n"
     )
+    messages = [
+        {"role": "system", "content": CYTHER_SYSTEM_PROMPT},
+        {"role": "user", "content": user_content},
+    ]
+    return messages, assembler.finish(messages)
 
-    completion = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": CYTHER_SYSTEM_PROMPT},
-            {"role": "user", "content": user_content},
-        ],
-        temperature=0,
-    )
+
+def _cypher_from_completion(completion, usage: PromptUsage, usage_sink: List[PromptUsage] | None) -> str:
+    usage.record_api_usage(completion.usage)
+    if usage_sink is not None:
+        usage_sink.append(usage)
 
     raw = completion.choices[0].message.content or ""
     cypher = _strip_markdown_fence(raw)
@@ -51,3 +79,175 @@ def generate_cypher(question: str, product_id: str, graph_context: str) -> str:
         raise ValueError(f"쓰기/관리 연산이 포함된 위험한 쿼리입니다:\n{cypher}")
 
     return cypher.strip()
+
+
+def generate_cypher(
+    question: str,
+    product_id: str,
+    graph_context: str,
+    usage_sink: List[PromptUsage] | None = None,
+) -> str:
+    """
+    - graph_context 는 프롬프트 토큰 예산을 넘으면 질문과 관련 높은 항목만 남겨서 넣는다.
+    - usage_sink: (선택) 이 요청의 토큰 사용량(PromptUsage)을 받아갈 리스트
+    """
+    messages, usage = _cypher_messages(question, graph_context)
+    with span("llm.cypher", model=CYPHER_MODEL):
+        completion = client.chat.completions.create(
+            model=CYPHER_MODEL,
+            messages=messages,
+            temperature=0,
+        )
+        return _cypher_from_completion(completion, usage, usage_sink)
+
+
+async def generate_cypher_async(
+    question: str,
+    product_id: str,
+    graph_context: str,
+    usage_sink: List[PromptUsage] | None = None,
+) -> str:
+    """
+    generate_cypher 의 비동기 버전 (AsyncOpenAI)
+    """
+    messages, usage = _cypher_messages(question, graph_context)
+    with span("llm.cypher", model=CYPHER_MODEL):
+        completion = await async_client.chat.completions.create(
+            model=CYPHER_MODEL,
+            messages=messages,
+            temperature=0,
+        )
+        return _cypher_from_completion(completion, usage, usage_sink)
+
+
+async def regenerate_cypher_async(
+    question: str,
+    product_id: str,
+    graph_context: str,
+    rejected_cypher: str,
+    reason: str,
+    usage_sink: List[PromptUsage] | None = None,
+    problem: str = "실행 전 점검에서 거부되었다",
+) -> str:
+    """
+    실행 전 점검(cypher_guard)에서 거부된 쿼리를 사유와 함께 돌려주고 다시 만들게 한다.
+    - problem: 쿼리가 어떻게 실패했는지 (실행 오류 / 0행 결과로 다시 만들 때는 cypher_repair 가 넘긴다)
+    """
+    messages, usage = _cypher_messages(question, graph_context)
+    messages += [
+        {"role": "assistant", "content": rejected_cypher},
+        {
+            "role": "user",
+            "content": (
+                f"위 쿼리는 {problem}.\n"
+                f"사유:\n{reason}\n\n"
+                "같은 질문에 답하는 읽기 전용 Cypher 쿼리를 다시 작성하라. "
+                "(p:Product {product_id: $product_id}) 에서 출발해서 모든 노드 패턴을 관계로 이어야 하고, "
+                "순수한 Cypher 텍스트만 출력하라."
+            ),
+        },
+    ]
+    with span("llm.cypher", model=CYPHER_MODEL, retry=True):
+        completion = await async_client.chat.completions.create(
+            model=CYPHER_MODEL,
+            messages=messages,
+            temperature=0,
+        )
+        return _cypher_from_completion(completion, usage, usage_sink)
+
+
+def generate_cypher_with_params(
+    question: str,
+    product_id: str,
+    graph_context: str,
+    usage_sink: List[PromptUsage] | None = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    1) 질문이 이미 학습한 템플릿 모양과 맞으면 LLM 없이 (skeleton, 파라미터) 를 돌려준다.
+    2) 아니면 generate_cypher 로 LLM 에게 새로 만들게 한다. (파라미터 없음)
+    - 실행 시에는 {"product_id": product_id, **params} 를 넘겨야 한다.
+    """
+    matched = template_library.match(question, get_product_vocabulary(product_id))
+    if matched is not None:
+        return matched
+    return generate_cypher(question, product_id, graph_context, usage_sink), {}
+
+
+async def generate_cypher_with_params_async(
+    question: str,
+    product_id: str,
+    graph_context: str,
+    usage_sink: List[PromptUsage] | None = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    generate_cypher_with_params 의 비동기 버전.
+    (상품 어휘는 캐시되어 있으므로 스레드에서 읽고, LLM 호출만 await)
+    """
+    vocabulary = await asyncio.to_thread(get_product_vocabulary, product_id)
+    matched = template_library.match(question, vocabulary)
+    if matched is not None:
+        annotate(template=True)
+        return matched
+    return await generate_cypher_async(question, product_id, graph_context, usage_sink), {}
+
+
+async def generate_context_and_cypher_async(
+    question: str,
+    product_id: str,
+    usage_sink: List[PromptUsage] | None = None,
+) -> Tuple[str, str, Dict[str, Any], bool | None]:
+    """
+    그래프 컨텍스트 조회 + Cypher 생성을 한 번에. (컨텍스트, cypher, params, speculative)
+
+    LLM 플래너가 필요한 질문이면(QA_SPECULATIVE_CYPHER) 플래너를 기다리지 않고
+    상품 기본 컨텍스트로 Cypher 생성을 동시에 시작한다.
+    - 플랜이 고른 섹션이 기본 컨텍스트 안에 다 있으면 미리 만든 쿼리를 쓴다. (speculative=True)
+    - 아니면 미리 만든 쿼리는 취소/폐기하고 플랜의 컨텍스트로 다시 만든다. (speculative=False)
+    - 템플릿에 맞거나 로컬 규칙으로 플랜이 끝나는 질문은 순서대로 진행한다. (speculative=None)
+    """
+    vocabulary = await asyncio.to_thread(get_product_vocabulary, product_id)
+    matched = template_library.match(question, vocabulary)
+    if matched is not None:
+        cypher, params = matched
+        annotate(template=True)
+        return await build_graph_context_async(question, product_id), cypher, params, None
+
+    if not QA_SPECULATIVE_CYPHER or not needs_llm_plan(question, vocabulary):
+        graph_context = await build_graph_context_async(question, product_id)
+        cypher = await generate_cypher_async(question, product_id, graph_context, usage_sink)
+        return graph_context, cypher, {}, None
+
+    default_context = await default_context_async(product_id)
+    speculative_usage: List[PromptUsage] = []
+    speculative = asyncio.create_task(
+        generate_cypher_async(question, product_id, default_context, speculative_usage)
+    )
+    # 버려지는 추측 요청의 예외는 여기서 회수한다. (미회수 경고 방지)
+    speculative.add_done_callback(lambda task: task.cancelled() or task.exception())
+    try:
+        metadata_types, graph_context = await plan_graph_context_async(question, product_id)
+        if covered_by_default_context(metadata_types):
+            cypher = await speculative
+            if usage_sink is not None:
+                usage_sink.extend(speculative_usage)
+            annotate(speculative="hit")
+            return graph_context, cypher, {}, True
+    finally:
+        # 플래너 실패 / 취소 / 플랜 불일치: 아직 진행 중인 추측 요청은 끊는다.
+        speculative.cancel()
+
+    await asyncio.wait([speculative])
+    if not speculative.cancelled() and speculative.exception() is None and usage_sink is not None:
+        # 취소 전에 이미 끝난 요청의 토큰은 쓴 것이므로 사용량에는 남긴다.
+        usage_sink.extend(speculative_usage)
+    annotate(speculative="miss")
+    cypher = await generate_cypher_async(question, product_id, graph_context, usage_sink)
+    return graph_context, cypher, {}, False
+
+
+def learn_cypher_template(question: str, product_id: str, cypher: str) -> None:
+    """
+    실행 결과가 있었던 LLM 생성 Cypher 를 템플릿 라이브러리에 등록한다.
+    (템플릿으로 만들 수 없는 쿼리는 조용히 건너뛴다)
+    """
+    template_library.learn(question, cypher, get_product_vocabulary(product_id))
@@ -1,8 +1,7 @@
 from config import DEFAULT_PRODUCT_ID
-from graph_client import run_cypher, close_driver
-from graph_context import build_graph_context
-from llm_cypher import generate_cypher
-from llm_answer import generate_answer
+from graph_client import close_driver, schema_report
+from qa_pipeline import run_qa_stream
+from tracing import start_metrics_server
 
 
 def ask_product_id(default_product_id: str) -> str:
@@ -43,29 +42,57 @@ def qa_loop(product_id: str) -> None:
             continue
 
         try:
-            # 2단계: 질문을 보고 LLM이 필요한 정보 타입 결정 → 그래프에서 해당 값 조회
-            graph_ctx_text = build_graph_context(question, product_id)
-            print("\n[그래프 컨텍스트]")
-            print(graph_ctx_text)
-
-            # 3단계: 질문 + 그래프 컨텍스트 기반 Cypher 생성
-            cypher = generate_cypher(question, product_id, graph_ctx_text)
-            print("\n[생성된 Cypher 쿼리]")
-            print(cypher)
-
-            # 4단계: 그래프 실행 + 답변
-            rows = run_cypher(cypher, {"product_id": product_id})
-            print(f"\n[쿼리 결과 행 수] {len(rows)}")
-
-            answer = generate_answer(
-                question=question,
-                cypher=cypher,
-                rows=rows,
-                graph_context=graph_ctx_text,  # llm_answer 에서 필요시 활용
-            )
-            print("\n[답변]")
-            print(answer)
-            print("\n" + "-" * 60 + "\n")
+            answering = False
+            for event in run_qa_stream(question, product_id):
+                if event.stage == "cache_hit":
+                    print(f"\n[캐시 적중] {event.data.question}")
+                elif event.stage == "context":
+                    print("\n[그래프 컨텍스트]")
+                    print(event.data)
+                elif event.stage == "guard":
+                    print("\n[실행 전 점검에서 거부된 쿼리]")
+                    print(event.data.cypher)
+                    print(event.data.reason())
+                elif event.stage == "cypher":
+                    cypher, cypher_params = event.data
+                    print("\n[생성된 Cypher 쿼리]")
+                    print(cypher)
+                    if cypher_params:
+                        print(f"[템플릿 파라미터] {cypher_params}")
+                elif event.stage == "speculation":
+                    print("[추측 생성] " + ("플래너와 동시에 만든 쿼리 사용" if event.data else "플랜이 달라 다시 생성"))
+                elif event.stage == "repair":
+                    repair = event.data
+                    print("\n[쿼리 복구] " + ("실행 오류: " + repair.error if repair.error else "결과 0행"))
+                    for fix in repair.fixes:
+                        print(f"- {fix.prop}: '{fix.old}' → '{fix.new}' (유사도 {fix.score})")
+                    for attempt in repair.attempts:
+                        outcome = attempt.error or f"{attempt.rows}행"
+                        print(f"- {'리터럴 교정' if attempt.method == 'literal' else 'LLM 재생성'}: {outcome}")
+                    if repair.ok:
+                        print(repair.cypher)
+                elif event.stage == "rows":
+                    truncated = " (일부만 사용)" if getattr(event.data, "truncated", False) else ""
+                    print(f"\n[쿼리 결과 행 수] {len(event.data)}{truncated}")
+                elif event.stage == "hybrid":
+                    print(f"[벡터 검색 → 그래프 확장 행 수] {len(event.data)}")
+                elif event.stage == "evidence":
+                    print(f"[원문 발췌] {', '.join(p.source for p in event.data)}")
+                elif event.stage == "usage":
+                    print("\n\n[토큰 사용량]")
+                    for usage in event.data:
+                        print(f"- {usage.summary()}")
+                elif event.stage == "trace":
+                    print("\n[단계별 지연]")
+                    for line in event.data.summary_lines():
+                        print(f"  {line}")
+                elif event.stage == "token":
+                    if not answering:
+                        print("\n[답변]")
+                        answering = True
+                    # 답변 토큰은 도착하는 대로 이어서 출력
+                    print(event.data, end="", flush=True)
+            print("\n\n" + "-" * 60 + "\n")
 
         except Exception as e:
             print("\n[에러 발생]")
@@ -82,6 +109,13 @@ if __name__ == "__main__":
         print("[product_id 설정 에러]", e)
     else:
         try:
+            try:
+                print("[그래프 스키마]", schema_report())
+            except Exception as e:
+                print("[그래프 스키마 점검 실패]", e)
+            server = start_metrics_server()
+            if server is not None:
+                print(f"[지표] http://{server.server_address[0]}:{server.server_address[1]}/metrics")
             qa_loop(product_id)
         finally:
             close_driver()
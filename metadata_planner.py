@@ -1,10 +1,12 @@
 # metadata_planner.py
 
 import json
-from typing import List
+import re
+from typing import Dict, List, Tuple
 
-from config import client
+from config import async_client, client, PLANNER_CONFIDENCE_THRESHOLD
 from prompts import METADATA_PLAN_SYSTEM_PROMPT
+from tracing import record_llm_usage, span
 
 
 ALLOWED_METADATA_TYPES = {
@@ -16,30 +18,126 @@ ALLOWED_METADATA_TYPES = {
 }
 
 
-def plan_metadata_types(question: str) -> List[str]:
+# -----------------------------
+# 로컬 키워드 규칙 테이블
+# -----------------------------
+# 타입별 {키워드: 가중치}. 질문에 키워드가 부분 문자열로 들어 있으면 가중치를 더한다.
+# 1.0 은 그 키워드 하나만으로도 타입을 확정할 수 있는 강한 단서,
+# 0.5 는 다른 단서와 함께 있어야 의미가 있는 약한 단서.
+KEYWORD_RULES: Dict[str, Dict[str, float]] = {
+    "payable_event_summary": {
+        "보장": 1.0, "보험금": 1.0, "지급사유": 1.0, "받을 수": 1.0, "받을수": 1.0,
+        "얼마": 1.0, "금액": 1.0, "치료비": 1.0, "진단비": 1.0, "수술": 1.0,
+        "입원": 1.0, "통원": 1.0, "암": 1.0, "뇌혈관": 1.0, "심장": 1.0,
+        "당뇨": 1.0, "고혈압": 1.0, "대상포진": 1.0, "통풍": 1.0,
+        "치아": 1.0, "임플란트": 1.0, "틀니": 1.0, "브릿지": 1.0, "충전": 0.5,
+        "지급": 0.5, "진단": 0.5, "치료": 0.5,
+    },
+    "coverage_list": {
+        "특약": 1.0, "주계약": 1.0, "담보": 1.0, "목록": 1.0, "종류": 1.0,
+        "어떤 보장": 1.0, "뭐가 있": 1.0, "무엇이 있": 1.0, "구성": 1.0,
+        "보장": 0.5,
+    },
+    "qualification_summary": {
+        "나이": 1.0, "연령": 1.0, "가입자격": 1.0, "가입 자격": 1.0, "가입조건": 1.0,
+        "가입 조건": 1.0, "보험기간": 1.0, "납입기간": 1.0, "납입주기": 1.0,
+        "간편심사": 1.0, "일반심사": 1.0, "최초계약": 1.0, "갱신계약": 1.0,
+        "만기": 1.0, "월납": 1.0, "전기납": 1.0, "몇 살": 1.0, "몇살": 1.0,
+        "가입": 0.5, "갱신": 0.5, "세부터": 1.0, "세까지": 1.0,
+    },
+    "limitation_summary": {
+        "면책": 1.0, "제한": 1.0, "보상하지 않": 1.0, "보장하지 않": 1.0,
+        "제외": 1.0, "감액": 1.0, "한도": 1.0, "안 되": 1.0, "안되": 1.0,
+        "못 받": 1.0, "못받": 1.0, "횟수": 0.5, "최대": 0.5, "연간": 0.5,
+        "주의": 0.5,
+    },
+    "meta_nodes": {
+        "배당": 1.0, "보험료": 1.0, "할인": 1.0, "선납": 1.0, "의무가입": 1.0,
+        "의무 가입": 1.0, "의무부가": 1.0, "납입면제": 1.0, "환급": 1.0,
+        "산출": 0.5,
+    },
+}
+
+# 그래프 어휘 중에서 단서로 쓰기엔 너무 일반적인 값
+_VOCAB_STOPWORDS = {"", "기타", "MAIN", "RIDER"}
+
+
+def _coverage_core_name(name: str) -> str:
     """
-    LLM에게 질문을 넘겨서
-    - 어떤 메타데이터 타입을 조회할지 결정하게 한다.
-    - 결과는 ["payable_event_summary", "coverage_list", ...] 형태의 리스트.
+    "(간편)암주요치료비특약(무배당, 갱신형)" → "암주요치료비"
+    괄호 부분과 꼬리의 "특약" 을 떼어낸 핵심 이름.
+    """
+    core = re.sub(r"\([^)]*\)", "", name or "").strip()
+    if core.endswith("특약"):
+        core = core[: -len("특약")]
+    return core.strip()
+
+
+def _vocabulary_rules(vocabulary: Dict[str, List[str]]) -> Dict[str, Dict[str, float]]:
+    """
+    graph_context.get_product_vocabulary() 가 돌려준 상품 어휘를 키워드 규칙으로 바꾼다.
     """
+    rules: Dict[str, Dict[str, float]] = {t: {} for t in KEYWORD_RULES}
+
+    for cat in vocabulary.get("event_categories", []):
+        if cat not in _VOCAB_STOPWORDS:
+            rules["payable_event_summary"][cat] = 1.0
+    for name in vocabulary.get("coverage_names", []):
+        core = _coverage_core_name(name)
+        if len(core) >= 2:
+            rules["coverage_list"][core] = 1.0
+            rules["payable_event_summary"][core] = 0.5
+    for cat in vocabulary.get("limitation_categories", []):
+        if cat not in _VOCAB_STOPWORDS:
+            rules["limitation_summary"][cat] = 1.0
+    for qtype in vocabulary.get("qualification_types", []):
+        if qtype not in _VOCAB_STOPWORDS:
+            rules["qualification_summary"][qtype] = 1.0
+
+    return rules
+
+
+def plan_metadata_types_local(
+    question: str,
+    vocabulary: Dict[str, List[str]] | None = None,
+) -> Tuple[List[str], float]:
+    """
+    키워드 규칙 테이블로 메타데이터 타입을 고른다. (LLM 호출 없음)
+    - 반환값: (점수 높은 순 타입 리스트, confidence 0.0~1.0)
+    - confidence 는 가장 강한 타입의 점수(최대 1.0). 아무 단서도 없으면 0.0.
+    """
+    text = question.strip()
+    rule_sets = [KEYWORD_RULES]
+    if vocabulary:
+        rule_sets.append(_vocabulary_rules(vocabulary))
+
+    scores: Dict[str, float] = {}
+    for rules in rule_sets:
+        for mtype, keywords in rules.items():
+            for keyword, weight in keywords.items():
+                if keyword in text:
+                    scores[mtype] = scores.get(mtype, 0.0) + weight
+
+    selected = [t for t, score in scores.items() if score >= 0.5]
+    selected.sort(key=lambda t: -scores[t])
+    confidence = min(1.0, max(scores.values())) if scores else 0.0
+    return selected, confidence
+
+
+def _planner_messages(question: str) -> List[Dict[str, str]]:
     user_content = (
         "다음은 사용자의 질문이다.\n\n"
         f"{question}\n\n"
         "이 질문에 답하기 위해 필요한 그래프 메타데이터 타입들을 선택하라.\n"
         "반드시 JSON 형식으로 출력해야 한다."
     )
+    return [
+        {"role": "system", "content": METADATA_PLAN_SYSTEM_PROMPT},
+        {"role": "user", "content": user_content},
+    ]
 
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": METADATA_PLAN_SYSTEM_PROMPT},
-            {"role": "user", "content": user_content},
-        ],
-        temperature=0,
-    )
-
-    raw = completion.choices[0].message.content or ""
 
+def _parse_plan(raw: str) -> List[str]:
     # JSON 파싱 시도
     try:
         data = json.loads(raw)
@@ -53,4 +151,79 @@ def plan_metadata_types(question: str) -> List[str]:
     except Exception:
         # JSON 파싱 실패 시에도 안전한 기본값
     #    return ["coverage_list", "payable_event_summary"]
-        return
\ No newline at end of file
+        return []
+
+
+def plan_metadata_types_llm(question: str) -> List[str]:
+    """
+    LLM에게 질문을 넘겨서
+    - 어떤 메타데이터 타입을 조회할지 결정하게 한다.
+    - 결과는 ["payable_event_summary", "coverage_list", ...] 형태의 리스트.
+    """
+    with span("llm.plan", model="gpt-4o-mini"):
+        completion = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=_planner_messages(question),
+            temperature=0,
+        )
+        record_llm_usage(completion.usage)
+    return _parse_plan(completion.choices[0].message.content or "")
+
+
+async def plan_metadata_types_llm_async(question: str) -> List[str]:
+    """
+    plan_metadata_types_llm 의 비동기 버전 (AsyncOpenAI)
+    """
+    with span("llm.plan", model="gpt-4o-mini"):
+        completion = await async_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=_planner_messages(question),
+            temperature=0,
+        )
+        record_llm_usage(completion.usage)
+    return _parse_plan(completion.choices[0].message.content or "")
+
+
+def needs_llm_plan(
+    question: str,
+    vocabulary: Dict[str, List[str]] | None = None,
+) -> bool:
+    """
+    로컬 규칙만으로는 확신이 없어서 plan_metadata_types 가 LLM 까지 부를지 여부.
+    """
+    _, confidence = plan_metadata_types_local(question, vocabulary)
+    return confidence < PLANNER_CONFIDENCE_THRESHOLD
+
+
+def plan_metadata_types(
+    question: str,
+    vocabulary: Dict[str, List[str]] | None = None,
+) -> List[str]:
+    """
+    1) 로컬 키워드 규칙으로 먼저 고른다. (마이크로초 단위)
+    2) confidence 가 PLANNER_CONFIDENCE_THRESHOLD 보다 낮을 때만 LLM 에게 묻는다.
+    - vocabulary: (선택) 그래프에서 읽은 상품 어휘. 있으면 규칙 테이블을 보강한다.
+    """
+    with span("plan") as s:
+        types, confidence = plan_metadata_types_local(question, vocabulary)
+        s.set(confidence=round(confidence, 2), llm=confidence < PLANNER_CONFIDENCE_THRESHOLD)
+        if confidence < PLANNER_CONFIDENCE_THRESHOLD:
+            types = plan_metadata_types_llm(question)
+        s.set(types=types)
+    return types
+
+
+async def plan_metadata_types_async(
+    question: str,
+    vocabulary: Dict[str, List[str]] | None = None,
+) -> List[str]:
+    """
+    plan_metadata_types 의 비동기 버전. (LLM 으로 넘어갈 때만 await)
+    """
+    with span("plan") as s:
+        types, confidence = plan_metadata_types_local(question, vocabulary)
+        s.set(confidence=round(confidence, 2), llm=confidence < PLANNER_CONFIDENCE_THRESHOLD)
+        if confidence < PLANNER_CONFIDENCE_THRESHOLD:
+            types = await plan_metadata_types_llm_async(question)
+        s.set(types=types)
+    return types
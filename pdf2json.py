@@ -0,0 +1,603 @@
+# pdf2json.py
+"""
+1단계: 상품 문서 (PDF 또는 txt) → LLM → 그래프 적재용 JSON.
+
+- 문서를 페이지 단위로 읽고, 몇 페이지씩 묶은 작업(job)으로 나눠 동시에 추출한다.
+  (요청 수 제한 + 지수 백오프 재시도)
+- 작업 결과는 하나씩 체크포인트로 남기므로, 중간에 멈춰도 다시 실행하면 끝난 작업은 건너뛴다.
+- 같은 상품의 문서(상품요약서 + 사업방법서)에서 나온 부분 결과를 합쳐서
+  json2graph.load_product_structured 가 읽는 형식으로 만들고, 검증을 통과한 것만 쓴다.
+- LLM 백엔드는 EXTRACT_BACKEND 로 바꿀 수 있다. "stub" 은 네트워크 없이 동작하는 규칙 기반 추출기.
+
+사용 예:
+    python pdf2json.py                                   # sample_docs/txt → sample_docs/extracted
+    python pdf2json.py --source-dir sample_docs/origin   # PDF 입력 (pypdf 필요)
+    python pdf2json.py --backend stub                    # 오프라인
+    python json2graph.py --dir sample_docs/extracted     # 적재
+"""
+
+import argparse
+import glob
+import hashlib
+import importlib
+import json
+import os
+import random
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Protocol, Tuple
+
+from product_schema import META_KEYS, ProductValidationError, normalize_product
+from prompts import EXTRACTION_SYSTEM_PROMPT
+from text_index import product_key
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF 입력을 쓸 때만 필요하다.
+    PdfReader = None
+
+# -----------------------------
+# 추출 설정
+# -----------------------------
+# "openai" / "stub" (오프라인 규칙 기반) / "패키지.모듈:팩토리"
+EXTRACT_BACKEND = os.getenv("EXTRACT_BACKEND", "openai")
+EXTRACT_MODEL = os.getenv("EXTRACT_MODEL", "gpt-4o-mini")
+# txt 입력에는 페이지 구분이 없으므로 "## " 제목 경계에서 이 글자 수 근처로 잘라 페이지로 본다.
+EXTRACT_PAGE_CHARS = int(os.getenv("EXTRACT_PAGE_CHARS", "3000"))
+EXTRACT_PAGES_PER_JOB = int(os.getenv("EXTRACT_PAGES_PER_JOB", "3"))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "4"))
+# LLM 요청 시작 간격 제한 (분당 요청 수, 0 이면 제한 없음)
+EXTRACT_REQUESTS_PER_MINUTE = float(os.getenv("EXTRACT_REQUESTS_PER_MINUTE", "60"))
+EXTRACT_MAX_RETRIES = int(os.getenv("EXTRACT_MAX_RETRIES", "4"))
+EXTRACT_RETRY_BASE_DELAY = float(os.getenv("EXTRACT_RETRY_BASE_DELAY", "2.0"))
+
+SOURCE_DIR = "./sample_docs/txt"
+OUT_DIR = "./sample_docs/extracted"
+CHECKPOINT_DIR = "./extract_checkpoints"
+
+LIST_KEYS = ["coverages", "payable_events", "limitations", "qualifications"]
+
+# 같은 항목이 여러 job 에서 나오면 이 필드들로 중복을 판단한다.
+_DEDUPE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "coverages": ("name", "type"),
+    "payable_events": ("coverage_name", "coverage_type", "category", "reason", "amount"),
+    "limitations": ("coverage_name", "coverage_type", "category", "text"),
+    "qualifications": ("type1", "type2", "insurance_period", "payment_period"),
+}
+
+# 손으로 만든 JSON 과 같은 모양을 유지하기 위한 빈 ID 필드 (실제 ID 는 적재 시 생성)
+_ID_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "coverages": ("coverage_id",),
+    "payable_events": ("event_id", "coverage_id"),
+    "limitations": ("limit_id", "coverage_id"),
+    "qualifications": ("qualification_id",),
+    "required_subscription": ("required_id",),
+    "dividend_info": ("dividend_id",),
+    "premium_info": ("premium_info_id",),
+    "premium_discount": ("premium_discount_id",),
+    "prepayment_info": ("prepayment_id",),
+}
+
+_SPACES_RE = re.compile(r"\s+")
+_NON_WORD_RE = re.compile(r"[^\w]")
+
+
+# -----------------------------
+# 문서 → 페이지 → 작업
+# -----------------------------
+
+def _split_text_pages(text: str, page_chars: int = EXTRACT_PAGE_CHARS) -> List[str]:
+    """
+    txt 를 "## " 제목 경계에서 page_chars 근처 크기로 자른다.
+    제목 하나 아래 내용이 너무 길면 줄 경계에서 자른다.
+    """
+    blocks: List[str] = []
+    for block in re.split(r"\n(?=## )", text):
+        if len(block) <= page_chars:
+            blocks.append(block)
+            continue
+        lines: List[str] = []
+        for line in block.split("\n"):
+            if lines and sum(len(l) + 1 for l in lines) + len(line) > page_chars:
+                blocks.append("\n".join(lines))
+                lines = []
+            lines.append(line)
+        if lines:
+            blocks.append("\n".join(lines))
+
+    pages: List[str] = []
+    buffer: List[str] = []
+    for block in blocks:
+        if buffer and sum(len(b) + 1 for b in buffer) + len(block) > page_chars:
+            pages.append("\n".join(buffer))
+            buffer = []
+        buffer.append(block)
+    if buffer:
+        pages.append("\n".join(buffer))
+    return [p for p in pages if p.strip()]
+
+
+def read_pages(path: str) -> List[str]:
+    """
+    문서 하나를 페이지 텍스트 목록으로 읽는다. (PDF 는 실제 페이지, txt 는 글자 수 기준)
+    """
+    if path.lower().endswith(".pdf"):
+        if PdfReader is None:
+            raise RuntimeError("PDF 입력에는 pypdf 가 필요합니다. (pip install pypdf)")
+        return [page.extract_text() or "" for page in PdfReader(path).pages]
+    with open(path, "r", encoding="utf-8") as f:
+        return _split_text_pages(f.read())
+
+
+@dataclass
+class ExtractionJob:
+    source: str      # 문서 파일 이름
+    first_page: int  # 1부터
+    last_page: int
+    text: str
+
+    @property
+    def job_id(self) -> str:
+        stem = os.path.splitext(self.source)[0]
+        return f"{stem}.p{self.first_page:04d}-{self.last_page:04d}"
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha1(self.text.encode("utf-8")).hexdigest()
+
+
+def plan_jobs(path: str, pages_per_job: int = EXTRACT_PAGES_PER_JOB) -> List[ExtractionJob]:
+    pages = read_pages(path)
+    source = os.path.basename(path)
+    jobs: List[ExtractionJob] = []
+    for start in range(0, len(pages), pages_per_job):
+        chunk = pages[start : start + pages_per_job]
+        if not any(p.strip() for p in chunk):
+            continue
+        jobs.append(
+            ExtractionJob(
+                source=source,
+                first_page=start + 1,
+                last_page=start + len(chunk),
+                text="\n\n".join(chunk),
+            )
+        )
+    return jobs
+
+
+def discover_documents(source_dir: str) -> Dict[str, List[str]]:
+    """
+    source_dir 아래 txt/pdf 를 상품별로 묶는다. {product_key: [경로, ...]}
+    (상품요약서와 사업방법서는 text_index.product_key 가 같으므로 한 상품으로 합쳐진다)
+    """
+    groups: Dict[str, List[str]] = {}
+    for pattern in ("*.txt", "*.pdf"):
+        for path in glob.glob(os.path.join(source_dir, "**", pattern), recursive=True):
+            groups.setdefault(product_key(path), []).append(path)
+    return {key: sorted(paths) for key, paths in sorted(groups.items())}
+
+
+def output_name(paths: List[str]) -> str:
+    """
+    결과 JSON 파일 이름. sample_docs/jsons 와 같이 상품요약서 파일 이름을 따른다.
+    """
+    names = [os.path.basename(p) for p in paths]
+    name = next((n for n in names if n.startswith("상품요약서")), names[0])
+    return os.path.splitext(name)[0] + ".json"
+
+
+# -----------------------------
+# LLM 백엔드
+# -----------------------------
+
+class ExtractionBackend(Protocol):
+    """
+    문서 일부 → 부분 추출 결과 (EXTRACTION_SYSTEM_PROMPT 형식의 dict).
+    name 은 체크포인트에 기록해서, 다른 백엔드의 결과를 이어 쓰지 않도록 한다.
+    """
+    name: str
+
+    def extract(self, text: str) -> Dict[str, Any]: ...
+
+
+class OpenAIExtractionBackend:
+    def __init__(self, model: str = EXTRACT_MODEL) -> None:
+        from config import client
+
+        self._client = client
+        self.model = model
+        self.name = f"openai-{model}"
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        completion = self._client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+                {"role": "user", "content": text},
+            ],
+            temperature=0,
+            response_format={"type": "json_object"},
+        )
+        # 파싱 실패(ValueError)는 재시도 대상이다.
+        return json.loads(completion.choices[0].message.content or "")
+
+
+class StubExtractionBackend:
+    """
+    네트워크 없이 동작하는 규칙 기반 추출기. (오프라인 실행/파이프라인 점검용)
+    - 『상품명』 (없으면 보험종류 표의 "| 주 계 약 | 상품명 |" 행) → 주계약,
+      "## [n] ...특약(...)" 제목 → 특약 만 뽑는다.
+    - failure_rate 를 주면 그 비율로 일시 오류를 흉내 낸다. (재시도/재개 점검용)
+    """
+
+    _MAIN_RE = re.compile(r"『([^』]+)』")
+    _MAIN_ROW_RE = re.compile(r"^\|\s*주\s*계\s*약\s*\|\s*([^|]+?)\s*\|", re.MULTILINE)
+    _RIDER_RE = re.compile(r"^## \[\d+\]\s*(.+?특약(?:\s*\([^()]*\))*)", re.MULTILINE)
+
+    def __init__(self, failure_rate: float = 0.0, seed: int = 0) -> None:
+        self.name = "stub"
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        with self._lock:
+            fail = self._random.random() < self.failure_rate
+        if fail:
+            raise RuntimeError("stub: 일시 오류")
+
+        mains = self._MAIN_RE.findall(text) or self._MAIN_ROW_RE.findall(text)
+        coverages = [{"name": _SPACES_RE.sub(" ", name), "type": "MAIN"} for name in mains[:1]]
+        coverages += [
+            {"name": _SPACES_RE.sub(" ", name).replace("( ", "(").replace(" )", ")"), "type": "RIDER"}
+            for name in self._RIDER_RE.findall(text)
+        ]
+        return {"coverages": coverages}
+
+
+_BACKENDS: Dict[str, Callable[[], ExtractionBackend]] = {
+    "openai": OpenAIExtractionBackend,
+    "stub": StubExtractionBackend,
+}
+
+
+def get_backend(backend: str = EXTRACT_BACKEND) -> ExtractionBackend:
+    """
+    설정된 추출 백엔드를 만든다. "패키지.모듈:팩토리" 형식이면 그 팩토리를 호출한다.
+    """
+    if backend in _BACKENDS:
+        return _BACKENDS[backend]()
+    module_name, _, factory_name = backend.partition(":")
+    if not factory_name:
+        raise ValueError(f"알 수 없는 추출 백엔드입니다: {backend}")
+    return getattr(importlib.import_module(module_name), factory_name)()
+
+
+# -----------------------------
+# 요청 수 제한 / 재시도
+# -----------------------------
+
+class RateLimiter:
+    """
+    요청 시작 간격을 60 / per_minute 초 이상으로 벌린다. (여러 스레드가 공유)
+    """
+
+    def __init__(self, per_minute: float = EXTRACT_REQUESTS_PER_MINUTE) -> None:
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _retry_after(error: Exception) -> float | None:
+    # openai.RateLimitError 등은 응답 헤더에 기다릴 시간을 알려준다.
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_with_retries(
+    backend: ExtractionBackend,
+    job: ExtractionJob,
+    limiter: RateLimiter,
+    max_retries: int = EXTRACT_MAX_RETRIES,
+    base_delay: float = EXTRACT_RETRY_BASE_DELAY,
+) -> Dict[str, Any]:
+    """
+    실패하면 지수 백오프(+지터)로 max_retries 번까지 다시 시도한다.
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            result = backend.extract(job.text)
+            if not isinstance(result, dict):
+                raise ValueError("추출 결과가 JSON 객체가 아닙니다")
+            return result
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = _retry_after(e) or base_delay * (2 ** attempt) * (0.5 + random.random())
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+# -----------------------------
+# 체크포인트
+# -----------------------------
+
+class CheckpointStore:
+    """
+    작업 결과를 job 하나당 파일 하나로 저장한다. (임시 파일 → 이름 바꾸기)
+    입력 텍스트 해시와 백엔드 이름이 같을 때만 재사용한다.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def _path(self, job: ExtractionJob) -> str:
+        return os.path.join(self.directory, job.job_id + ".json")
+
+    def load(self, job: ExtractionJob, backend_name: str) -> Dict[str, Any] | None:
+        try:
+            with open(self._path(job), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if saved.get("digest") != job.digest or saved.get("backend") != backend_name:
+            return None
+        return saved.get("result")
+
+    def save(self, job: ExtractionJob, backend_name: str, result: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(job)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"digest": job.digest, "backend": backend_name, "result": result},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, path)
+
+
+# -----------------------------
+# 병합 / 검증
+# -----------------------------
+
+def _clean(value: Any) -> Any:
+    if isinstance(value, str):
+        return _SPACES_RE.sub(" ", value).strip()
+    return value
+
+
+def _compact(text: str) -> str:
+    return _NON_WORD_RE.sub("", text or "").lower()
+
+
+def _normalize_item(key: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    item = {k: _clean(v) for k, v in item.items()}
+    for field in _ID_FIELDS[key]:
+        item.setdefault(field, "")
+    for field in _DEDUPE_FIELDS[key]:
+        item.setdefault(field, "")
+    for field in ("type", "coverage_type"):
+        if isinstance(item.get(field), str):
+            item[field] = item[field].upper()
+    return item
+
+
+def merge_extractions(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    job 별 부분 결과를 상품 하나의 JSON 으로 합친다.
+    - 리스트 항목은 _DEDUPE_FIELDS 기준으로 중복 제거 (먼저 나온 것 유지)
+    - 메타 텍스트는 서로 다른 문단을 이어 붙인다.
+    - 지급사유/제한사항의 coverage_name 은 공백/문장부호만 다른 Coverage 이름으로 맞춘다.
+    """
+    merged: Dict[str, Any] = {key: [] for key in LIST_KEYS}
+    seen: Dict[str, set] = {key: set() for key in LIST_KEYS}
+    meta_texts: Dict[str, List[str]] = {key: [] for key in META_KEYS}
+    required = "N"
+
+    for part in parts:
+        for key in LIST_KEYS:
+            for item in part.get(key) or []:
+                if not isinstance(item, dict):
+                    continue
+                item = _normalize_item(key, item)
+                dedupe = tuple(_compact(str(item.get(f) or "")) for f in _DEDUPE_FIELDS[key])
+                if dedupe in seen[key]:
+                    continue
+                seen[key].add(dedupe)
+                merged[key].append(item)
+
+        for key in META_KEYS:
+            meta = part.get(key)
+            if not isinstance(meta, dict):
+                continue
+            text = _clean(meta.get("text") or "")
+            if text and text not in meta_texts[key]:
+                meta_texts[key].append(text)
+            if key == "required_subscription" and str(meta.get("required", "")).upper() == "Y":
+                required = "Y"
+
+    for key in META_KEYS:
+        merged[key] = {field: "" for field in _ID_FIELDS[key]}
+        if key == "required_subscription":
+            merged[key]["required"] = required
+        merged[key]["text"] = " ".join(meta_texts[key])
+
+    coverages = {_compact(c["name"]): c for c in merged["coverages"]}
+    for key in ("payable_events", "limitations"):
+        for item in merged[key]:
+            coverage = coverages.get(_compact(item["coverage_name"]))
+            if coverage is not None:
+                item["coverage_name"] = coverage["name"]
+                item["coverage_type"] = item["coverage_type"] or coverage["type"]
+    return merged
+
+
+def validate_extraction(data: Dict[str, Any]) -> Tuple[Dict[str, Any] | None, List[str], List[str]]:
+    """
+    합친 결과를 product_schema 로 검증/정규화한다.
+    - 반환값: (적재용 JSON 또는 None, 오류 목록, 경고 목록)
+    """
+    try:
+        record = normalize_product(data)
+    except ProductValidationError as e:
+        return None, e.errors, []
+    return record.to_dict(), [], record.warnings
+
+
+# -----------------------------
+# 실행
+# -----------------------------
+
+def run_extraction(
+    source_dir: str = SOURCE_DIR,
+    out_dir: str = OUT_DIR,
+    checkpoint_dir: str = CHECKPOINT_DIR,
+    backend: ExtractionBackend | None = None,
+    workers: int = EXTRACT_WORKERS,
+    per_minute: float = EXTRACT_REQUESTS_PER_MINUTE,
+    pages_per_job: int = EXTRACT_PAGES_PER_JOB,
+    max_retries: int = EXTRACT_MAX_RETRIES,
+    retry_base_delay: float = EXTRACT_RETRY_BASE_DELAY,
+) -> List[Dict[str, Any]]:
+    """
+    source_dir 의 문서를 상품별로 추출해서 out_dir 에 JSON 으로 쓴다.
+    모든 상품의 작업을 하나의 스레드 풀에서 돌리고, 끝난 작업은 바로 체크포인트에 남긴다.
+    - 반환값: 상품별 리포트 [{output, jobs, reused, failed, errors, warnings, seconds}, ...]
+    """
+    t0 = time.perf_counter()
+    backend = backend or get_backend()
+    limiter = RateLimiter(per_minute)
+
+    groups = discover_documents(source_dir)
+    plans: Dict[str, Tuple[CheckpointStore, List[ExtractionJob]]] = {}
+    for key, paths in groups.items():
+        jobs = [job for path in paths for job in plan_jobs(path, pages_per_job)]
+        plans[key] = (CheckpointStore(os.path.join(checkpoint_dir, key)), jobs)
+
+    results: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    failures: Dict[str, List[str]] = {key: [] for key in plans}
+    reused: Dict[str, int] = {key: 0 for key in plans}
+    pending: List[Tuple[str, ExtractionJob]] = []
+    for key, (store, jobs) in plans.items():
+        for job in jobs:
+            saved = store.load(job, backend.name)
+            if saved is not None:
+                results[(key, job.job_id)] = saved
+                reused[key] += 1
+            else:
+                pending.append((key, job))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {
+            executor.submit(extract_with_retries, backend, job, limiter, max_retries, retry_base_delay): (key, job)
+            for key, job in pending
+        }
+        for future in as_completed(futures):
+            key, job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures[key].append(f"{job.job_id}: {e}")
+                continue
+            plans[key][0].save(job, backend.name, result)
+            results[(key, job.job_id)] = result
+    finally:
+        # Ctrl+C 등으로 빠져나갈 때는 아직 시작하지 않은 작업을 버린다. (끝난 작업은 체크포인트에 있음)
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    reports: List[Dict[str, Any]] = []
+    for key, (store, jobs) in plans.items():
+        report: Dict[str, Any] = {
+            "output": None,
+            "jobs": len(jobs),
+            "reused": reused[key],
+            "failed": failures[key],
+            "errors": [],
+            "warnings": [],
+        }
+        reports.append(report)
+        if failures[key]:
+            continue
+
+        merged = merge_extractions([results[(key, job.job_id)] for job in jobs])
+        normalized, report["errors"], report["warnings"] = validate_extraction(merged)
+        # 검증에 실패한 결과는 적재 디렉토리 대신 체크포인트 옆에 남겨서 손으로 고칠 수 있게 한다.
+        target_dir = store.directory if report["errors"] else out_dir
+        name = output_name(groups[key])
+        if report["errors"]:
+            name = name[: -len(".json")] + ".invalid.json"
+        os.makedirs(target_dir, exist_ok=True)
+        path = os.path.join(target_dir, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(normalized or merged, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        report["output"] = path
+
+    seconds = time.perf_counter() - t0
+    for report in reports:
+        report["seconds"] = seconds
+    return reports
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="상품 문서(PDF/txt) → 그래프 적재용 JSON")
+    parser.add_argument("--source-dir", default=SOURCE_DIR, help="입력 문서 디렉토리 (txt, pdf)")
+    parser.add_argument("--out-dir", default=OUT_DIR, help="결과 JSON 디렉토리 (json2graph --dir 로 적재)")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="작업별 체크포인트 디렉토리")
+    parser.add_argument("--backend", default=EXTRACT_BACKEND, help="openai / stub / 패키지.모듈:팩토리")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="동시에 보낼 요청 수")
+    parser.add_argument("--rpm", type=float, default=EXTRACT_REQUESTS_PER_MINUTE, help="분당 최대 요청 수")
+    parser.add_argument("--pages-per-job", type=int, default=EXTRACT_PAGES_PER_JOB, help="작업 하나의 페이지 수")
+    parser.add_argument("--fresh", action="store_true", help="체크포인트를 지우고 처음부터")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if args.fresh:
+        shutil.rmtree(args.checkpoint_dir, ignore_errors=True)
+
+    reports = run_extraction(
+        source_dir=args.source_dir,
+        out_dir=args.out_dir,
+        checkpoint_dir=args.checkpoint_dir,
+        backend=get_backend(args.backend),
+        workers=args.workers,
+        per_minute=args.rpm,
+        pages_per_job=args.pages_per_job,
+    )
+    for report in reports:
+        if report["failed"]:
+            print(f"⚠️  미완료: 작업 {len(report['failed'])}/{report['jobs']}개 실패 (다시 실행하면 이어서 진행)")
+            for line in report["failed"]:
+                print(f"  - {line}")
+        elif report["errors"]:
+            print(f"⚠️  검증 실패: {report['output']}")
+            for line in report["errors"]:
+                print(f"  - {line}")
+        else:
+            print(f"✅ {report['output']} (작업 {report['jobs']}개, 체크포인트 재사용 {report['reused']}개)")
+            for line in report["warnings"]:
+                print(f"  - {line}")
+    if reports:
+        print(f"{reports[0]['seconds']:.2f}s")
@@ -0,0 +1,484 @@
+# product_schema.py
+"""
+상품 JSON → 검증/정규화된 레코드 → 적재용 JSON.
+
+json2graph 의 로더들은 data["coverages"] 등을 그대로 UNWIND 하므로,
+형식이 틀린 입력은 적재 도중에 실패하거나 (_load_payable_events 의 MATCH 처럼) 조용히 빠진다.
+적재 전에 여기서 한 번에 걸러낸다.
+
+- 문자열은 앞뒤 공백 제거, 나이는 정수로 ("만 15세" → 15)
+- 지급사유/제한사항의 coverage_name / coverage_type 이 실제 Coverage 를 가리키는지 확인
+  (공백/문장부호만 다른 이름은 Coverage 이름으로 맞춘다.
+   못 찾은 지급사유는 적재해도 MATCH 에서 빠지므로 경고와 함께 제외한다. strict=True 면 오류)
+- MERGE 키가 같은 중복 항목은 제거 (먼저 나온 것 유지)
+- 메타 섹션이 없으면 빈 텍스트로 채운다.
+
+python product_schema.py sample_docs/jsons → normalized/products.jsonl
+(json2graph --normalized 로 검증 없이 바로 적재)
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Tuple
+
+NORMALIZED_PATH = "./normalized/products.jsonl"
+
+COVERAGE_TYPES = ("MAIN", "RIDER")
+META_KEYS = [
+    "required_subscription",
+    "dividend_info",
+    "premium_info",
+    "premium_discount",
+    "prepayment_info",
+]
+
+_DIGITS_RE = re.compile(r"\d+")
+_NON_WORD_RE = re.compile(r"[^\w]")
+
+
+class ProductValidationError(ValueError):
+    """
+    적재할 수 없는 상품 JSON. errors 에 문제 목록이 있다.
+    """
+
+    def __init__(self, errors: List[str], source: str = "") -> None:
+        self.errors = errors
+        self.source = source
+        head = f"{source}: " if source else ""
+        super().__init__(head + "; ".join(errors[:5]) + (f" 외 {len(errors) - 5}건" if len(errors) > 5 else ""))
+
+
+# -----------------------------
+# 레코드
+# -----------------------------
+
+@dataclass(slots=True)
+class CoverageRecord:
+    name: str
+    type: str
+    coverage_id: str = ""
+
+
+@dataclass(slots=True)
+class PayableEventRecord:
+    coverage_name: str
+    coverage_type: str
+    category: str
+    reason: str
+    amount: str
+    event_id: str = ""
+    coverage_id: str = ""
+
+
+@dataclass(slots=True)
+class LimitationRecord:
+    coverage_name: str   # 상품 전체 공통이면 ""
+    coverage_type: str
+    category: str
+    text: str
+    limit_id: str = ""
+    coverage_id: str = ""
+
+
+@dataclass(slots=True)
+class QualificationRecord:
+    type1: str
+    type2: str
+    insurance_period: str
+    payment_period: str
+    age_male_min: int | None
+    age_male_max: int | None
+    age_female_min: int | None
+    age_female_max: int | None
+    payment_cycle: str
+    qualification_id: str = ""
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    coverages: List[CoverageRecord]
+    payable_events: List[PayableEventRecord]
+    limitations: List[LimitationRecord]
+    qualifications: List[QualificationRecord]
+    metas: Dict[str, Dict[str, str]]
+    product_id: str = ""
+    source: str = ""
+    # 정규화하면서 버린 중복 항목 수 (섹션별)
+    dropped: Dict[str, int] = field(default_factory=dict)
+    # 적재는 가능하지만 알려야 하는 문제 (없는 보장을 가리키는 항목 등)
+    warnings: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        json2graph.load_product_structured / _build_batch 가 읽는 형식
+        """
+        data: Dict[str, Any] = {
+            "coverages": [
+                {"coverage_id": c.coverage_id, "name": c.name, "type": c.type}
+                for c in self.coverages
+            ],
+            "payable_events": [
+                {
+                    "event_id": e.event_id,
+                    "coverage_id": e.coverage_id,
+                    "coverage_name": e.coverage_name,
+                    "coverage_type": e.coverage_type,
+                    "category": e.category,
+                    "reason": e.reason,
+                    "amount": e.amount,
+                }
+                for e in self.payable_events
+            ],
+            "limitations": [
+                {
+                    "limit_id": l.limit_id,
+                    "coverage_id": l.coverage_id,
+                    "coverage_name": l.coverage_name,
+                    "coverage_type": l.coverage_type,
+                    "category": l.category,
+                    "text": l.text,
+                }
+                for l in self.limitations
+            ],
+            "qualifications": [
+                {
+                    "qualification_id": q.qualification_id,
+                    "type1": q.type1,
+                    "type2": q.type2,
+                    "insurance_period": q.insurance_period,
+                    "payment_period": q.payment_period,
+                    "age_male_min": q.age_male_min,
+                    "age_male_max": q.age_male_max,
+                    "age_female_min": q.age_female_min,
+                    "age_female_max": q.age_female_max,
+                    "payment_cycle": q.payment_cycle,
+                }
+                for q in self.qualifications
+            ],
+            **{key: dict(self.metas[key]) for key in META_KEYS},
+        }
+        if self.product_id:
+            data["product_id"] = self.product_id
+        return data
+
+
+# -----------------------------
+# 정규화
+# -----------------------------
+
+def _str(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value.strip()
+    return str(value).strip()
+
+
+def _age(value: Any) -> int | None:
+    if value is None or value == "":
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    match = _DIGITS_RE.search(str(value))
+    if match is None:
+        raise ValueError(value)
+    return int(match.group())
+
+
+def _compact(text: str) -> str:
+    return _NON_WORD_RE.sub("", text).lower()
+
+
+def _items(data: Dict[str, Any], key: str, errors: List[str]) -> List[Dict[str, Any]]:
+    value = data.get(key)
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        errors.append(f"{key}: 리스트가 아닙니다 ({type(value).__name__})")
+        return []
+    items = [item for item in value if isinstance(item, dict)]
+    if len(items) != len(value):
+        errors.append(f"{key}: 객체가 아닌 항목 {len(value) - len(items)}개")
+    return items
+
+
+def normalize_product(data: Any, source: str = "", strict: bool = False) -> ProductRecord:
+    """
+    상품 JSON 하나를 검증/정규화한다. 적재할 수 없으면 ProductValidationError.
+    - source: 오류 메시지에 붙일 파일 이름
+    - strict: 없는 보장을 가리키는 지급사유/제한사항도 오류로 본다. (기본은 경고)
+    """
+    if not isinstance(data, dict):
+        raise ProductValidationError([f"최상위가 객체가 아닙니다 ({type(data).__name__})"], source)
+
+    errors: List[str] = []
+    warnings: List[str] = []
+    dropped: Dict[str, int] = {}
+
+    def drop(section: str) -> None:
+        dropped[section] = dropped.get(section, 0) + 1
+
+    # Coverage: (name, type) 이 MERGE 키
+    coverages: List[CoverageRecord] = []
+    coverage_keys: set = set()
+    by_compact: Dict[str, List[CoverageRecord]] = {}
+    for i, item in enumerate(_items(data, "coverages", errors)):
+        name = _str(item.get("name"))
+        ctype = _str(item.get("type")).upper()
+        if not name:
+            errors.append(f"coverages[{i}]: name 이 비었습니다")
+            continue
+        if ctype not in COVERAGE_TYPES:
+            errors.append(f"coverages[{i}]: {name} 의 type 이 MAIN/RIDER 가 아닙니다 ({item.get('type')!r})")
+            continue
+        if (name, ctype) in coverage_keys:
+            drop("coverages")
+            continue
+        record = CoverageRecord(name=name, type=ctype, coverage_id=_str(item.get("coverage_id")))
+        coverage_keys.add((name, ctype))
+        by_compact.setdefault(_compact(name), []).append(record)
+        coverages.append(record)
+    if coverages and not any(c.type == "MAIN" for c in coverages):
+        errors.append("coverages: 주계약(MAIN)이 없습니다")
+
+    def resolve(section: str, i: int, name: str, ctype: str, required: bool) -> Tuple[str, str] | None:
+        """
+        coverage_name / coverage_type 을 실제 Coverage 로 맞춘다. 못 찾으면 None.
+        """
+        if (name, ctype) in coverage_keys:
+            return name, ctype
+        candidates = by_compact.get(_compact(name), [])
+        if ctype:
+            candidates = [c for c in candidates if c.type == ctype]
+        if len(candidates) == 1:
+            return candidates[0].name, candidates[0].type
+        if not name and not required:
+            return "", ctype
+        reason = "여러 보장과 겹칩니다" if candidates else "없는 보장을 가리킵니다"
+        message = f"{section}[{i}]: {reason} ({name!r}, {ctype!r})"
+        if strict:
+            errors.append(message)
+        elif required:
+            warnings.append(message + " → 제외")
+        else:
+            # 제한사항은 보장 없이도 적재된다. (HAS_LIMITATION 관계만 생기지 않음)
+            warnings.append(message + " → 보장 연결 없이 적재")
+            return name, ctype
+        return None
+
+    # PayableEvent: (coverage_name, category, reason) 이 MERGE 키
+    events: List[PayableEventRecord] = []
+    event_keys: set = set()
+    for i, item in enumerate(_items(data, "payable_events", errors)):
+        resolved = resolve(
+            "payable_events", i,
+            _str(item.get("coverage_name")), _str(item.get("coverage_type")).upper(), True,
+        )
+        reason = _str(item.get("reason"))
+        if not reason:
+            errors.append(f"payable_events[{i}]: reason 이 비었습니다")
+        if resolved is None or not reason:
+            continue
+        category = _str(item.get("category"))
+        key = (resolved[0], category, reason)
+        if key in event_keys:
+            drop("payable_events")
+            continue
+        event_keys.add(key)
+        events.append(
+            PayableEventRecord(
+                coverage_name=resolved[0],
+                coverage_type=resolved[1],
+                category=category,
+                reason=reason,
+                amount=_str(item.get("amount")),
+                event_id=_str(item.get("event_id")),
+                coverage_id=_str(item.get("coverage_id")),
+            )
+        )
+
+    # Limitation: coverage_name 이 비어 있으면 상품 전체 공통
+    limitations: List[LimitationRecord] = []
+    limitation_keys: set = set()
+    for i, item in enumerate(_items(data, "limitations", errors)):
+        resolved = resolve(
+            "limitations", i,
+            _str(item.get("coverage_name")), _str(item.get("coverage_type")).upper(), False,
+        )
+        text = _str(item.get("text"))
+        if not text:
+            errors.append(f"limitations[{i}]: text 가 비었습니다")
+        if resolved is None or not text:
+            continue
+        category = _str(item.get("category"))
+        key = (resolved[0], category, text)
+        if key in limitation_keys:
+            drop("limitations")
+            continue
+        limitation_keys.add(key)
+        limitations.append(
+            LimitationRecord(
+                coverage_name=resolved[0],
+                coverage_type=resolved[1],
+                category=category,
+                text=text,
+                limit_id=_str(item.get("limit_id")),
+                coverage_id=_str(item.get("coverage_id")),
+            )
+        )
+
+    # Qualification: (type1, type2, insurance_period, payment_period) 가 MERGE 키
+    qualifications: List[QualificationRecord] = []
+    qualification_keys: set = set()
+    for i, item in enumerate(_items(data, "qualifications", errors)):
+        try:
+            ages = [_age(item.get(f)) for f in ("age_male_min", "age_male_max", "age_female_min", "age_female_max")]
+        except ValueError as e:
+            errors.append(f"qualifications[{i}]: 나이가 숫자가 아닙니다 ({e})")
+            continue
+        if (ages[0] is not None and ages[1] is not None and ages[0] > ages[1]) or (
+            ages[2] is not None and ages[3] is not None and ages[2] > ages[3]
+        ):
+            errors.append(f"qualifications[{i}]: 최소 나이가 최대 나이보다 큽니다")
+            continue
+        record = QualificationRecord(
+            _str(item.get("type1")),
+            _str(item.get("type2")),
+            _str(item.get("insurance_period")),
+            _str(item.get("payment_period")),
+            *ages,
+            payment_cycle=_str(item.get("payment_cycle")),
+            qualification_id=_str(item.get("qualification_id")),
+        )
+        key = (record.type1, record.type2, record.insurance_period, record.payment_period)
+        if key in qualification_keys:
+            drop("qualifications")
+            continue
+        qualification_keys.add(key)
+        qualifications.append(record)
+
+    # 메타 노드: 상품당 하나, 없으면 빈 텍스트
+    metas: Dict[str, Dict[str, str]] = {}
+    for key in META_KEYS:
+        value = data.get(key)
+        if value is None:
+            value = {}
+        if not isinstance(value, dict):
+            errors.append(f"{key}: 객체가 아닙니다 ({type(value).__name__})")
+            continue
+        metas[key] = {k: _str(v) for k, v in value.items()}
+        metas[key].setdefault("text", "")
+    metas.setdefault("required_subscription", {}).setdefault("required", "")
+
+    if errors:
+        raise ProductValidationError(errors, source)
+    return ProductRecord(
+        coverages=coverages,
+        payable_events=events,
+        limitations=limitations,
+        qualifications=qualifications,
+        metas=metas,
+        product_id=_str(data.get("product_id")),
+        source=source,
+        dropped=dropped,
+        warnings=warnings,
+    )
+
+
+def validation_errors(data: Any, strict: bool = False) -> List[str]:
+    """
+    문제 목록만 돌려준다. (없으면 빈 리스트)
+    """
+    try:
+        normalize_product(data, strict=strict)
+    except ProductValidationError as e:
+        return e.errors
+    return []
+
+
+# -----------------------------
+# 정규화 산출물 (JSONL)
+# -----------------------------
+
+def write_normalized(products: Iterable[Tuple[str, ProductRecord]], path: str = NORMALIZED_PATH) -> int:
+    """
+    [(product_id, ProductRecord), ...] → 한 줄에 상품 하나인 JSONL. (임시 파일 → 이름 바꾸기)
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for product_id, record in products:
+            row = {"product_id": product_id, "source": record.source, "data": record.to_dict()}
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_normalized(
+    path: str = NORMALIZED_PATH,
+    sources: Dict[str, str] | None = None,
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    write_normalized 결과 → [(product_id, data), ...] (json2graph.load_products_bulk 입력 형식)
+    - sources: 주면 {원본 파일 이름: product_id} 를 채운다. (원문 인덱스 매칭용)
+    """
+    products = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                products.append((row["product_id"], row["data"]))
+                if sources is not None and row.get("source"):
+                    sources[row["source"]] = row["product_id"]
+    return products
+
+
+# ==============================
+# 엔트리포인트: 디렉토리 검증 + 정규화 산출물 쓰기
+# ==============================
+
+if __name__ == "__main__":
+    from json2graph import derive_product_id
+
+    parser = argparse.ArgumentParser(description="상품 JSON 검증/정규화")
+    parser.add_argument("dir", help="상품 JSON 디렉토리")
+    parser.add_argument("--out", default=NORMALIZED_PATH, help="정규화 결과 JSONL")
+    parser.add_argument("--strict", action="store_true", help="없는 보장을 가리키는 항목도 오류로 처리")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    valid: List[Tuple[str, ProductRecord]] = []
+    paths = sorted(glob.glob(os.path.join(args.dir, "*.json")))
+    for path in paths:
+        name = os.path.basename(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            record = normalize_product(data, name, strict=args.strict)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️  {name}: 읽을 수 없음 ({e})")
+            continue
+        except ProductValidationError as e:
+            print(f"⚠️  {name}: 오류 {len(e.errors)}건")
+            for line in e.errors:
+                print(f"  - {line}")
+            continue
+        for line in record.warnings:
+            print(f"  {name}: {line}")
+        if record.dropped:
+            print(f"  {name}: 중복 제거 {record.dropped}")
+        valid.append((derive_product_id(path, data), record))
+
+    count = write_normalized(valid, args.out)
+    elapsed = time.perf_counter() - t0
+    print(f"✅ {count}/{len(paths)}개 정규화 → {args.out} ({elapsed:.3f}s)")
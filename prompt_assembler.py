@@ -0,0 +1,405 @@
+# prompt_assembler.py
+
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Tuple
+
+from qa_cache import normalize_question
+from tracing import record_llm_usage
+
+try:
+    import tiktoken
+except ImportError:  # 선택 의존성: 없으면 근사치로 센다
+    tiktoken = None
+
+# -----------------------------
+# 프롬프트 토큰 예산
+# -----------------------------
+# 모델별로 한 요청(system + user 메시지)에 쓸 토큰 상한. "모델=토큰,모델=토큰" 형식.
+PROMPT_TOKEN_BUDGETS: Dict[str, int] = {
+    name.strip(): int(value)
+    for name, value in (
+        item.split("=", 1)
+        for item in os.getenv("PROMPT_TOKEN_BUDGETS", "gpt-4o=8000,gpt-4o-mini=6000").split(",")
+        if "=" in item
+    )
+}
+PROMPT_TOKEN_BUDGET_DEFAULT = int(os.getenv("PROMPT_TOKEN_BUDGET_DEFAULT", "6000"))
+# 답변 프롬프트에서 남은 예산 중 쿼리 결과 rows 에 먼저 떼어줄 비율 (나머지는 그래프 컨텍스트)
+ANSWER_ROWS_SHARE = float(os.getenv("ANSWER_ROWS_SHARE", "0.6"))
+
+# 메시지 하나당 붙는 역할/구분자 토큰 (chat 포맷 오버헤드 근사치)
+_MESSAGE_OVERHEAD = 4
+_HANGUL_RE = re.compile(r"[가-힣]")
+_SECTION_HEADER_RE = re.compile(r"^=== .+ ===$")
+_NON_WORD_RE = re.compile(r"[^\w]")
+# 윗 행과 같은 값
+_DITTO = "〃"
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # BPE 파일을 받을 수 없는(오프라인) 환경이면 근사치로 센다.
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    로컬에서 세는 토큰 수.
+    tiktoken 이 설치돼 있으면 모델 토크나이저로, 아니면 근사치
+    (한글은 글자당 1토큰, 나머지는 4글자당 1토큰) 로 센다.
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    hangul = len(_HANGUL_RE.findall(text))
+    return hangul + (len(text) - hangul + 3) // 4
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = "gpt-4o") -> int:
+    return sum(count_tokens(m["content"], model) + _MESSAGE_OVERHEAD for m in messages)
+
+
+def model_budget(model: str) -> int:
+    return PROMPT_TOKEN_BUDGETS.get(model, PROMPT_TOKEN_BUDGET_DEFAULT)
+
+
+@dataclass
+class PromptUsage:
+    """
+    LLM 요청 하나의 토큰 사용량. (로컬 계산값 + API 가 돌려준 실제값)
+    """
+    stage: str                      # "cypher" / "answer"
+    model: str
+    budget: int
+    prompt_tokens: int = 0          # 로컬에서 센 전체 메시지 토큰
+    context_tokens: int = 0
+    rows_tokens: int = 0
+    context_items: Tuple[int, int] = (0, 0)  # (넣은 항목 수, 전체 항목 수)
+    rows_kept: Tuple[int, int] = (0, 0)      # (넣은 행 수, 읽은 행 수)
+    evidence_tokens: int = 0
+    evidence_kept: Tuple[int, int] = (0, 0)  # (넣은 원문 passage 수, 검색된 수)
+    api_prompt_tokens: int | None = None
+    api_completion_tokens: int | None = None
+
+    def record_api_usage(self, usage: Any) -> None:
+        if usage is None:
+            return
+        record_llm_usage(usage)
+        self.api_prompt_tokens = getattr(usage, "prompt_tokens", None)
+        self.api_completion_tokens = getattr(usage, "completion_tokens", None)
+
+    def summary(self) -> str:
+        text = (
+            f"{self.stage}({self.model}): 프롬프트 {self.prompt_tokens}/{self.budget} 토큰 "
+            f"[컨텍스트 {self.context_tokens}, 항목 {self.context_items[0]}/{self.context_items[1]}"
+        )
+        if self.stage == "answer":
+            text += f" | 결과 {self.rows_tokens}, 행 {self.rows_kept[0]}/{self.rows_kept[1]}"
+            if self.evidence_kept[1]:
+                text += (
+                    f" | 원문 {self.evidence_tokens}, "
+                    f"passage {self.evidence_kept[0]}/{self.evidence_kept[1]}"
+                )
+        text += "]"
+        if self.api_prompt_tokens is not None:
+            text += f" / API 입력 {self.api_prompt_tokens}, 출력 {self.api_completion_tokens}"
+        return text
+
+
+# -----------------------------
+# 관련도
+# -----------------------------
+
+def _grams(text: str) -> FrozenSet[str]:
+    compact = _NON_WORD_RE.sub("", text).lower()
+    if len(compact) < 2:
+        return frozenset([compact]) if compact else frozenset()
+    return frozenset(compact[i : i + 2] for i in range(len(compact) - 1))
+
+
+def _relevance(question_grams: FrozenSet[str], text: str) -> float:
+    """
+    질문의 문자 bigram 중 text 에 들어 있는 비율. (text 가 길어도 불리하지 않도록 Dice 대신 포함률)
+    """
+    if not question_grams:
+        return 0.0
+    return len(question_grams & _grams(text)) / len(question_grams)
+
+
+def _pick(
+    items: List[Tuple[float, int, int]],
+    budget: int,
+) -> set:
+    """
+    (점수, 원래 순서, 토큰) 목록에서 점수가 높은 것부터 예산에 들어가는 만큼 고른다.
+    """
+    chosen = set()
+    used = 0
+    for score, index, cost in sorted(items, key=lambda x: (-x[0], x[1])):
+        if used + cost > budget:
+            continue
+        chosen.add(index)
+        used += cost
+    return chosen
+
+
+# -----------------------------
+# 그래프 컨텍스트 줄이기
+# -----------------------------
+
+def _split_sections(context: str) -> List[Tuple[str, List[str]]]:
+    """
+    "=== 헤더 ===" 로 나뉜 컨텍스트를 [(헤더, [항목, ...]), ...] 로 나눈다.
+    항목은 "- " 로 시작하는 줄과 그 뒤의 들여쓰기 줄들이다.
+    """
+    sections: List[Tuple[str, List[str]]] = []
+    header, entries = "", []
+    for line in context.split("\n"):
+        if _SECTION_HEADER_RE.match(line):
+            if header or entries:
+                sections.append((header, entries))
+            header, entries = line, []
+        elif line.startswith("- ") or not entries:
+            entries.append(line)
+        else:
+            entries[-1] += "\n" + line
+    if header or entries:
+        sections.append((header, entries))
+    return sections
+
+
+def fit_context(
+    question: str,
+    context: str,
+    budget: int,
+    model: str = "gpt-4o",
+) -> Tuple[str, int, int]:
+    """
+    그래프 컨텍스트를 토큰 예산에 맞춘다.
+    - 예산 안에 들어가면 그대로 돌려준다.
+    - 넘치면 섹션 헤더는 남기고, 항목들을 질문 관련도 순으로 골라 원래 순서대로 다시 붙인다.
+      빠진 항목 수는 섹션 끝에 표시한다.
+    - 반환값: (텍스트, 넣은 항목 수, 전체 항목 수)
+    """
+    sections = _split_sections(context)
+    total = sum(len(entries) for _, entries in sections)
+    if not context or count_tokens(context, model) <= budget:
+        return context, total, total
+
+    question_grams = _grams(normalize_question(question))
+    header_cost = sum(count_tokens(header, model) + 1 for header, _ in sections if header)
+    items: List[Tuple[float, int, int]] = []
+    flat: List[Tuple[int, str]] = []
+    for s_index, (header, entries) in enumerate(sections):
+        for entry in entries:
+            # 헤더가 질문과 맞으면(예: "Limitation") 그 섹션 항목에 가산점
+            score = _relevance(question_grams, entry) + 0.1 * _relevance(question_grams, header)
+            items.append((score, len(flat), count_tokens(entry, model) + 1))
+            flat.append((s_index, entry))
+    # 섹션마다 생략 표시 한 줄 분량을 남겨둔다.
+    chosen = _pick(items, max(0, budget - header_cost - 8 * len(sections)))
+
+    lines: List[str] = []
+    for s_index, (header, entries) in enumerate(sections):
+        if header:
+            lines.append(header)
+        kept = [entry for i, (si, entry) in enumerate(flat) if si == s_index and i in chosen]
+        lines.extend(kept)
+        if len(kept) < len(entries):
+            lines.append(f"- ... ({len(entries) - len(kept)}개 항목 생략)")
+    return "\n".join(lines), len(chosen), total
+
+
+# -----------------------------
+# 쿼리 결과 rows 압축
+# -----------------------------
+
+def _value_text(value: Any) -> str:
+    if isinstance(value, list):
+        return "[" + ", ".join(_value_text(v) for v in value) + "]"
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{k}: {_value_text(v)}" for k, v in value.items()) + "}"
+    return str(value)
+
+
+def row_budget(token_budget: int, model: str = "gpt-4o") -> Callable[[Dict[str, Any]], bool]:
+    """
+    행을 하나씩 넘겨받아 지금까지의 토큰 합이 예산에 닿으면 True 를 돌려주는 함수.
+    (graph_client.async_run_cypher 의 stop 으로 넘기면 예산을 채운 뒤로는 DB 에서 더 받지 않는다)
+    - token_budget 이 0 이면 항상 False.
+    """
+    used = 0
+
+    def full(row: Dict[str, Any]) -> bool:
+        nonlocal used
+        used += count_tokens(" | ".join(_value_text(v) for v in row.values()), model)
+        return bool(token_budget) and used >= token_budget
+
+    return full
+
+
+def take_rows(rows: Iterable[Dict[str, Any]], token_budget: int, model: str = "gpt-4o") -> List[Dict[str, Any]]:
+    """
+    rows (또는 graph_client.CypherResult 스트림) 를 예산만큼만 읽는다.
+    - 여기서 읽은 행들이 format_rows 가 관련도 순으로 고를 후보가 된다.
+    - token_budget 이 0 이면 끝까지 읽는다.
+    """
+    taken: List[Dict[str, Any]] = []
+    full = row_budget(token_budget, model)
+    for row in rows:
+        taken.append(row)
+        if full(row):
+            break
+    return taken
+
+
+def format_rows(
+    question: str,
+    rows: List[Dict[str, Any]],
+    budget: int,
+    model: str = "gpt-4o",
+) -> Tuple[str, int]:
+    """
+    쿼리 결과를 열 단위 표로 압축하고, 예산을 넘으면 질문과 관련 높은 행부터 남긴다.
+    - 모든 행에서 값이 같은 열은 "공통:" 한 줄로 뺀다.
+    - 바로 윗 행과 같은 값(반복되는 커버리지 이름 등)은 〃 로 줄인다.
+    - rows.truncated 가 True 이면(크기 제한으로 덜 읽음) 그 사실도 적는다.
+    - 반환값: (텍스트, 넣은 행 수)
+    """
+    if not rows:
+        return "그래프 쿼리 결과: 0행 (데이터 없음).", 0
+
+    columns: List[str] = list(dict.fromkeys(k for row in rows for k in row))
+    cells = [[_value_text(row.get(c)) for c in columns] for row in rows]
+
+    shared: List[str] = []
+    varying: List[int] = []
+    for ci, column in enumerate(columns):
+        values = {cell[ci] for cell in cells}
+        if len(rows) > 1 and len(values) == 1:
+            shared.append(f"{column}={cells[0][ci]}")
+        else:
+            varying.append(ci)
+
+    head: List[str] = []
+    if shared:
+        head.append("공통: " + ", ".join(shared))
+    if varying:
+        head.append("열: " + " | ".join(columns[ci] for ci in varying))
+
+    question_grams = _grams(normalize_question(question))
+    head_cost = sum(count_tokens(line, model) + 1 for line in head) + 16
+    items = [
+        (
+            _relevance(question_grams, " ".join(cells[ri][ci] for ci in varying)),
+            ri,
+            count_tokens(" | ".join(cells[ri][ci] for ci in varying), model) + 3,
+        )
+        for ri in range(len(rows))
+    ]
+    chosen = sorted(_pick(items, max(0, budget - head_cost)))
+    if not chosen:
+        chosen = [0]
+
+    lines = list(head)
+    previous: List[str] | None = None
+    dittoed = False
+    for ri in chosen:
+        values = [cells[ri][ci] for ci in varying]
+        shown = []
+        for vi, value in enumerate(values):
+            if previous is not None and previous[vi] == value and len(value) > 1:
+                shown.append(_DITTO)
+                dittoed = True
+            else:
+                shown.append(value)
+        if varying:
+            lines.append(f"{ri + 1}. " + " | ".join(shown))
+        previous = values
+
+    if dittoed:
+        lines.append(f"({_DITTO} = 윗 행과 같은 값)")
+    if len(chosen) < len(rows):
+        lines.append(f"... (읽은 {len(rows)}행 중 질문과 관련 높은 {len(chosen)}행만 포함)")
+    if getattr(rows, "truncated", False):
+        lines.append("... (쿼리 결과가 커서 앞부분만 조회함)")
+    return "\n".join(lines), len(chosen)
+
+
+class PromptAssembler:
+    """
+    LLM 요청 하나의 토큰 예산을 나눠 쓰는 도우미.
+
+        asm = PromptAssembler(question, "gpt-4o", "cypher")
+        asm.add_fixed(system_prompt, instructions)     # 줄일 수 없는 부분
+        context = asm.add_context(graph_context)       # 남은 예산 안으로 줄임
+        messages = [...]
+        usage = asm.finish(messages)
+    """
+
+    def __init__(self, question: str, model: str, stage: str, budget: int | None = None) -> None:
+        self.question = question
+        self.model = model
+        self.usage = PromptUsage(stage=stage, model=model, budget=budget or model_budget(model))
+        self._used = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.usage.budget - self._used)
+
+    def add_fixed(self, *texts: str) -> None:
+        for text in texts:
+            self._used += count_tokens(text, self.model) + 1
+        # system / user 메시지 오버헤드
+        self._used += 2 * _MESSAGE_OVERHEAD
+
+    def add_rows(self, rows: List[Dict[str, Any]], share: float = 1.0) -> str:
+        text, kept = format_rows(self.question, rows, int(self.remaining * share), self.model)
+        tokens = count_tokens(text, self.model)
+        self._used += tokens
+        self.usage.rows_tokens = tokens
+        self.usage.rows_kept = (kept, len(rows))
+        return text
+
+    def add_passages(self, passages: List[str], share: float = 1.0) -> str:
+        """
+        검색 점수 순으로 들어온 원문 passage 를 예산 안에 들어가는 만큼 넣는다.
+        """
+        budget = int(self.remaining * share)
+        kept: List[str] = []
+        used = 0
+        for i, passage in enumerate(passages, start=1):
+            block = f"[{i}] {passage}"
+            cost = count_tokens(block, self.model) + 1
+            if used + cost > budget:
+                continue
+            kept.append(block)
+            used += cost
+        self._used += used
+        self.usage.evidence_tokens = used
+        self.usage.evidence_kept = (len(kept), len(passages))
+        return "\n\n".join(kept)
+
+    def add_context(self, context: str, share: float = 1.0) -> str:
+        text, kept, total = fit_context(self.question, context, int(self.remaining * share), self.model)
+        tokens = count_tokens(text, self.model)
+        self._used += tokens
+        self.usage.context_tokens = tokens
+        self.usage.context_items = (kept, total)
+        return text
+
+    def finish(self, messages: List[Dict[str, str]]) -> PromptUsage:
+        self.usage.prompt_tokens = count_message_tokens(messages, self.model)
+        return self.usage
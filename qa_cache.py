@@ -0,0 +1,277 @@
+# qa_cache.py
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from difflib import SequenceMatcher
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+from context_cache import context_cache
+
+# -----------------------------
+# 캐시 설정
+# -----------------------------
+QA_CACHE_MAXSIZE = int(os.getenv("QA_CACHE_MAXSIZE", "1000"))
+# 문자 n-gram Dice 유사도가 이 값 이상이면 같은 질문으로 본다.
+QA_CACHE_SIMILARITY = float(os.getenv("QA_CACHE_SIMILARITY", "0.85"))
+# 최종 답변까지 캐시할지 여부 (0 이면 Cypher 까지만 재사용하고 답변은 새로 만든다)
+QA_CACHE_STORE_ANSWER = os.getenv("QA_CACHE_STORE_ANSWER", "1") == "1"
+
+# 단어 끝에서 떼어낼 조사 (긴 것부터 검사)
+_PARTICLES = sorted(
+    ["은", "는", "이", "가", "을", "를", "도", "에", "에서", "으로", "로", "의",
+     "과", "와", "랑", "이랑", "하고", "까지", "부터", "만"],
+    key=len,
+    reverse=True,
+)
+# 질문 끝에서 떼어낼 어미/요청 표현 (긴 것부터 검사)
+_ENDINGS = sorted(
+    ["되니", "되나", "되나요", "되요", "돼", "돼요", "될까", "될까요", "되는지",
+     "인가", "인가요", "인지", "이야", "야", "있어", "있어요", "있니", "있나", "있나요",
+     "알려줘", "알려줘요", "알려주세요", "해줘", "해주세요", "보여줘", "보여주세요",
+     "나요", "까요", "니", "요"],
+    key=len,
+    reverse=True,
+)
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_DIGITS_RE = re.compile(r"\d+")
+
+# 유사 질문이라도 이 글자가 다른 부분에 있으면 뜻이 달라진다. (성별 / 부정)
+_SENSITIVE_CHARS = set("남여못안불")
+_SENSITIVE_WORDS = ["제외"]
+# 상품 어휘 값에서 떼어낼 괄호 부가 표기 ("(간편)", "[기본]", "(무배당, 갱신형)" ...)
+_ANNOTATION_RE = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+
+
+def _strip_suffix(token: str, suffixes: List[str]) -> str:
+    for suffix in suffixes:
+        # 떼고 나서 최소 2글자는 남아야 한다. ("필요" → "필" 같은 과잉 제거 방지)
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            return token[: -len(suffix)]
+    return token
+
+
+def normalize_question(question: str) -> str:
+    """
+    "임플란트 보장 되니?" / "임플란트 보장돼?" → "임플란트보장"
+    - 문장부호 제거, 소문자화
+    - 마지막 어절의 어미/요청 표현 제거, 각 어절의 조사 제거
+    - 띄어쓰기는 일관되지 않으므로 공백을 모두 없앤다.
+    """
+    text = _PUNCT_RE.sub(" ", question.lower())
+    tokens = text.split()
+    if not tokens:
+        return ""
+
+    # 어미만으로 된 마지막 어절("되니", "있어")은 통째로 버린다.
+    while len(tokens) > 1 and tokens[-1] in _ENDINGS:
+        tokens.pop()
+    tokens[-1] = _strip_suffix(tokens[-1], _ENDINGS)
+    tokens = [_strip_suffix(t, _PARTICLES) for t in tokens]
+    return "".join(tokens)
+
+
+def _char_ngrams(text: str, n: int = 2) -> FrozenSet[str]:
+    if len(text) < n:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i : i + n] for i in range(len(text) - n + 1))
+
+
+def _dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def _vocabulary_terms(vocabulary: Dict[str, List[str]]) -> List[str]:
+    """
+    상품 어휘(graph_context.get_product_vocabulary 형식)를 정규화한 질문과 같은 기준으로 바꾼다.
+    - 값 전체와, 괄호 부가 표기 / 꼬리 "특약" 을 뗀 핵심 이름을 함께 쓴다.
+    """
+    terms = set()
+    for values in vocabulary.values():
+        for value in values:
+            for text in (value, _ANNOTATION_RE.sub("", value or "")):
+                term = re.sub(r"[^\w]", "", text.lower())
+                if term.endswith("특약") and len(term) > 2:
+                    term = term[: -len("특약")]
+                if term:
+                    terms.add(term)
+    return sorted(terms)
+
+
+def _same_meaning(a: str, b: str, terms: List[str]) -> bool:
+    """
+    정규화한 두 질문의 다른 부분이 뜻을 바꾸지 않는지.
+    - 다른 부분에 성별(남/여) / 부정(못/안/불/제외) 이 있으면 아니다.
+    - 다른 부분이 상품 어휘(담보명 / category / type1·type2)의 일부이거나 어휘를 포함해도 아니다.
+      ("종합병원암주요치료비" vs "상급종합병원암주요치료비": "상급" 이 담보명의 일부)
+    """
+    if any(a.count(w) != b.count(w) for w in _SENSITIVE_WORDS):
+        return False
+    opcodes = SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            continue
+        for changed in (a[i1:i2], b[j1:j2]):
+            if not changed:
+                continue
+            if _SENSITIVE_CHARS & set(changed):
+                return False
+            if any(changed in term or term in changed for term in terms):
+                return False
+    return True
+
+
+@dataclass
+class QACacheEntry:
+    question: str
+    normalized: str
+    cypher: str
+    graph_context: str
+    answer: str | None = None
+    params: Dict[str, Any] | None = None
+
+
+class QACache:
+    """
+    상품별(product_id) 질문 → (그래프 컨텍스트, Cypher, 답변) 캐시.
+
+    - 정규화한 질문이 같으면 바로 적중. (답변까지 재사용)
+    - 아니면 같은 상품의 항목들과 문자 bigram Dice 유사도를 비교해서 similarity 이상인
+      가장 가까운 항목의 Cypher / 컨텍스트만 돌려준다. (answer=None, 답변은 새로 만든다)
+      질문 속 숫자는 반드시 같아야 하고, 다른 부분에 상품 어휘 / 성별 / 부정 표현이 있으면 쓰지 않는다.
+    - 전체 항목 수는 maxsize 로 제한하고 LRU 로 내보낸다.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = QA_CACHE_MAXSIZE,
+        similarity: float = QA_CACHE_SIMILARITY,
+        store_answer: bool = QA_CACHE_STORE_ANSWER,
+    ) -> None:
+        self.maxsize = maxsize
+        self.similarity = similarity
+        self.store_answer = store_answer
+
+        # (product_id, normalized) → entry   (LRU 순서)
+        self._entries: "OrderedDict[Tuple[str, str], QACacheEntry]" = OrderedDict()
+        # product_id → {normalized: (bigram 집합, 숫자 튜플)}
+        self._index: Dict[str, Dict[str, Tuple[FrozenSet[str], Tuple[str, ...]]]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(
+        self,
+        product_id: str,
+        question: str,
+        vocabulary: Dict[str, List[str]] | None = None,
+    ) -> QACacheEntry | None:
+        """
+        - vocabulary: 상품 어휘 (graph_context.get_product_vocabulary). 없으면 유사 질문은 찾지 않는다.
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+
+        with self._lock:
+            entry = self._entries.get((product_id, normalized))
+            if entry is not None:
+                self._entries.move_to_end((product_id, normalized))
+                self.hits += 1
+                return entry
+
+            if vocabulary is not None:
+                grams = _char_ngrams(normalized)
+                digits = tuple(_DIGITS_RE.findall(normalized))
+                candidates = []
+                for key, (other_grams, other_digits) in self._index.get(product_id, {}).items():
+                    if other_digits != digits:
+                        continue
+                    score = _dice(grams, other_grams)
+                    if score >= self.similarity:
+                        candidates.append((score, key))
+
+                terms = _vocabulary_terms(vocabulary) if candidates else []
+                for _, key in sorted(candidates, reverse=True):
+                    if not _same_meaning(normalized, key, terms):
+                        continue
+                    self._entries.move_to_end((product_id, key))
+                    self.hits += 1
+                    self.fuzzy_hits += 1
+                    # 다른 질문의 답변은 그대로 돌려주지 않는다. (Cypher / 컨텍스트만 재사용)
+                    return replace(self._entries[(product_id, key)], answer=None)
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        product_id: str,
+        question: str,
+        cypher: str,
+        graph_context: str,
+        answer: str | None = None,
+        params: Dict[str, Any] | None = None,
+    ) -> None:
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+
+        entry = QACacheEntry(
+            question=question,
+            normalized=normalized,
+            cypher=cypher,
+            graph_context=graph_context,
+            answer=answer if self.store_answer else None,
+            params=params,
+        )
+        key = (product_id, normalized)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._index.setdefault(product_id, {})[normalized] = (
+                _char_ngrams(normalized),
+                tuple(_DIGITS_RE.findall(normalized)),
+            )
+            while len(self._entries) > self.maxsize:
+                (old_pid, old_norm), _ = self._entries.popitem(last=False)
+                self._index.get(old_pid, {}).pop(old_norm, None)
+                self.evictions += 1
+
+    def invalidate_product(self, product_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == product_id]:
+                del self._entries[key]
+            self._index.pop(product_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# 프로세스 전체에서 공유하는 캐시 인스턴스
+qa_cache = QACache()
+
+# 상품이 재적재되면(같은 프로세스의 invalidate 또는 버전 스탬프 변경) 질문 캐시도 같이 비운다.
+context_cache.add_invalidation_listener(qa_cache.invalidate_product)
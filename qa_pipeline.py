@@ -0,0 +1,412 @@
+# qa_pipeline.py
+
+import asyncio
+import inspect
+import queue
+import threading
+import weakref
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List
+
+from neo4j.exceptions import ClientError
+
+from config import QA_MAX_CONCURRENCY, QA_REQUEST_TIMEOUT_SEC
+from cypher_guard import CYPHER_GUARD, CYPHER_GUARD_TIMEOUT_SEC, guard_cypher_async
+from cypher_repair import CYPHER_REPAIR, repair_cypher_async
+from cypher_validator import CYPHER_VALIDATE
+from graph_client import CypherRows, async_run_cypher
+from graph_context import ensure_product_fresh, get_product_vocabulary
+from llm_answer import answer_row_budget, generate_answer_stream_async, read_rows
+from llm_cypher import (
+    generate_context_and_cypher_async,
+    generate_cypher_with_params_async,
+    learn_cypher_template,
+    regenerate_cypher_async,
+)
+from prompt_assembler import PromptUsage
+from qa_cache import qa_cache
+from text_index import TEXT_INDEX_FALLBACK_K, TEXT_INDEX_TOP_K, search_passages
+from tracing import Trace, finish_trace, record_cache, record_rows, span, trace_scope
+from vector_index import retrieve_chunk_rows
+
+
+@dataclass
+class PipelineEvent:
+    """
+    QA 파이프라인이 단계를 하나 끝낼 때마다 내보내는 이벤트.
+
+    stage 별 data:
+    - "cache_hit": 적중한 QACacheEntry
+    - "context":   그래프 컨텍스트 텍스트
+    - "guard":     실행 전 점검에서 거부된 쿼리와 사유 (cypher_guard.GuardResult).
+                   한 번 다시 만들게 하고, 그래도 거부되면 실행하지 않는다. ("cypher" 앞)
+    - "cypher":    (cypher, params) 실제로 실행하는 쿼리 (점검에서 LIMIT 을 붙였으면 붙인 쿼리)
+    - "speculation": 플래너와 동시에 미리 만든 Cypher 를 썼으면 True, 버리고 다시 만들었으면 False
+                     (LLM 플래너가 필요했던 질문에서만)
+    - "repair":    LLM 쿼리가 실행에 실패하거나 0행이라 복구를 시도한 결과 (cypher_repair.RepairResult,
+                   시도한 게 있을 때만, "rows" 앞). 고쳤으면 "rows" 는 고친 쿼리의 결과
+    - "rows":      쿼리 결과 rows (답변 단계가 읽은 만큼, 잘렸으면 rows.truncated=True)
+    - "hybrid":    Cypher 결과가 비었을 때 벡터 검색 → 그래프 확장으로 찾은 rows (찾은 게 있을 때만)
+    - "evidence":  원문 인덱스에서 찾은 passage 목록 (text_index.Passage, 찾은 게 있을 때만)
+    - "token":     답변 텍스트 조각 (도착하는 대로 여러 번)
+    - "usage":     이번 질문의 LLM 요청별 토큰 사용량 (PromptUsage 리스트)
+    - "trace":     단계별 시간 / 토큰 / 행 수 / 캐시 적중 (tracing.Trace, "answer" 바로 앞)
+    - "answer":    완성된 답변 전체
+    """
+    stage: str
+    data: Any
+
+
+# -----------------------------
+# 비동기 파이프라인
+# -----------------------------
+
+# 동시 처리 상한은 이벤트 루프마다 따로 센다. (asyncio.Semaphore 는 루프에 묶인다)
+_request_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _request_slot() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slot = _request_slots.get(loop)
+    if slot is None:
+        slot = asyncio.Semaphore(QA_MAX_CONCURRENCY)
+        _request_slots[loop] = slot
+    return slot
+
+
+async def _call(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    async 함수면 await, 동기 함수면 스레드에서 실행한다. (app.py 의 동기 콜백도 받을 수 있도록)
+    """
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+def _read_and_close(result: Any) -> List[Dict[str, Any]]:
+    # 결과 스트림(graph_client.CypherResult)은 답변 후보로 쓸 만큼만 읽고 닫는다.
+    try:
+        rows = read_rows(result)
+    finally:
+        close = getattr(result, "close", None)
+        if close is not None:
+            close()
+    return getattr(result, "rows", rows)
+
+
+def _take_rows(result: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # 이미 받아온 rows 중 답변 후보로 쓸 만큼만. 덜 쓰면 잘린 것으로 표시한다.
+    rows = read_rows(result)
+    if len(rows) == len(result):
+        return result
+    rows = CypherRows(rows)
+    rows.truncated = True
+    return rows
+
+
+async def _run_cypher_within_budget(cypher: str, params: Dict[str, Any], **kwargs: Any) -> CypherRows:
+    # 기본 execute. 답변 후보로 쓸 행 예산(read_rows 와 같은 기준)을 채우면 DB 에서 더 받지 않는다.
+    return await async_run_cypher(cypher, params, stop=answer_row_budget(), **kwargs)
+
+
+async def _execute(
+    execute: Callable[[str, Dict[str, Any]], Any],
+    cypher: str,
+    params: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    if inspect.iscoroutinefunction(execute):
+        return _take_rows(await execute(cypher, params))
+    return await asyncio.to_thread(lambda: _read_and_close(execute(cypher, params)))
+
+
+async def run_qa_async(
+    question: str,
+    product_id: str,
+    build_context: Callable[[str, str], Any] | None = None,
+    execute: Callable[[str, Dict[str, Any]], Any] | None = None,
+) -> AsyncIterator[PipelineEvent]:
+    """
+    질문 하나에 대해 컨텍스트 → Cypher → 실행 → 답변 을 순서대로 진행하면서
+    각 단계가 끝나는 즉시 PipelineEvent 를 yield 한다. (run_qa_stream 의 본체)
+
+    - build_context: (question, product_id) → 컨텍스트 텍스트. 기본은 메타데이터 플랜 기반 컨텍스트
+      (llm_cypher.generate_context_and_cypher_async: 플래너와 Cypher 생성을 겹쳐서 진행)
+    - execute: (cypher, params) → rows 또는 결과 스트림. 기본은 graph_client.async_run_cypher 로,
+      답변 행 토큰 예산(ANSWER_ROWS_TOKEN_BUDGET)을 채우면 그 뒤 레코드는 받지 않는다.
+      둘 다 동기 함수를 넘기면 스레드에서 실행한다.
+    - LLM 이 만든 쿼리는 실행 전에 스키마 기준으로 로컬 검사하고(CYPHER_VALIDATE), 기본 execute 로
+      Neo4j 에 보낼 때는(CYPHER_GUARD) EXPLAIN 으로도 점검한 뒤 서버 쪽 트랜잭션 타임아웃
+      (CYPHER_GUARD_TIMEOUT_SEC)을 걸어서 실행한다. 거부되면 사유를 붙여 한 번 다시 만든다.
+    - LLM 이 만든 쿼리가 실행에 실패하거나 0행이면(CYPHER_REPAIR) 리터럴을 상품 어휘에 맞춰 고쳐서
+      다시 실행하고, 그래도 안 되면 오류를 붙여 한 번 다시 만든다. (cypher_repair)
+    - 루프 하나에서 동시에 진행하는 질문은 QA_MAX_CONCURRENCY 개까지. (나머지는 대기)
+    - 소비하는 쪽이 멈추거나 태스크가 취소되면 진행 중인 LLM/DB 요청도 같이 취소된다.
+    - 단계별 시간은 tracing.Trace 로 모아서 "trace" 이벤트로 내보내고, 로그/지표에도 남긴다.
+    """
+    guard = CYPHER_GUARD and execute is None
+    execute = execute or _run_cypher_within_budget
+    if guard and CYPHER_GUARD_TIMEOUT_SEC:
+        execute = partial(execute, timeout=CYPHER_GUARD_TIMEOUT_SEC)
+    usage: List[PromptUsage] = []
+    trace = Trace(question, product_id)
+
+    with trace_scope(trace):
+        stages = _run_stages(question, product_id, build_context, execute, guard, usage, trace)
+        try:
+            async with _request_slot():
+                async for event in stages:
+                    yield event
+        except BaseException as e:
+            # 소비하는 쪽이 중간에 멈추거나 실패해도 열린 단계(답변 스트림 등)를 닫고 trace 를 남긴다.
+            await stages.aclose()
+            cancelled = isinstance(e, (asyncio.CancelledError, GeneratorExit))
+            finish_trace(trace, outcome="cancelled" if cancelled else "error")
+            raise
+
+
+async def _run_stages(
+    question: str,
+    product_id: str,
+    build_context: Callable[[str, str], Any] | None,
+    execute: Callable[[str, Dict[str, Any]], Any],
+    guard: bool,
+    usage: List[PromptUsage],
+    trace: Trace,
+) -> AsyncIterator[PipelineEvent]:
+    # 0단계: 같은/비슷한 질문을 이미 처리했으면 캐시된 결과를 재사용
+    with span("stage.cache"):
+        await asyncio.to_thread(ensure_product_fresh, product_id)
+        vocabulary = await asyncio.to_thread(get_product_vocabulary, product_id)
+        cached = qa_cache.lookup(product_id, question, vocabulary)
+        record_cache("qa", cached is not None)
+    if cached is not None:
+        yield PipelineEvent("cache_hit", cached)
+
+    if cached is not None and cached.answer is not None:
+        yield PipelineEvent("token", cached.answer)
+        finish_trace(trace)
+        yield PipelineEvent("trace", trace)
+        yield PipelineEvent("answer", cached.answer)
+        return
+
+    speculative = None
+    if cached is not None:
+        # 답변은 캐시하지 않는 설정이거나 유사 질문 적중: 컨텍스트/Cypher 만 재사용
+        graph_ctx_text = cached.graph_context
+        cypher = cached.cypher
+        cypher_params = cached.params or {}
+        yield PipelineEvent("context", graph_ctx_text)
+    elif build_context is None:
+        # 2~3단계: 플랜 → 컨텍스트 조회 → Cypher 생성 (LLM 플래너가 필요하면 Cypher 생성을 미리 시작)
+        with span("stage.context_cypher"):
+            graph_ctx_text, cypher, cypher_params, speculative = await generate_context_and_cypher_async(
+                question, product_id, usage_sink=usage
+            )
+        yield PipelineEvent("context", graph_ctx_text)
+        if speculative is not None:
+            yield PipelineEvent("speculation", speculative)
+    else:
+        # 2단계: 호출자가 준 방법으로 그래프 컨텍스트 조회
+        with span("stage.context"):
+            graph_ctx_text = await _call(build_context, question, product_id)
+        yield PipelineEvent("context", graph_ctx_text)
+
+        # 3단계: 질문 + 그래프 컨텍스트 기반 Cypher 생성 (맞는 템플릿이 있으면 LLM 생략)
+        with span("stage.cypher"):
+            cypher, cypher_params = await generate_cypher_with_params_async(
+                question, product_id, graph_ctx_text, usage_sink=usage
+            )
+    params = {"product_id": product_id, **cypher_params}
+
+    # LLM 이 새로 만든 쿼리는 실행 전에 점검한다.
+    # (캐시/템플릿 쿼리는 이미 점검을 통과해서 결과를 냈던 쿼리)
+    blocked = False
+    if (guard or CYPHER_VALIDATE) and cached is None and not cypher_params:
+        with span("stage.guard"):
+            checked = await guard_cypher_async(cypher, params, explain=guard)
+        if not checked.ok:
+            yield PipelineEvent("guard", checked)
+            # 거부 사유를 붙여서 한 번만 다시 만들게 한다.
+            with span("stage.regenerate"):
+                cypher = await regenerate_cypher_async(
+                    question, product_id, graph_ctx_text, checked.cypher, checked.reason(), usage_sink=usage
+                )
+                checked = await guard_cypher_async(cypher, params, explain=guard)
+            if not checked.ok:
+                yield PipelineEvent("guard", checked)
+                blocked = True
+        cypher = checked.cypher
+    yield PipelineEvent("cypher", (cypher, cypher_params))
+
+    # 4단계: 그래프 실행
+    # 리터럴 교정으로 얻은 결과는 질문과 다른 값으로 조회했을 수 있으므로 캐시 / 템플릿으로 남기지 않는다.
+    cacheable = True
+    if blocked:
+        # 다시 만든 쿼리도 거부되면 실행하지 않고 아래 벡터 검색 → 그래프 확장 rows 로 답한다.
+        rows = CypherRows()
+    else:
+        repairable = CYPHER_REPAIR and cached is None and not cypher_params
+        error = None
+        with span("stage.execute"):
+            try:
+                rows = await _execute(execute, cypher, params)
+            except ClientError as e:
+                # Neo4j 가 거부한 쿼리(문법 / 타임아웃 등)만 복구 대상. 연결 오류는 그대로 올린다.
+                if not repairable:
+                    raise
+                error = e.message
+                rows = CypherRows()
+            record_rows(len(rows), getattr(rows, "truncated", False))
+
+        # 실패 / 0행: 리터럴을 상품 어휘에 맞춰 고쳐 보고, 안 되면 오류를 붙여 한 번 다시 만든다.
+        if repairable and (error is not None or not rows):
+            with span("stage.repair"):
+                repair, repaired_rows = await repair_cypher_async(
+                    question, product_id, graph_ctx_text, cypher, params, error,
+                    partial(_execute, execute), guard=guard, usage_sink=usage,
+                )
+            if repair.attempts:
+                yield PipelineEvent("repair", repair)
+            if repair.ok:
+                cypher, rows = repair.cypher, repaired_rows
+                cacheable = repair.method != "literal"
+    yield PipelineEvent("rows", rows)
+
+    # 결과가 없으면 질문과 가까운 원문 청크에서 출발해 그래프를 확장한 rows 로 답한다.
+    # (Cypher 를 다시 만들지 않으므로 캐시/템플릿 학습에는 쓰지 않는다)
+    answer_rows = rows
+    if not rows:
+        with span("stage.hybrid"):
+            answer_rows = await asyncio.to_thread(retrieve_chunk_rows, question, product_id)
+            record_rows(len(answer_rows))
+        if answer_rows:
+            yield PipelineEvent("hybrid", answer_rows)
+
+    # 원문 인덱스: 결과가 있으면 보조 근거, 없으면 대신 쓸 근거를 찾는다.
+    with span("stage.evidence") as s:
+        evidence = await asyncio.to_thread(
+            search_passages,
+            question,
+            product_id,
+            TEXT_INDEX_TOP_K if answer_rows else TEXT_INDEX_FALLBACK_K,
+        )
+        s.set(passages=len(evidence))
+    if evidence:
+        yield PipelineEvent("evidence", evidence)
+
+    # 5단계: 답변 스트리밍
+    parts = []
+    with span("stage.answer"):
+        tokens = generate_answer_stream_async(
+            question=question,
+            cypher=cypher,
+            rows=answer_rows,
+            graph_context=graph_ctx_text,
+            params=cypher_params,
+            usage_sink=usage,
+            evidence=evidence,
+        )
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield PipelineEvent("token", token)
+        finally:
+            await tokens.aclose()
+    answer = "".join(parts)
+
+    # 0행 결과는 Cypher 가 잘못됐을 가능성이 높으므로 캐시하지 않는다.
+    if rows and cacheable:
+        qa_cache.store(
+            product_id, question,
+            cypher=cypher, graph_context=graph_ctx_text, answer=answer, params=cypher_params,
+        )
+        if not cypher_params:
+            # LLM 이 새로 만든 쿼리가 결과를 냈으면 템플릿으로 학습
+            await asyncio.to_thread(learn_cypher_template, question, product_id, cypher)
+
+    yield PipelineEvent("usage", usage)
+
+    finish_trace(trace)
+    yield PipelineEvent("trace", trace)
+
+    # 캐시 저장을 끝낸 뒤 마지막 이벤트를 보낸다. (소비자가 여기서 멈춰도 저장은 끝나 있음)
+    yield PipelineEvent("answer", answer)
+
+
+async def answer_question_async(
+    question: str,
+    product_id: str,
+    timeout: float | None = QA_REQUEST_TIMEOUT_SEC,
+    **kwargs: Any,
+) -> List[PipelineEvent]:
+    """
+    run_qa_async 를 끝까지 돌려서 이벤트 목록을 돌려준다. (동시 처리/부하 테스트용)
+    timeout 초 안에 끝나지 않으면 진행 중인 요청을 취소하고 TimeoutError.
+    """
+    async def collect() -> List[PipelineEvent]:
+        return [event async for event in run_qa_async(question, product_id, **kwargs)]
+
+    return await asyncio.wait_for(collect(), timeout or None)
+
+
+# -----------------------------
+# 동기 래퍼 (main.py / app.py)
+# -----------------------------
+# 비동기 파이프라인은 백그라운드 스레드의 이벤트 루프 하나에서 돈다.
+# 동기 호출자가 여러 스레드(Streamlit 세션 등)에서 동시에 불러도 같은 루프/커넥션 풀을 함께 쓴다.
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+_DONE = object()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="qa-pipeline-loop", daemon=True).start()
+        return _loop
+
+
+def run_qa_stream(
+    question: str,
+    product_id: str,
+    build_context: Callable[[str, str], Any] | None = None,
+    execute: Callable[[str, Dict[str, Any]], Iterable[Dict[str, Any]]] | None = None,
+    timeout: float | None = QA_REQUEST_TIMEOUT_SEC,
+) -> Iterator[PipelineEvent]:
+    """
+    run_qa_async 의 동기 래퍼. 이벤트가 나오는 대로 yield 한다.
+    (main.qa_loop / app.py 가 중간 결과와 답변 토큰을 바로 보여줄 수 있도록)
+
+    - build_context / execute: run_qa_async 와 같다. (동기 함수도 된다)
+    - 소비하는 쪽이 중간에 멈추면(generator close) 진행 중인 요청을 취소한다.
+    - timeout 초 안에 끝나지 않아도 취소하고 TimeoutError.
+    """
+    events: "queue.Queue[Any]" = queue.Queue()
+
+    async def pump() -> None:
+        try:
+            async with asyncio.timeout(timeout or None):
+                async for event in run_qa_async(question, product_id, build_context, execute):
+                    events.put(event)
+        except Exception as e:
+            events.put(e)
+        finally:
+            events.put(_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), _background_loop())
+    try:
+        while True:
+            item = events.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        future.cancel()
@@ -0,0 +1,40 @@
+import unittest
+
+from context_cache import ContextCache
+
+
+class EnsureFreshTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = ContextCache(version_check_sec=0)
+        self.invalidated = []
+        self.cache.add_invalidation_listener(self.invalidated.append)
+
+    def test_first_check_keeps_entries(self) -> None:
+        self.cache.put("P", "summary", "요약")
+        self.cache.ensure_fresh("P", lambda: "v1")
+        self.assertEqual(self.cache.get("P", "summary"), "요약")
+        self.assertEqual(self.invalidated, [])
+
+    def test_version_change_invalidates(self) -> None:
+        self.cache.ensure_fresh("P", lambda: "v1")
+        self.cache.put("P", "summary", "요약")
+        self.cache.ensure_fresh("P", lambda: "v2")
+        self.assertIsNone(self.cache.get("P", "summary"))
+        self.assertEqual(self.invalidated, ["P"])
+
+    def test_product_loaded_after_missing_invalidates(self) -> None:
+        self.cache.ensure_fresh("P", lambda: None)
+        self.cache.put("P", "summary", "데이터가 없습니다")
+        self.cache.ensure_fresh("P", lambda: "v1")
+        self.assertIsNone(self.cache.get("P", "summary"))
+        self.assertEqual(self.invalidated, ["P"])
+
+    def test_product_removed_invalidates(self) -> None:
+        self.cache.ensure_fresh("P", lambda: "v1")
+        self.cache.put("P", "summary", "요약")
+        self.cache.ensure_fresh("P", lambda: None)
+        self.assertIsNone(self.cache.get("P", "summary"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from cypher_templates import Slot, find_literals, parameterize
+
+CYPHER = (
+    "MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage {type: 'MAIN'})\n"
+    "WHERE c.name CONTAINS \"뇌혈관\" AND c.note = 'it\\'s'\n"
+    "RETURN c.name"
+)
+
+
+class FindLiteralsTest(unittest.TestCase):
+    def test_spans_cover_quoted_literals(self) -> None:
+        literals = find_literals(CYPHER)
+        self.assertEqual([CYPHER[x.start : x.end] for x in literals], ["'MAIN'", '"뇌혈관"', "'it\\'s'"])
+        self.assertEqual([x.value for x in literals], ["MAIN", "뇌혈관", "it's"])
+        self.assertEqual(literals[1].slot, Slot(prop="name", operator="CONTAINS"))
+
+    def test_parameterize_uses_the_same_literals(self) -> None:
+        skeleton, literals = parameterize(CYPHER)
+        self.assertEqual(literals, [(x.value, x.slot) for x in find_literals(CYPHER)])
+        self.assertIn("{type: $t0}", skeleton)
+        self.assertIn("CONTAINS $t1 AND c.note = $t2", skeleton)
+
+
+if __name__ == "__main__":
+    unittest.main()
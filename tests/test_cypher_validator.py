@@ -0,0 +1,45 @@
+import unittest
+
+from cypher_validator import validate_cypher
+
+PARAMS = {"product_id": "PRD_8CCBA637DC90"}
+ANCHOR = "MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage)"
+
+
+class MapProjectionTest(unittest.TestCase):
+    def codes(self, cypher: str):
+        return [issue.code for issue in validate_cypher(cypher, PARAMS)]
+
+    def test_projection_entries_are_new_keys(self) -> None:
+        cypher = (
+            ANCHOR + "-[:HAS_EVENT]->(e:PayableEvent)\n"
+            "RETURN c {.name, .type, events: collect(e {.category, .reason})}"
+        )
+        self.assertEqual(self.codes(cypher), [])
+
+    def test_projection_key_may_hold_product_id(self) -> None:
+        self.assertEqual(self.codes(ANCHOR + "\nRETURN c {.name, pid: $product_id}"), [])
+
+    def test_projection_inside_function_call(self) -> None:
+        cypher = (
+            ANCHOR + "-[:HAS_EVENT]->(e:PayableEvent)\n"
+            "RETURN collect(e {.reason, cov: c.name})"
+        )
+        self.assertEqual(self.codes(cypher), [])
+
+    def test_projection_inside_function_call_may_hold_product_id(self) -> None:
+        self.assertEqual(self.codes(ANCHOR + "\nRETURN collect(c {.name, pid: $product_id})"), [])
+
+    def test_projection_shorthand_is_still_checked(self) -> None:
+        self.assertEqual(self.codes(ANCHOR + "\nRETURN c {.name, .events}"), ["unknown_property"])
+
+    def test_pattern_property_map_is_still_checked(self) -> None:
+        cypher = (
+            "MATCH (p:Product {product_id: $product_id})-[:HAS_COVERAGE]->(c:Coverage {events: 'x'})\n"
+            "RETURN c.name"
+        )
+        self.assertEqual(self.codes(cypher), ["unknown_property"])
+
+
+if __name__ == "__main__":
+    unittest.main()
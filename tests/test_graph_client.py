@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+from unittest import mock
+
+import graph_client
+from prompt_assembler import row_budget
+
+
+class _Record:
+    def __init__(self, row):
+        self._row = row
+
+    def data(self):
+        return dict(self._row)
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetched = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.fetched >= len(self.rows):
+            raise StopAsyncIteration
+        self.fetched += 1
+        return _Record(self.rows[self.fetched - 1])
+
+    async def peek(self):
+        return _Record(self.rows[self.fetched]) if self.fetched < len(self.rows) else None
+
+
+class AsyncRunCypherStopTest(unittest.TestCase):
+    def run_query(self, rows, **kwargs):
+        result = _Result(rows)
+
+        class _Session:
+            async def run(self, query, **params):
+                return result
+
+        @asynccontextmanager
+        async def fake_session(**config):
+            yield _Session()
+
+        with mock.patch.object(graph_client, "async_session", fake_session):
+            taken = asyncio.run(graph_client.async_run_cypher("RETURN 1", max_rows=0, max_bytes=0, **kwargs))
+        return taken, result.fetched
+
+    def test_stops_fetching_at_token_budget(self) -> None:
+        rows = [{"name": f"보장{i}", "text": "가나다라마바사 " * 10} for i in range(50)]
+        taken, fetched = self.run_query(rows, stop=row_budget(100))
+        self.assertLess(fetched, len(rows))
+        self.assertEqual(len(taken), fetched)
+        self.assertTrue(taken.truncated)
+
+    def test_without_stop_reads_everything(self) -> None:
+        rows = [{"name": f"보장{i}"} for i in range(5)]
+        taken, fetched = self.run_query(rows)
+        self.assertEqual(fetched, 5)
+        self.assertFalse(taken.truncated)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from incremental_loader import _limitations_to_load, compute_diff
+
+PRODUCT_ID = "PRD_8CCBA637DC90"
+LIMITATION = {"coverage_name": "뇌혈관질환진단특약", "coverage_type": "RIDER", "category": "면책기간", "text": "90일"}
+
+
+def _product(coverage_type: str) -> dict:
+    return {
+        "coverages": [{"name": "뇌혈관질환진단특약", "type": coverage_type}],
+        "payable_events": [],
+        "limitations": [dict(LIMITATION, coverage_type=coverage_type)],
+        "qualifications": [],
+    }
+
+
+def _stored(coverage_type: str) -> dict:
+    return {
+        "exists": True,
+        "coverages": [{"name": "뇌혈관질환진단특약", "type": coverage_type}],
+        "payable_events": [],
+        "limitations": [{k: LIMITATION[k] for k in ("coverage_name", "category", "text")}],
+        "qualifications": [],
+        "meta": {},
+    }
+
+
+class CoverageTypeChangeTest(unittest.TestCase):
+    def test_type_change_relinks_limitations(self) -> None:
+        data = _product("MAIN")
+        diff = compute_diff(PRODUCT_ID, data, _stored("RIDER"))
+        self.assertEqual(diff.sections["coverages"].added, [{"name": "뇌혈관질환진단특약", "type": "MAIN"}])
+        self.assertEqual(diff.sections["coverages"].removed, [{"name": "뇌혈관질환진단특약", "type": "RIDER"}])
+        # Limitation 자체는 변경 없음이지만, 새 Coverage 에 다시 이어야 한다.
+        self.assertTrue(diff.sections["limitations"].is_empty())
+        self.assertEqual(_limitations_to_load(data, diff), data["limitations"])
+
+    def test_unchanged_coverage_does_not_reload_limitations(self) -> None:
+        data = _product("RIDER")
+        diff = compute_diff(PRODUCT_ID, data, _stored("RIDER"))
+        self.assertEqual(_limitations_to_load(data, diff), [])
+
+    def test_new_coverage_links_existing_limitation(self) -> None:
+        data = _product("RIDER")
+        stored = dict(_stored("RIDER"), coverages=[])
+        diff = compute_diff(PRODUCT_ID, data, stored)
+        self.assertEqual(_limitations_to_load(data, diff), data["limitations"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import glob
+import json
+import os
+import unittest
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+import json2graph
+
+SAMPLE = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "sample_docs", "jsons", "*굿닥터*.json")))[0]
+PRODUCT_ID = "PRD_TEST"
+
+
+class _Tx:
+    def __init__(self, log, fail_on):
+        self.log = log
+        self.fail_on = fail_on
+
+    def run(self, query, **params):
+        if self.fail_on and self.fail_on in query:
+            raise RuntimeError("boom")
+        self.log.append((query, params))
+        counters = SimpleNamespace(nodes_created=0, relationships_created=0)
+        return SimpleNamespace(consume=lambda: SimpleNamespace(counters=counters))
+
+
+class ChunkedLoadTest(unittest.TestCase):
+    def load(self, log, fail_on=None):
+        class _Session:
+            def execute_write(self, work, *args):
+                return work(_Tx(log, fail_on), *args)
+
+        @contextmanager
+        def fake_session(**config):
+            yield _Session()
+
+        with open(SAMPLE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with mock.patch.object(json2graph.graph_client, "session", fake_session), \
+                mock.patch.object(json2graph, "_ensure_schema_once", lambda session: None):
+            json2graph.load_product_structured(PRODUCT_ID, data, chunk_rows=10)
+
+    @staticmethod
+    def deleted_ids(log):
+        return {
+            pid for query, params in log if "DETACH DELETE" in query for pid in params.get("product_ids", [])
+        }
+
+    def test_failed_chunk_keeps_existing_product(self) -> None:
+        log = []
+        with self.assertRaises(RuntimeError), self.assertLogs("json2graph", "ERROR"):
+            self.load(log, fail_on="MERGE (lim:Limitation")
+        self.assertEqual(self.deleted_ids(log), {PRODUCT_ID + json2graph._STAGING_SUFFIX})
+
+    def test_staged_rows_are_swapped_in_last(self) -> None:
+        log = []
+        self.load(log)
+        staging_id = PRODUCT_ID + json2graph._STAGING_SUFFIX
+        loaded_ids = {
+            row["product_id"]
+            for _, params in log for rows in params.values() if isinstance(rows, list)
+            for row in rows if isinstance(row, dict)
+        }
+        self.assertEqual(loaded_ids, {staging_id})
+        swaps = [i for i, (query, _) in enumerate(log) if "SET n.product_id = $product_id" in query]
+        deletes = [i for i, (query, params) in enumerate(log) if params.get("product_ids") == [PRODUCT_ID]]
+        self.assertTrue(swaps and deletes)
+        self.assertLess(max(deletes), min(swaps))
+        self.assertEqual(swaps[-1], len(log) - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from qa_cache import QACache
+
+PRODUCT_ID = "PRD_8CCBA637DC90"
+
+# 샘플 상품(굿닥터) 어휘 일부
+VOCABULARY = {
+    "coverage_names": [
+        "(간편)암주요치료비특약(무배당, 갱신형)",
+        "(간편)상급종합병원(국립암센터, 원자력병원및지역암센터포함)암주요치료비특약(무배당, 갱신형)",
+        "(간편)종합병원이상암주요치료비특약(치료별 연간1회)(무배당, 갱신형)",
+        "(간편)[기본]뇌혈관질환진단특약(무배당, 갱신형)",
+    ],
+    "event_categories": ["암", "뇌혈관질환", "허혈심장질환", "입원"],
+    "limitation_categories": ["기타", "면책기간", "보상하지 않는 손해"],
+    "qualification_types": ["간편심사형", "일반심사형", "최초계약", "갱신계약(10년만기)"],
+}
+
+
+class QACacheLookupTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = QACache(similarity=0.85, store_answer=True)
+
+    def _store(self, question: str, answer: str) -> None:
+        self.cache.store(PRODUCT_ID, question, cypher=f"// {question}", graph_context="ctx", answer=answer)
+
+    def test_exact_match_serves_answer(self) -> None:
+        self._store("임플란트 보장돼?", "보장되지 않습니다.")
+        entry = self.cache.lookup(PRODUCT_ID, "임플란트 보장 되니?", VOCABULARY)
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry.answer, "보장되지 않습니다.")
+
+    def test_fuzzy_match_reuses_cypher_without_answer(self) -> None:
+        self._store("뇌혈관질환 진단비 보장 금액", "1000만원입니다.")
+        entry = self.cache.lookup(PRODUCT_ID, "뇌혈관질환 진단비 보장 금액은 얼마", VOCABULARY)
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry.cypher, "// 뇌혈관질환 진단비 보장 금액")
+        self.assertIsNone(entry.answer)
+
+    def test_sex_word_difference_is_not_reused(self) -> None:
+        self._store("남자 가입 가능 나이 알려줘", "남자는 20~70세입니다.")
+        self.assertIsNone(self.cache.lookup(PRODUCT_ID, "여자 가입 가능 나이 알려줘", VOCABULARY))
+
+    def test_negation_difference_is_not_reused(self) -> None:
+        self._store("암 진단 받으면 보험금 받을 수 있어?", "네, 받을 수 있습니다.")
+        self.assertIsNone(self.cache.lookup(PRODUCT_ID, "암 진단 받으면 보험금 못 받을 수 있어?", VOCABULARY))
+
+    def test_coverage_variant_difference_is_not_reused(self) -> None:
+        self._store("상급종합병원 암주요치료비 얼마야?", "상급종합병원 기준 금액입니다.")
+        self.assertIsNone(self.cache.lookup(PRODUCT_ID, "종합병원 암주요치료비 얼마야?", VOCABULARY))
+
+    def test_no_fuzzy_match_without_vocabulary(self) -> None:
+        self._store("뇌혈관질환 진단비 보장 금액", "1000만원입니다.")
+        self.assertIsNone(self.cache.lookup(PRODUCT_ID, "뇌혈관질환 진단비 보장 금액은 얼마"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from text_index import build_index, indexed_product_ids, product_key
+
+
+class IndexedProductIdsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.txt_dir = os.path.join(self.tmp.name, "txt")
+        self.index_dir = os.path.join(self.tmp.name, "index")
+        os.makedirs(self.txt_dir)
+        for name in ("굿닥터.txt", "치아보험.txt"):
+            with open(os.path.join(self.txt_dir, name), "w", encoding="utf-8") as f:
+                f.write("제1조 보장 내용\n보험금을 지급합니다.\n")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_missing_index_is_empty(self) -> None:
+        self.assertEqual(indexed_product_ids(self.index_dir), {})
+
+    def test_rebuild_keeps_other_products(self) -> None:
+        build_index(self.txt_dir, {product_key("굿닥터.txt"): "PRD_A", product_key("치아보험.txt"): "PRD_B"}, self.index_dir)
+        # 한 상품만 다시 적재할 때 json2graph 가 하는 것처럼 기존 매핑과 합쳐 다시 만든다.
+        merged = {**indexed_product_ids(self.index_dir), product_key("굿닥터.txt"): "PRD_A2"}
+        build_index(self.txt_dir, merged, self.index_dir)
+        self.assertEqual(
+            indexed_product_ids(self.index_dir),
+            {product_key("굿닥터.txt"): "PRD_A2", product_key("치아보험.txt"): "PRD_B"},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,430 @@
+# text_index.py
+"""
+상품요약서 / 사업방법서 원문(txt) 로컬 BM25 검색 인덱스.
+
+구조화 JSON 으로 추출되면서 빠진 내용도 답할 수 있도록, 원문을 문단 단위 passage 로 잘라
+문자 n-gram(한글 bigram) BM25 역색인을 만든다. 벡터 DB 없이 파일만으로 동작한다.
+
+디스크 형식 (TEXT_INDEX_DIR 아래, 읽을 때는 mmap):
+- meta.json     : passage 목록 (source, product_id, 텍스트 위치), BM25 파라미터, 평균 길이
+- terms.bin     : 정렬된 용어(UTF-8)를 이어 붙인 것
+- terms.idx     : 용어별 uint32 (용어 시작 위치, postings 시작 위치, df) + 끝 표시 한 칸
+- postings.bin  : uint32 (passage 번호, tf) 쌍
+- doclens.bin   : passage 별 uint32 길이(용어 수)
+- passages.bin  : passage 텍스트(UTF-8)를 이어 붙인 것
+
+실행 예:
+    python text_index.py --txt-dir sample_docs/txt --json-dir sample_docs/jsons
+    python text_index.py --query "임플란트 보장 되니?"
+"""
+
+import argparse
+import glob
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+# -----------------------------
+# 인덱스 설정
+# -----------------------------
+TEXT_INDEX_DIR = os.getenv("TEXT_INDEX_DIR", "./text_index")
+# passage 하나의 최대 글자 수 (문단이 이보다 길면 줄 단위로 나눈다)
+TEXT_INDEX_PASSAGE_CHARS = int(os.getenv("TEXT_INDEX_PASSAGE_CHARS", "600"))
+# 쿼리 결과가 있을 때 보조 근거로 붙일 passage 수 / 결과가 없을 때 대신 쓸 passage 수
+TEXT_INDEX_TOP_K = int(os.getenv("TEXT_INDEX_TOP_K", "2"))
+TEXT_INDEX_FALLBACK_K = int(os.getenv("TEXT_INDEX_FALLBACK_K", "5"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+_FORMAT_VERSION = 1
+
+_WORD_RE = re.compile(r"\w+")
+_SPACES_RE = re.compile(r"[ \t]+")
+# 파일 이름 "<문서종류>_<상품명>_<날짜>..." 에서 상품명만 남기기 위한 패턴
+_NAME_SUFFIX_RE = re.compile(r"_(\d{6,8}|v\d).*$")
+_KEY_DROP_RE = re.compile(r"[^0-9A-Za-z가-힣ⅠⅡⅢⅣⅤ]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    한글 문자 bigram 토크나이저.
+    - 단어(\\w+) 단위로 자른 뒤 각 단어의 연속 두 글자를 용어로 쓴다. (한 글자 단어는 그대로)
+    - 형태소 분석기 없이도 "임플란트" ↔ "임플란트치료" 처럼 붙여 쓴 말을 찾을 수 있다.
+    """
+    terms: List[str] = []
+    for word in _WORD_RE.findall(text.lower()):
+        if len(word) == 1:
+            terms.append(word)
+        else:
+            terms.extend(word[i : i + 2] for i in range(len(word) - 1))
+    return terms
+
+
+def product_key(file_name: str) -> str:
+    """
+    "상품요약서_신한참좋은치아보험PlusⅡ(무배당_갱신형)_20251104_v2 (1).json" 과
+    "사업방법서_신한참좋은치아보험PlusⅡ(무배당,+갱신형)_v0.1_250401.txt" 가
+    같은 키가 되도록 문서 종류/날짜/버전/문장부호를 떼어낸다.
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    _, _, name = stem.partition("_")
+    name = _NAME_SUFFIX_RE.sub("", name or stem)
+    return _KEY_DROP_RE.sub("", name).lower()
+
+
+@dataclass
+class Passage:
+    passage_id: int
+    source: str         # 원문 txt 파일 이름
+    product_id: str     # 매칭된 상품이 없으면 ""
+    text: str
+    score: float = 0.0
+
+
+# -----------------------------
+# 인덱스 만들기 (적재 시점)
+# -----------------------------
+
+def split_passages(text: str, max_chars: int = TEXT_INDEX_PASSAGE_CHARS) -> List[str]:
+    """
+    빈 줄로 나뉜 문단을 max_chars 까지 이어 붙여 passage 로 만든다.
+    "## " 제목은 뒤따르는 passage 앞에 붙여서 검색/답변 때 맥락이 남도록 한다.
+    """
+    passages: List[str] = []
+    heading = ""
+    buffer: List[str] = []
+
+    def flush() -> None:
+        if buffer:
+            body = "\n".join(buffer)
+            passages.append(f"{heading}\n{body}" if heading and not body.startswith(heading) else body)
+            buffer.clear()
+
+    for block in re.split(r"\n\s*\n", text):
+        block = _SPACES_RE.sub(" ", block).strip()
+        if not block:
+            continue
+        if block.startswith("## ") and "\n" not in block:
+            flush()
+            heading = block
+            continue
+
+        lines = block.split("\n") if len(block) > max_chars else [block]
+        for line in lines:
+            size = sum(len(b) + 1 for b in buffer)
+            if buffer and size + len(line) > max_chars:
+                flush()
+            # 한 줄 자체가 너무 길면 글자 수로 자른다.
+            while len(line) > max_chars:
+                buffer.append(line[:max_chars])
+                flush()
+                line = line[max_chars:]
+            buffer.append(line)
+    flush()
+    return passages
+
+
+def build_index(
+    txt_dir: str,
+    product_ids: Dict[str, str] | None = None,
+    out_dir: str = TEXT_INDEX_DIR,
+) -> Dict[str, float]:
+    """
+    txt_dir 아래의 *.txt 전체로 인덱스를 만들어 out_dir 에 쓴다. (기존 인덱스는 교체)
+    - product_ids: {product_key: product_id}. 파일 이름의 상품명이 맞는 passage 에 product_id 를 붙인다.
+    - 반환값: 문서/passage/용어 수와 걸린 시간
+    """
+    t0 = time.perf_counter()
+    product_ids = product_ids or {}
+
+    passages: List[Tuple[str, str, str]] = []
+    for path in sorted(glob.glob(os.path.join(txt_dir, "**", "*.txt"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        source = os.path.basename(path)
+        product_id = product_ids.get(product_key(source), "")
+        passages.extend((source, product_id, p) for p in split_passages(text))
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doclens = array("I")
+    for pid, (_, _, text) in enumerate(passages):
+        counts = Counter(tokenize(text))
+        doclens.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((pid, tf))
+
+    os.makedirs(out_dir, exist_ok=True)
+    terms_blob = bytearray()
+    terms_idx = array("I")
+    postings_arr = array("I")
+    for term in sorted(postings):
+        terms_idx.extend((len(terms_blob), len(postings_arr) // 2, len(postings[term])))
+        terms_blob.extend(term.encode("utf-8"))
+        for pid, tf in postings[term]:
+            postings_arr.extend((pid, tf))
+    terms_idx.extend((len(terms_blob), len(postings_arr) // 2, 0))
+
+    text_blob = bytearray()
+    meta_passages = []
+    for source, product_id, text in passages:
+        encoded = text.encode("utf-8")
+        meta_passages.append([source, product_id, len(text_blob), len(encoded)])
+        text_blob.extend(encoded)
+
+    # 임시 파일에 다 쓴 뒤 이름을 바꾼다. (이미 mmap 으로 열어 둔 프로세스는 이전 파일을 계속 보고,
+    # meta.json 을 마지막에 바꾸므로 새로 여는 쪽은 완성된 인덱스만 본다)
+    meta = {
+        "version": _FORMAT_VERSION,
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "avgdl": (sum(doclens) / len(doclens)) if doclens else 0.0,
+        "passages": meta_passages,
+    }
+    for name, data in (
+        ("terms.bin", bytes(terms_blob)),
+        ("terms.idx", terms_idx.tobytes()),
+        ("postings.bin", postings_arr.tobytes()),
+        ("doclens.bin", doclens.tobytes()),
+        ("passages.bin", bytes(text_blob)),
+        ("meta.json", json.dumps(meta, ensure_ascii=False).encode("utf-8")),
+    ):
+        tmp_path = os.path.join(out_dir, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(out_dir, name))
+
+    return {
+        "documents": len({source for source, _, _ in passages}),
+        "passages": len(passages),
+        "terms": len(postings),
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+def product_ids_from_json_dir(json_dir: str, id_map: Dict[str, str] | None = None) -> Dict[str, str]:
+    """
+    json2graph 가 적재할 때와 같은 규칙으로 {product_key: product_id} 를 만든다.
+    """
+    from json2graph import derive_product_id
+
+    product_ids: Dict[str, str] = {}
+    for path in sorted(glob.glob(os.path.join(json_dir, "*.json"))):
+        name = os.path.basename(path)
+        product_id = (id_map or {}).get(name)
+        if not product_id:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            product_id = derive_product_id(path, data)
+        product_ids[product_key(name)] = product_id
+    return product_ids
+
+
+def indexed_product_ids(index_dir: str = TEXT_INDEX_DIR) -> Dict[str, str]:
+    """
+    지금 인덱스가 passage 에 붙여 둔 {product_key: product_id}. 인덱스가 없으면 빈 dict.
+    (한 상품만 다시 적재할 때 다른 상품의 product_id 를 잃지 않도록 build_index 에 함께 넘긴다)
+    """
+    try:
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if meta.get("version") != _FORMAT_VERSION:
+        return {}
+    return {product_key(source): product_id for source, product_id, _, _ in meta["passages"] if product_id}
+
+
+# -----------------------------
+# 검색 (실행 시점)
+# -----------------------------
+
+def map_file(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class TextIndex:
+    """
+    디스크의 BM25 인덱스를 mmap 으로 열어서 검색한다.
+    용어 사전은 정렬돼 있으므로 이진 탐색으로 찾고, postings 는 필요한 구간만 읽는다.
+    """
+
+    def __init__(self, index_dir: str = TEXT_INDEX_DIR) -> None:
+        self.index_dir = index_dir
+        meta_path = os.path.join(index_dir, "meta.json")
+        self.mtime = os.stat(meta_path).st_mtime
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != _FORMAT_VERSION:
+            raise ValueError(f"지원하지 않는 인덱스 형식입니다: {meta.get('version')}")
+
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.passages = meta["passages"]
+
+        self._maps = {
+            name: map_file(os.path.join(index_dir, name))
+            for name in ("terms.bin", "terms.idx", "postings.bin", "doclens.bin", "passages.bin")
+        }
+        self._terms = memoryview(self._maps["terms.bin"])
+        self._terms_idx = memoryview(self._maps["terms.idx"]).cast("I")
+        self._postings = memoryview(self._maps["postings.bin"]).cast("I")
+        self._doclens = memoryview(self._maps["doclens.bin"]).cast("I")
+        self._text = memoryview(self._maps["passages.bin"])
+        self.num_terms = len(self._terms_idx) // 3 - 1
+
+        self._by_product: Dict[str, set] = {}
+        for pid, (_, product_id, _, _) in enumerate(self.passages):
+            self._by_product.setdefault(product_id, set()).add(pid)
+
+    def _term_at(self, i: int) -> bytes:
+        return bytes(self._terms[self._terms_idx[3 * i] : self._terms_idx[3 * (i + 1)]])
+
+    def _lookup(self, term: str) -> Tuple[int, int] | None:
+        """
+        용어의 (postings 시작 위치, df). 없으면 None.
+        """
+        target = term.encode("utf-8")
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.num_terms and self._term_at(lo) == target:
+            return self._terms_idx[3 * lo + 1], self._terms_idx[3 * lo + 2]
+        return None
+
+    def passage(self, pid: int, score: float = 0.0) -> Passage:
+        source, product_id, offset, length = self.passages[pid]
+        text = bytes(self._text[offset : offset + length]).decode("utf-8")
+        return Passage(passage_id=pid, source=source, product_id=product_id, text=text, score=score)
+
+    def has_product(self, product_id: str) -> bool:
+        return product_id in self._by_product
+
+    def search(self, query: str, product_id: str | None = None, k: int = 5) -> List[Passage]:
+        """
+        BM25 상위 k 개 passage.
+        - product_id 를 주면 그 상품 문서의 passage 만 본다.
+        """
+        allowed = self._by_product.get(product_id, set()) if product_id else None
+        if allowed is not None and not allowed:
+            return []
+
+        n = len(self.passages)
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            found = self._lookup(term)
+            if found is None:
+                continue
+            start, df = found
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for j in range(start, start + df):
+                pid = self._postings[2 * j]
+                if allowed is not None and pid not in allowed:
+                    continue
+                tf = self._postings[2 * j + 1]
+                norm = self.k1 * (1 - self.b + self.b * self._doclens[pid] / self.avgdl)
+                scores[pid] = scores.get(pid, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [self.passage(pid, score) for pid, score in best]
+
+
+_index: TextIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_text_index(index_dir: str = TEXT_INDEX_DIR) -> TextIndex | None:
+    """
+    프로세스에서 공유하는 인덱스. 인덱스가 없으면 None.
+    적재 스크립트가 인덱스를 다시 만들면(meta.json 변경) 다음 호출 때 새로 연다.
+    """
+    global _index
+    meta_path = os.path.join(index_dir, "meta.json")
+    try:
+        mtime = os.stat(meta_path).st_mtime
+    except OSError:
+        return None
+
+    with _index_lock:
+        if _index is None or _index.index_dir != index_dir or _index.mtime != mtime:
+            _index = TextIndex(index_dir)
+        return _index
+
+
+def search_passages(question: str, product_id: str | None = None, k: int = TEXT_INDEX_TOP_K) -> List[Passage]:
+    """
+    답변 단계용 원문 검색. 인덱스가 없으면 빈 리스트.
+    """
+    if k <= 0:
+        return []
+    try:
+        index = get_text_index()
+    except (OSError, ValueError, KeyError):
+        # 인덱스가 깨졌거나 형식이 다르면 원문 근거 없이 진행한다.
+        return []
+    if index is None:
+        return []
+    return index.search(question, product_id=product_id, k=k)
+
+
+# ==============================
+# 엔트리포인트: 인덱스 만들기 / 검색해보기
+# ==============================
+
+def _print_passages(passages: Iterable[Passage]) -> None:
+    for p in passages:
+        preview = p.text.replace("\n", " ")[:120]
+        print(f"[{p.score:.2f}] {p.source} ({p.product_id or '-'}) {preview}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="상품 문서 원문 BM25 인덱스")
+    parser.add_argument("--txt-dir", help="원문 txt 디렉토리 (예: sample_docs/txt). 주면 인덱스를 새로 만든다")
+    parser.add_argument("--json-dir", help="상품 JSON 디렉토리. 파일 이름으로 txt 와 product_id 를 연결한다")
+    parser.add_argument("--id-map", help="(선택) {JSON 파일 이름: product_id} JSON 파일")
+    parser.add_argument("--out", default=TEXT_INDEX_DIR, help="인덱스 디렉토리")
+    parser.add_argument("--query", help="검색해볼 질문")
+    parser.add_argument("--product-id", help="(선택) 검색할 상품")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.txt_dir:
+        id_map = None
+        if args.id_map:
+            with open(args.id_map, "r", encoding="utf-8") as f:
+                id_map = json.load(f)
+        ids = product_ids_from_json_dir(args.json_dir, id_map) if args.json_dir else {}
+        report = build_index(args.txt_dir, ids, args.out)
+        print(
+            f"✅ 인덱스 생성: 문서 {report['documents']}개, passage {report['passages']}개, "
+            f"용어 {report['terms']}개, {report['seconds']:.2f}s → {args.out}"
+        )
+
+    if args.query:
+        index = get_text_index(args.out)
+        if index is None:
+            print("인덱스가 없습니다. --txt-dir 로 먼저 만드세요.")
+        else:
+            t0 = time.perf_counter()
+            results = index.search(args.query, product_id=args.product_id, k=args.k)
+            print(f"검색 {(time.perf_counter() - t0) * 1000:.2f}ms")
+            _print_passages(results)
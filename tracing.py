@@ -0,0 +1,383 @@
+# tracing.py
+"""
+QA 파이프라인 단계별 지연 추적(span)과 지표 내보내기.
+
+- span("llm.cypher", model=...) 으로 구간을 감싸면 벽시계 시간과 속성
+  (LLM 토큰 / 조회 행 수 / 캐시 적중)을 기록한다.
+- 질문 하나에서 나온 span 들은 Trace 하나에 모인다. 현재 trace/span 은 contextvars 로
+  들고 다니므로 asyncio 태스크, asyncio.to_thread 안에서도 그대로 따라간다.
+- 내보내기
+  - 구조화 로그: 질문 하나가 끝날 때 "qa_trace" 로거에 JSON 한 줄 (TRACE_LOG_FILE 이 있으면 파일에도)
+  - Prometheus 텍스트: render_metrics(), METRICS_FILE 파일, METRICS_PORT 의 /metrics
+
+span 이름 규칙
+- "stage.*": 파이프라인 단계 (qa_pipeline)
+- "plan", "context", "context.<섹션>": 메타데이터 플랜 / 그래프 컨텍스트 조회
+- "llm.*": OpenAI 요청 하나, "neo4j.query": Cypher 실행 하나
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Tuple
+
+# -----------------------------
+# 설정
+# -----------------------------
+# 질문별 trace 를 JSON 한 줄씩 남길 파일 (비우면 로거 설정에 맡긴다)
+TRACE_LOG_FILE = os.getenv("TRACE_LOG_FILE", "")
+# 질문이 끝날 때마다 Prometheus 텍스트 형식 지표를 덮어쓸 파일 (node_exporter textfile 등)
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+# 0 이 아니면 start_metrics_server() 가 http://METRICS_HOST:METRICS_PORT/metrics 를 연다.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# 지연 히스토그램 버킷 (초)
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("qa_trace")
+if TRACE_LOG_FILE:
+    _handler = logging.FileHandler(TRACE_LOG_FILE, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+# -----------------------------
+# span / trace
+# -----------------------------
+
+@dataclass
+class Span:
+    """
+    구간 하나. start_ms 는 trace 시작 기준, depth 는 중첩 깊이(0 = 최상위).
+    """
+    name: str
+    start_ms: float = 0.0
+    duration_ms: float = 0.0
+    depth: int = 0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def add(self, key: str, value: float) -> None:
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+
+class Trace:
+    """
+    질문 하나의 span 모음. (스레드에서 끝난 span 도 들어오므로 lock)
+    """
+
+    def __init__(self, question: str, product_id: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.question = question
+        self.product_id = product_id
+        self.started_at = time.time()
+        self.total_ms: float | None = None
+        self.outcome = "ok"
+        self.spans: List[Span] = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _add(self, s: Span) -> None:
+        with self._lock:
+            self.spans.append(s)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000
+
+    def ordered_spans(self) -> List[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: (s.start_ms, s.depth))
+
+    def totals(self) -> Dict[str, float]:
+        """
+        LLM / Neo4j 에 쓴 누적 시간(ms)과 토큰 수.
+        (동시에 돈 요청은 겹쳐서 더해지므로 합이 전체 시간보다 클 수 있다)
+        """
+        out = {"llm_ms": 0.0, "neo4j_ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        for s in self.ordered_spans():
+            kind = s.name.split(".", 1)[0]
+            if kind in ("llm", "neo4j"):
+                out[f"{kind}_ms"] += s.duration_ms
+            out["prompt_tokens"] += s.attrs.get("prompt_tokens", 0)
+            out["completion_tokens"] += s.attrs.get("completion_tokens", 0)
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "question": self.question,
+            "product_id": self.product_id,
+            "started_at": self.started_at,
+            "total_ms": round(self.total_ms if self.total_ms is not None else self.elapsed_ms(), 2),
+            "outcome": self.outcome,
+            "totals": {k: round(v, 2) for k, v in self.totals().items()},
+            "spans": [
+                {**asdict(s), "start_ms": round(s.start_ms, 2), "duration_ms": round(s.duration_ms, 2)}
+                for s in self.ordered_spans()
+            ],
+        }
+
+    def summary_lines(self) -> List[str]:
+        """
+        콘솔 출력용: 단계별 시간(중첩은 들여쓰기) + LLM / Neo4j 누적.
+        """
+        lines = []
+        for s in self.ordered_spans():
+            extra = ", ".join(f"{k}={v}" for k, v in s.attrs.items() if not isinstance(v, (list, dict)))
+            lines.append(f"{'  ' * s.depth}{s.name:<24} {s.duration_ms:8.1f}ms" + (f"  {extra}" if extra else ""))
+        t = self.totals()
+        lines.append(
+            f"전체 {self.total_ms or self.elapsed_ms():.1f}ms | LLM 누적 {t['llm_ms']:.1f}ms | "
+            f"Neo4j 누적 {t['neo4j_ms']:.1f}ms | 토큰 {t['prompt_tokens']}+{t['completion_tokens']}"
+        )
+        return lines
+
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("qa_trace", default=None)
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("qa_span", default=None)
+
+
+def _reset(var: contextvars.ContextVar, token: contextvars.Token) -> None:
+    try:
+        var.reset(token)
+    except ValueError:
+        # 다른 컨텍스트에서 닫힌 경우 (예: 다른 태스크에서 aclose 된 async generator)
+        pass
+
+
+@contextmanager
+def trace_scope(trace: Trace) -> Iterator[Trace]:
+    """
+    이 블록 안에서 열린 span 은 trace 에 모인다.
+    """
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _reset(_current_trace, token)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    구간 하나를 잰다. trace 가 없어도 지표(히스토그램)에는 들어간다.
+    예외가 나면 attrs["error"] 에 예외 이름 (취소/중단은 "cancelled").
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    s = Span(name, depth=parent.depth + 1 if parent is not None else 0, attrs=attrs)
+    if trace is not None:
+        s.start_ms = trace.elapsed_ms()
+    token = _current_span.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        cancelled = isinstance(e, (asyncio.CancelledError, GeneratorExit))
+        s.attrs["error"] = "cancelled" if cancelled else type(e).__name__
+        raise
+    finally:
+        s.duration_ms = (time.perf_counter() - t0) * 1000
+        _reset(_current_span, token)
+        metrics.observe("qa_span_seconds", s.duration_ms / 1000, span=name)
+        if "error" in s.attrs:
+            metrics.inc("qa_span_errors_total", span=name, error=s.attrs["error"])
+        if trace is not None:
+            trace._add(s)
+
+
+def annotate(**attrs: Any) -> None:
+    """
+    지금 열려 있는 span 에 속성을 붙인다. (span 밖이면 무시)
+    """
+    s = _current_span.get()
+    if s is not None:
+        s.set(**attrs)
+
+
+def record_llm_usage(usage: Any) -> None:
+    """
+    OpenAI 응답의 usage(prompt_tokens / completion_tokens)를 지금 span 과 지표에 더한다.
+    """
+    if usage is None:
+        return
+    s = _current_span.get()
+    name = s.name if s is not None else "-"
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None) or 0
+        if s is not None:
+            s.add(kind, value)
+        metrics.inc("qa_llm_tokens_total", value, span=name, kind=kind.split("_")[0])
+
+
+def record_rows(count: int, truncated: bool = False) -> None:
+    s = _current_span.get()
+    if s is not None:
+        s.set(rows=count)
+        if truncated:
+            s.set(truncated=True)
+    metrics.inc("qa_rows_total", count, span=s.name if s is not None else "-")
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """
+    캐시 조회 한 번. span 에는 "<cache>_cache_hits" / "<cache>_cache_misses" 로 센다.
+    """
+    s = _current_span.get()
+    if s is not None:
+        s.add(f"{cache}_cache_{'hits' if hit else 'misses'}", 1)
+    metrics.inc("qa_cache_lookups_total", cache=cache, result="hit" if hit else "miss")
+
+
+def finish_trace(trace: Trace, outcome: str = "ok") -> None:
+    """
+    질문 하나가 끝났을 때: 전체 시간 기록 → 구조화 로그 한 줄 → 지표 파일 갱신.
+    (여러 번 불려도 처음 한 번만)
+    """
+    if trace.total_ms is not None:
+        return
+    trace.total_ms = trace.elapsed_ms()
+    trace.outcome = outcome
+    metrics.observe("qa_question_seconds", trace.total_ms / 1000)
+    metrics.inc("qa_questions_total", outcome=outcome)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+    if METRICS_FILE:
+        write_metrics_file(METRICS_FILE)
+
+
+# -----------------------------
+# 지표 (Prometheus 텍스트 형식)
+# -----------------------------
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """
+    프로세스 안에서 쌓는 카운터 / 히스토그램. render() 로 Prometheus 텍스트를 만든다.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[_LabelKey, float]] = {}
+        # 이름 → 라벨 → [버킷별 개수..., 합, 개수]
+        self._histograms: Dict[str, Dict[_LabelKey, List[float]]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            values = series.get(key)
+            if values is None:
+                values = series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[i] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, values in sorted(series.items()):
+                    for bound, count in zip(self.buckets, values):
+                        lines.append(f"{name}_bucket{_labels(key + (('le', _number(bound)),))} {_number(count)}")
+                    lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {_number(values[-1])}")
+                    lines.append(f"{name}_sum{_labels(key)} {values[-2]:.6f}")
+                    lines.append(f"{name}_count{_labels(key)} {_number(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: _LabelKey) -> str:
+    if not key:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in key
+    )
+    return "{" + body + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+metrics = Metrics()
+
+
+def render_metrics() -> str:
+    return metrics.render()
+
+
+def write_metrics_file(path: str) -> None:
+    # 읽는 쪽이 반쯤 쓴 파일을 보지 않도록 임시 파일에 쓰고 바꿔치기
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(metrics.render())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+_server: ThreadingHTTPServer | None = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> ThreadingHTTPServer | None:
+    """
+    /metrics 엔드포인트를 백그라운드 스레드로 연다. port 가 0 이면 열지 않는다.
+    (여러 번 불려도 서버는 하나 — Streamlit 이 스크립트를 다시 실행해도 안전)
+    """
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
@@ -0,0 +1,344 @@
+# vector_index.py
+"""
+원문 청크 임베딩 + 로컬 ANN(IVF) 인덱스, 그리고 벡터 검색 → 그래프 확장 조회.
+
+적재 시점:
+- 원문 txt 를 청크로 잘라 (:Chunk) 노드로 넣고 Product / Coverage 와 HAS_CHUNK 로 잇는다.
+  (json2graph 의 --txt-dir 단계)
+- 청크를 배치로 임베딩하고, k-means 로 나눈 IVF 리스트와 함께 디스크에 쓴다.
+
+디스크 형식 (VECTOR_INDEX_DIR 아래, 읽을 때는 mmap):
+- meta.json     : 임베딩 백엔드 이름, 차원, 청크 목록 (chunk_id, product_id, source), 리스트 경계
+- vectors.f32   : 청크 벡터 (float32, 청크 순서대로)
+- centroids.f32 : IVF 중심 벡터
+- lists.u32     : IVF 리스트별 청크 번호를 이어 붙인 것
+
+실행 시점:
+- 질문을 같은 임베더로 임베딩 → 가까운 중심 nprobe 개의 리스트만 훑어 상위 청크를 찾고,
+- 찾은 청크에서 HAS_CHUNK 를 거꾸로 따라가 Coverage / PayableEvent / Limitation 을 같이 가져온다.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import operator
+import os
+import re
+import threading
+from array import array
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from embeddings import Embedder, embed_in_batches, get_embedder
+from text_index import map_file, product_key, split_passages
+
+# -----------------------------
+# 벡터 인덱스 설정
+# -----------------------------
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vector_index")
+# 질문 하나에 훑어볼 IVF 리스트 수 (클수록 정확, 느림)
+VECTOR_NPROBE = int(os.getenv("VECTOR_NPROBE", "4"))
+# 그래프 확장의 시작점으로 쓸 청크 수
+VECTOR_TOP_K = int(os.getenv("VECTOR_TOP_K", "4"))
+# 청크 하나의 최대 글자 수
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "500"))
+
+_FORMAT_VERSION = 1
+_KMEANS_ITERATIONS = 8
+_NON_WORD_RE = re.compile(r"[^\w]")
+
+
+@dataclass
+class Chunk:
+    chunk_id: str
+    product_id: str
+    source: str
+    seq: int
+    text: str
+    coverage_names: List[str] = field(default_factory=list)
+
+
+def _compact(text: str) -> str:
+    return _NON_WORD_RE.sub("", text).lower()
+
+
+def make_chunks(
+    txt_dir: str,
+    product_ids: Dict[str, str],
+    coverage_names: Dict[str, List[str]] | None = None,
+    max_chars: int = CHUNK_MAX_CHARS,
+) -> List[Chunk]:
+    """
+    상품과 연결되는 원문 txt 만 청크로 자른다.
+    - product_ids: {product_key: product_id} (text_index.product_ids_from_json_dir 형식)
+    - coverage_names: {product_id: [Coverage.name, ...]}. 청크 본문에 이름이 나오면 그 Coverage 에도 잇는다.
+    - chunk_id 는 (product_id, 파일, 순번) 으로 정해지므로 다시 적재해도 같다.
+    """
+    import glob
+
+    coverage_names = coverage_names or {}
+    chunks: List[Chunk] = []
+    for path in sorted(glob.glob(os.path.join(txt_dir, "**", "*.txt"), recursive=True)):
+        source = os.path.basename(path)
+        product_id = product_ids.get(product_key(source))
+        if not product_id:
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+        names = [(name, _compact(name)) for name in coverage_names.get(product_id, []) if name]
+        for seq, passage in enumerate(split_passages(text, max_chars)):
+            digest = hashlib.sha1(f"{product_id}|{source}|{seq}".encode("utf-8")).hexdigest()[:16]
+            compact = _compact(passage)
+            chunks.append(
+                Chunk(
+                    chunk_id=f"CHK_{digest}",
+                    product_id=product_id,
+                    source=source,
+                    seq=seq,
+                    text=passage,
+                    coverage_names=[name for name, key in names if key and key in compact],
+                )
+            )
+    return chunks
+
+
+# -----------------------------
+# IVF 인덱스 만들기
+# -----------------------------
+
+def _dot(a, b) -> float:
+    return sum(map(operator.mul, a, b))
+
+
+def _kmeans(vectors: List[List[float]], nlist: int) -> Tuple[List[List[float]], List[int]]:
+    """
+    코사인(정규화된 벡터의 내적) 기준 k-means. 초기 중심은 고르게 떨어진 벡터로 정해서 결정적이다.
+    - 반환값: (중심 목록, 벡터별 리스트 번호)
+    """
+    step = len(vectors) / nlist
+    centroids = [list(vectors[int(i * step)]) for i in range(nlist)]
+    assign = [0] * len(vectors)
+    for _ in range(_KMEANS_ITERATIONS):
+        for i, v in enumerate(vectors):
+            assign[i] = max(range(nlist), key=lambda c: _dot(v, centroids[c]))
+        dim = len(vectors[0])
+        sums = [[0.0] * dim for _ in range(nlist)]
+        for i, v in enumerate(vectors):
+            s = sums[assign[i]]
+            for d in range(dim):
+                s[d] += v[d]
+        for c in range(nlist):
+            norm = math.sqrt(sum(x * x for x in sums[c]))
+            if norm > 0:
+                centroids[c] = [x / norm for x in sums[c]]
+    return centroids, assign
+
+
+def build_vector_index(
+    chunks: List[Chunk],
+    embedder: Embedder | None = None,
+    out_dir: str = VECTOR_INDEX_DIR,
+) -> Dict[str, Any]:
+    """
+    청크를 배치로 임베딩해서 IVF 인덱스를 out_dir 에 쓴다. (기존 인덱스는 교체)
+    """
+    import time
+
+    t0 = time.perf_counter()
+    embedder = embedder or get_embedder()
+    vectors = embed_in_batches(embedder, (c.text for c in chunks))
+    dim = len(vectors[0]) if vectors else embedder.dim
+
+    nlist = max(1, int(math.sqrt(len(vectors)))) if vectors else 0
+    centroids, assign = _kmeans(vectors, nlist) if vectors else ([], [])
+    lists: List[List[int]] = [[] for _ in range(nlist)]
+    for i, c in enumerate(assign):
+        lists[c].append(i)
+
+    offsets = [0]
+    flat = array("I")
+    for members in lists:
+        flat.extend(members)
+        offsets.append(len(flat))
+
+    meta = {
+        "version": _FORMAT_VERSION,
+        "embedder": embedder.name,
+        "dim": dim,
+        "list_offsets": offsets,
+        "chunks": [[c.chunk_id, c.product_id, c.source] for c in chunks],
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    # text_index 와 같이 임시 파일 → 이름 바꾸기, meta.json 은 마지막
+    for name, data in (
+        ("vectors.f32", array("f", (x for v in vectors for x in v)).tobytes()),
+        ("centroids.f32", array("f", (x for v in centroids for x in v)).tobytes()),
+        ("lists.u32", flat.tobytes()),
+        ("meta.json", json.dumps(meta, ensure_ascii=False).encode("utf-8")),
+    ):
+        tmp_path = os.path.join(out_dir, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(out_dir, name))
+
+    return {
+        "chunks": len(chunks),
+        "dim": dim,
+        "lists": nlist,
+        "embedder": embedder.name,
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+# -----------------------------
+# 검색
+# -----------------------------
+
+class VectorIndex:
+    def __init__(self, index_dir: str = VECTOR_INDEX_DIR) -> None:
+        self.index_dir = index_dir
+        meta_path = os.path.join(index_dir, "meta.json")
+        self.mtime = os.stat(meta_path).st_mtime
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != _FORMAT_VERSION:
+            raise ValueError(f"지원하지 않는 인덱스 형식입니다: {meta.get('version')}")
+
+        self.embedder_name = meta["embedder"]
+        self.dim = meta["dim"]
+        self.chunks = meta["chunks"]
+        self.list_offsets = meta["list_offsets"]
+
+        self._maps = {
+            name: map_file(os.path.join(index_dir, name))
+            for name in ("vectors.f32", "centroids.f32", "lists.u32")
+        }
+        self._vectors = memoryview(self._maps["vectors.f32"]).cast("f")
+        self._centroids = memoryview(self._maps["centroids.f32"]).cast("f")
+        self._lists = memoryview(self._maps["lists.u32"]).cast("I")
+
+    def _vector(self, i: int):
+        return self._vectors[i * self.dim : (i + 1) * self.dim]
+
+    def search(
+        self,
+        query: List[float],
+        product_id: str | None = None,
+        k: int = VECTOR_TOP_K,
+        nprobe: int = VECTOR_NPROBE,
+    ) -> List[Tuple[str, float]]:
+        """
+        가까운 청크 (chunk_id, 코사인 유사도) 상위 k 개.
+        - product_id 를 주면 그 상품 청크만 본다. 후보가 k 개보다 적으면 리스트를 더 연다.
+        """
+        nlist = len(self.list_offsets) - 1
+        if nlist <= 0:
+            return []
+        order = sorted(
+            range(nlist),
+            key=lambda c: -_dot(query, self._centroids[c * self.dim : (c + 1) * self.dim]),
+        )
+
+        scored: List[Tuple[float, int]] = []
+        probed = 0
+        for c in order:
+            if probed >= nprobe and len(scored) >= k:
+                break
+            probed += 1
+            for j in range(self.list_offsets[c], self.list_offsets[c + 1]):
+                i = self._lists[j]
+                if product_id and self.chunks[i][1] != product_id:
+                    continue
+                scored.append((_dot(query, self._vector(i)), i))
+
+        best = heapq.nlargest(k, scored)
+        return [(self.chunks[i][0], score) for score, i in best]
+
+
+_index: VectorIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index(index_dir: str = VECTOR_INDEX_DIR) -> VectorIndex | None:
+    """
+    프로세스에서 공유하는 벡터 인덱스. 없으면 None. (다시 만들어지면 다음 호출 때 새로 연다)
+    """
+    global _index
+    try:
+        mtime = os.stat(os.path.join(index_dir, "meta.json")).st_mtime
+    except OSError:
+        return None
+    with _index_lock:
+        if _index is None or _index.index_dir != index_dir or _index.mtime != mtime:
+            _index = VectorIndex(index_dir)
+        return _index
+
+
+# 찾은 청크에서 그래프로 확장: 청크가 걸린 Coverage 와 그 지급사유/제한사항
+CHUNK_EXPANSION_QUERY = """
+UNWIND $hits AS hit
+MATCH (p:Product {product_id: $product_id})-[:HAS_CHUNK]->(ch:Chunk {chunk_id: hit.chunk_id})
+OPTIONAL MATCH (cov:Coverage)-[:HAS_CHUNK]->(ch)
+OPTIONAL MATCH (cov)-[:HAS_EVENT]->(e:PayableEvent)
+OPTIONAL MATCH (cov)-[:HAS_LIMITATION]->(l:Limitation)
+WITH hit, ch, cov,
+     collect(DISTINCT e {.category, .reason, .amount})[0..5] AS events,
+     collect(DISTINCT l {.category, .text})[0..3] AS limitations
+RETURN
+  ch.text AS chunk,
+  ch.source AS source,
+  round(hit.score, 3) AS score,
+  cov.name AS coverage_name,
+  events,
+  limitations
+ORDER BY score DESC, coverage_name
+"""
+
+
+def retrieve_chunk_rows(
+    question: str,
+    product_id: str,
+    k: int = VECTOR_TOP_K,
+    execute=None,
+) -> List[Dict[str, Any]]:
+    """
+    벡터 검색 → 그래프 확장. Cypher 결과가 비었을 때 답변 근거로 쓴다.
+    - 인덱스가 없거나, 인덱스를 만든 임베더와 지금 임베더가 다르면 빈 리스트.
+    - execute: (cypher, params) → rows. 기본은 graph_client.run_cypher.
+    """
+    try:
+        index = get_vector_index()
+    except (OSError, ValueError, KeyError):
+        return []
+    if index is None:
+        return []
+
+    embedder = get_embedder()
+    if embedder.name != index.embedder_name:
+        return []
+
+    hits = index.search(embedder.embed([question])[0], product_id=product_id, k=k)
+    if not hits:
+        return []
+
+    if execute is None:
+        from graph_client import run_cypher as execute
+
+    return list(
+        execute(
+            CHUNK_EXPANSION_QUERY,
+            {
+                "product_id": product_id,
+                "hits": [{"chunk_id": chunk_id, "score": score} for chunk_id, score in hits],
+            },
+        )
+    )
+
+
+def chunk_rows(chunks: List[Chunk]) -> List[Dict[str, Any]]:
+    """
+    json2graph._load_chunks 에 넘길 UNWIND 행
+    """
+    return [asdict(c) for c in chunks]